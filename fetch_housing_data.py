@@ -2,17 +2,37 @@
 """
 HUD SAFMR & Zillow ZORI Housing Data Extraction Pipeline
 Dependencies: pip install pandas requests openpyxl
+
+Output formats (--format):
+  insert  multi-row INSERT ... ON CONFLICT (zip) DO UPDATE batches (default; runs anywhere)
+  copy    COPY zip_housing_costs_staging FROM STDIN + one set-based merge (run with psql)
+
+Source cache: raw downloads are kept under HOUSING_CACHE_DIR keyed by URL and revalidated
+with ETag/Last-Modified conditional GETs. The normalized hud_df/zori_df are snapshotted
+as Parquet so an unchanged upstream file skips both the download and the parse. Snapshots
+need pyarrow (pip install pyarrow); without it only the download cache is kept and the
+cached file is re-parsed each run. --offline serves everything from the cache.
+
+ZORI history: every monthly column is kept in a ZIP x month float32 store (ZORI_HISTORY_FILE).
+Each run appends only months the store has not seen and writes just those rows to
+zip_rent_history in their own OUTPUT_HISTORY_SQL_FILE, named by the run's month range, so a
+run never overwrites months an earlier, not yet applied file carries. Apply every file that
+accumulates; each is an idempotent upsert (--no-history skips this step).
 """
 
+import argparse
+import csv
+import hashlib
 import os
 import sys
 import json
 import logging
 import random
 import re
+import time
 from datetime import datetime, timezone
-from io import BytesIO, StringIO
 
+import numpy as np
 import pandas as pd
 import requests
 
@@ -22,7 +42,22 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(me
 HUD_SAFMR_URL = "https://www.huduser.gov/portal/datasets/fmr/fmr2026/fy2026_safmrs.xlsx"
 ZILLOW_ZORI_URL = "https://files.zillowstatic.com/research/public_csvs/zori/Zip_zori_uc_sfrcondomfr_sm_sa_month.csv"
 OUTPUT_SQL_FILE = "insert_zip_housing.sql"
+OUTPUT_HISTORY_SQL_FILE = "insert_zip_rent_history_{first}_{last}.sql"  # first/last new month, YYYY-MM
+ZORI_HISTORY_FILE = "zori_rent_history.npz"
 HUD_VERSION = "FY2026"
+SQL_BATCH_SIZE = 1000
+SEED_COLUMNS = "zip, metro_area, fmr_studio, fmr_1br, fmr_2br, fmr_3br, fmr_4br, zori_rent, hud_version, zori_as_of_month, pulled_at, source_urls, is_mock"
+COPY_NULL = r"\N"
+
+HOUSING_CACHE_DIR = os.environ.get("HOUSING_CACHE_DIR", ".housing_cache")
+CACHE_MAX_BYTES = 1024 * 1024 * 1024
+CACHE_MAX_AGE_DAYS = 90
+# Bump when a parser's output changes so stale snapshots are re-derived
+SNAPSHOT_VERSION = 1
+
+# Strict regex avoids crashing on metadata columns (e.g., '2020 Census Tract')
+ZORI_DATE_RE = re.compile(r'^20\d{2}-\d{2}-\d{2}$')
+ZORI_CHUNK_ROWS = 5000
 
 
 def fallback_mock_generator():
@@ -65,11 +100,154 @@ def fallback_mock_generator():
         f.write("COMMIT;\n")
 
 
-def fetch_hud_safmr():
+# --- SOURCE CACHE ---
+
+def _cache_paths(url):
+    key = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+    base = os.path.join(HOUSING_CACHE_DIR, key)
+    return f"{base}.body", f"{base}.meta.json"
+
+
+def _read_meta(meta_path):
+    if not os.path.exists(meta_path):
+        return {}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _write_meta(meta_path, meta):
+    tmp = f"{meta_path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp, meta_path)
+
+
+def cached_download(url, offline=False, headers=None, timeout=15):
+    """
+    Returns (body_path, meta) for `url`, revalidating any cached copy with a conditional GET.
+    meta["changed"] is False when the server answered 304 (or offline mode served the cache).
+    """
+    os.makedirs(HOUSING_CACHE_DIR, exist_ok=True)
+    body_path, meta_path = _cache_paths(url)
+    meta = _read_meta(meta_path)
+    have_body = bool(meta) and os.path.exists(body_path)
+
+    if offline:
+        if not have_body:
+            raise FileNotFoundError(f"--offline: no cached copy of {url} in {HOUSING_CACHE_DIR}")
+        logging.info(f"Offline: serving cached {url} (fetched {meta.get('fetched_at')})")
+        os.utime(meta_path)
+        return body_path, dict(meta, changed=False)
+
+    req_headers = dict(headers or {})
+    if have_body and meta.get("etag"):
+        req_headers["If-None-Match"] = meta["etag"]
+    if have_body and meta.get("last_modified"):
+        req_headers["If-Modified-Since"] = meta["last_modified"]
+
+    with requests.get(url, timeout=timeout, headers=req_headers, stream=True) as response:
+        if response.status_code == 304 and have_body:
+            logging.info(f"Not modified upstream; using cached copy of {url}")
+            meta["validated_at"] = datetime.now(timezone.utc).isoformat()
+            _write_meta(meta_path, meta)
+            return body_path, dict(meta, changed=False)
+
+        response.raise_for_status()
+        digest = hashlib.sha256()
+        tmp = f"{body_path}.tmp"
+        with open(tmp, 'wb') as out:
+            for block in response.iter_content(chunk_size=1 << 20):
+                out.write(block)
+                digest.update(block)
+        os.replace(tmp, body_path)
+
+        body_sha = digest.hexdigest()
+        changed = body_sha != meta.get("body_sha256")
+        meta = {
+            "url": url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": datetime.now(timezone.utc).isoformat(),
+            "body_sha256": body_sha,
+            "size": os.path.getsize(body_path),
+            # Carry the snapshot forward if the bytes are identical despite a 200
+            "snapshot": meta.get("snapshot") if not changed else None,
+        }
+        _write_meta(meta_path, meta)
+        return body_path, dict(meta, changed=changed)
+
+
+def _snapshots_enabled():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def load_snapshot(url, meta):
+    """Returns (df, extra) for a parsed snapshot matching the cached body, or (None, None)."""
+    snap = meta.get("snapshot")
+    if not snap or snap.get("body_sha256") != meta.get("body_sha256") or snap.get("version") != SNAPSHOT_VERSION:
+        return None, None
+    path = snap["path"]
+    # Parquet only: never unpickle whatever sits in the cache directory
+    if not path.endswith(".parquet") or not os.path.exists(path) or not _snapshots_enabled():
+        return None, None
+    df = pd.read_parquet(path)
+    logging.info(f"Loaded parsed snapshot for {url} ({len(df)} rows)")
+    return df, snap.get("extra", {})
+
+
+def save_snapshot(url, df, extra=None):
+    if not _snapshots_enabled():
+        logging.info("pyarrow not installed; keeping only the download cache (no parsed snapshot)")
+        return
+    body_path, meta_path = _cache_paths(url)
+    meta = _read_meta(meta_path)
+    path = f"{body_path[:-len('.body')]}.parsed.parquet"
+    df.to_parquet(path, index=False)
+    meta["snapshot"] = {
+        "path": path,
+        "version": SNAPSHOT_VERSION,
+        "body_sha256": meta.get("body_sha256"),
+        "extra": extra or {},
+    }
+    _write_meta(meta_path, meta)
+
+
+def evict_cache(max_bytes=CACHE_MAX_BYTES, max_age_days=CACHE_MAX_AGE_DAYS):
+    """Drops entries not used within max_age_days, then least-recently-used ones until under max_bytes."""
+    if not os.path.isdir(HOUSING_CACHE_DIR):
+        return
+    entries = {}
+    for name in os.listdir(HOUSING_CACHE_DIR):
+        key = name.split(".", 1)[0]
+        path = os.path.join(HOUSING_CACHE_DIR, name)
+        entry = entries.setdefault(key, {"paths": [], "size": 0, "used": 0.0})
+        entry["paths"].append(path)
+        entry["size"] += os.path.getsize(path)
+        entry["used"] = max(entry["used"], os.path.getmtime(path))
+
+    cutoff = time.time() - max_age_days * 86400
+    total = sum(e["size"] for e in entries.values())
+    for key, entry in sorted(entries.items(), key=lambda kv: kv[1]["used"]):
+        if entry["used"] >= cutoff and total <= max_bytes:
+            continue
+        for path in entry["paths"]:
+            os.remove(path)
+        total -= entry["size"]
+        logging.info(f"Evicted cache entry {key} ({entry['size'] / 1e6:.1f} MB)")
+
+
+def fetch_hud_safmr(offline=False):
     logging.info(f"Fetching HUD SAFMR {HUD_VERSION} from {HUD_SAFMR_URL}...")
-    response = requests.get(HUD_SAFMR_URL, timeout=15)
-    response.raise_for_status()
-    df = pd.read_excel(BytesIO(response.content))
+    body_path, meta = cached_download(HUD_SAFMR_URL, offline=offline)
+    hud_df, _ = load_snapshot(HUD_SAFMR_URL, meta)
+    if hud_df is not None:
+        return hud_df
+
+    df = pd.read_excel(body_path)
 
     # Standardize headers (handle \r\n or double spaces HUD might use)
     df.columns = [re.sub(r'\s+', ' ', str(c).strip().lower()) for c in df.columns]
@@ -99,41 +277,92 @@ def fetch_hud_safmr():
     if len(hud_df) < original_len:
         logging.info(f"Deduplicated {original_len - len(hud_df)} cross-county ZIP codes from HUD payload.")
 
+    save_snapshot(HUD_SAFMR_URL, hud_df)
     return hud_df
 
 
-def fetch_zillow_zori():
+def sniff_zori_header(path):
+    """Reads only the header row; returns (columns, sorted YYYY-MM-DD month columns)."""
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        header = next(csv.reader(f))
+    return header, sorted(col for col in header if ZORI_DATE_RE.match(col))
+
+
+def read_zori_columns(path, month_cols, dtype=np.float64, chunksize=ZORI_CHUNK_ROWS):
+    """
+    Streams RegionName plus the requested month columns in chunks.
+    Returns (zips, rents) where rents is a len(zips) x len(month_cols) matrix of `dtype`.
+    The parser produces `dtype` directly, so no float64 copy of a wide chunk is made first.
+    """
+    zips, blocks = [], []
+    reader = pd.read_csv(
+        path,
+        usecols=['RegionName', *month_cols],
+        dtype={'RegionName': str, **{c: dtype for c in month_cols}},
+        chunksize=chunksize,
+    )
+    for chunk in reader:
+        chunk = chunk.dropna(subset=['RegionName'])
+        zips.append(chunk['RegionName'].str.replace(r'\.0$', '', regex=True).str.zfill(5).to_numpy(dtype=object))
+        blocks.append(chunk[month_cols].to_numpy(dtype=dtype))
+
+    if not zips:
+        return np.empty(0, dtype=object), np.empty((0, len(month_cols)), dtype=dtype)
+    return np.concatenate(zips), np.vstack(blocks)
+
+
+def fetch_zillow_zori(offline=False):
+    """Returns (zori_df, latest_month, body_path); body_path is the cached CSV the history step reuses."""
     logging.info(f"Fetching Zillow ZORI from {ZILLOW_ZORI_URL}...")
     headers = {"User-Agent": "Mozilla/5.0"}
-    response = requests.get(ZILLOW_ZORI_URL, timeout=15, headers=headers)
-    response.raise_for_status()
-    df = pd.read_csv(StringIO(response.text))
+    body_path, meta = cached_download(ZILLOW_ZORI_URL, offline=offline, headers=headers)
+    zori_df, extra = load_snapshot(ZILLOW_ZORI_URL, meta)
+    if zori_df is not None:
+        return zori_df, extra["latest_month"], body_path
 
-    # Strict regex avoids crashing on metadata columns (e.g., '2020 Census Tract')
-    date_columns = [col for col in df.columns if re.match(r'^20\d{2}-\d{2}-\d{2}$', str(col))]
+    # Sniff the header first so the wide body is streamed with only the columns we keep
+    header, date_columns = sniff_zori_header(body_path)
     if not date_columns:
         raise ValueError("Could not locate any YYYY-MM-DD date columns in Zillow CSV.")
-    latest_month_col = sorted(date_columns)[-1]
+    latest_month_col = date_columns[-1]
     logging.info(f"Detected latest ZORI month: {latest_month_col}")
 
-    if 'RegionName' not in df.columns:
+    if 'RegionName' not in header:
         raise ValueError("Zillow ZORI schema changed: 'RegionName' column missing.")
-    df = df.dropna(subset=['RegionName'])
 
-    zori_df = pd.DataFrame({
-        'zip': df['RegionName'].astype(str).str.replace(r'\.0$', '', regex=True).str.zfill(5),
-        'zori_rent': pd.to_numeric(df[latest_month_col], errors='coerce')
-    })
+    zips, rents = read_zori_columns(body_path, [latest_month_col])
+    zori_df = pd.DataFrame({'zip': zips, 'zori_rent': rents[:, 0]})
 
-    return zori_df.drop_duplicates(subset=['zip'], keep='first'), latest_month_col
+    zori_df = zori_df.drop_duplicates(subset=['zip'], keep='first')
+    save_snapshot(ZILLOW_ZORI_URL, zori_df, {"latest_month": latest_month_col})
+    return zori_df, latest_month_col, body_path
 
 
-def _write_sql_headers(f):
+def fetch_zori_trend(n_months, offline=False):
+    """
+    Returns (zips, months, rents) for the most recent `n_months` ZORI columns, with rents
+    as a compact float32 matrix (rows = ZIPs, columns = months ascending) for trend features.
+    """
+    headers = {"User-Agent": "Mozilla/5.0"}
+    body_path, _ = cached_download(ZILLOW_ZORI_URL, offline=offline, headers=headers)
+    _, date_columns = sniff_zori_header(body_path)
+    months = date_columns[-n_months:] if n_months > 0 else []
+    zips, rents = read_zori_columns(body_path, months, dtype=np.float32)
+    _, first = np.unique(zips, return_index=True)
+    keep = np.sort(first)
+    return zips[keep], months, rents[keep]
+
+
+def _write_compliance_notice(f):
     f.write("-- Auto-generated by fetch_housing_data.py\n")
     f.write("-- COMPLIANCE NOTICE: Zillow Research data (ZORI) is intended for non-commercial, academic, and media use.\n")
     f.write("-- Embedding this into a commercial SaaS product typically requires a formal API licensing agreement.\n")
     f.write("-- Consult Legal regarding a Zillow Bridge Interactive or Enterprise data agreement before commercial launch.\n\n")
 
+
+def _write_sql_headers(f):
+    _write_compliance_notice(f)
+
     # CRITICAL FIX 4: Ensure atomic all-or-nothing execution
     f.write("BEGIN;\n\n")
 
@@ -156,70 +385,289 @@ def _write_sql_headers(f):
     f.write("ALTER TABLE zip_housing_costs ADD COLUMN IF NOT EXISTS is_mock BOOLEAN DEFAULT FALSE;\n\n")
 
 
+def _write_insert_statement(f, batch):
+    f.write(f"INSERT INTO zip_housing_costs ({SEED_COLUMNS}) VALUES\n")
+    f.write(",\n".join(batch))
+    f.write("\n")
+    _write_upsert_clause(f)
+
+
+def _write_upsert_clause(f):
+    f.write("ON CONFLICT (zip) DO UPDATE SET\n")
+    f.write("  metro_area = EXCLUDED.metro_area,\n")
+    f.write("  fmr_studio = EXCLUDED.fmr_studio,\n")
+    f.write("  fmr_1br = EXCLUDED.fmr_1br,\n")
+    f.write("  fmr_2br = EXCLUDED.fmr_2br,\n")
+    f.write("  fmr_3br = EXCLUDED.fmr_3br,\n")
+    f.write("  fmr_4br = EXCLUDED.fmr_4br,\n")
+    f.write("  zori_rent = EXCLUDED.zori_rent,\n")
+    f.write("  hud_version = EXCLUDED.hud_version,\n")
+    f.write("  zori_as_of_month = EXCLUDED.zori_as_of_month,\n")
+    f.write("  pulled_at = EXCLUDED.pulled_at,\n")
+    f.write("  source_urls = EXCLUDED.source_urls,\n")
+    f.write("  is_mock = EXCLUDED.is_mock;\n\n")
+
+
 def _write_sql_batches(f, rows):
-    for i in range(0, len(rows), 1000):
-        batch = rows[i:i+1000]
-        f.write("INSERT INTO zip_housing_costs (zip, metro_area, fmr_studio, fmr_1br, fmr_2br, fmr_3br, fmr_4br, zori_rent, hud_version, zori_as_of_month, pulled_at, source_urls, is_mock) VALUES\n")
-        f.write(",\n".join(batch))
-        f.write("\nON CONFLICT (zip) DO UPDATE SET\n")
-        f.write("  metro_area = EXCLUDED.metro_area,\n")
-        f.write("  fmr_studio = EXCLUDED.fmr_studio,\n")
-        f.write("  fmr_1br = EXCLUDED.fmr_1br,\n")
-        f.write("  fmr_2br = EXCLUDED.fmr_2br,\n")
-        f.write("  fmr_3br = EXCLUDED.fmr_3br,\n")
-        f.write("  fmr_4br = EXCLUDED.fmr_4br,\n")
-        f.write("  zori_rent = EXCLUDED.zori_rent,\n")
-        f.write("  hud_version = EXCLUDED.hud_version,\n")
-        f.write("  zori_as_of_month = EXCLUDED.zori_as_of_month,\n")
-        f.write("  pulled_at = EXCLUDED.pulled_at,\n")
-        f.write("  source_urls = EXCLUDED.source_urls,\n")
-        f.write("  is_mock = EXCLUDED.is_mock;\n\n")
+    for i in range(0, len(rows), SQL_BATCH_SIZE):
+        _write_insert_statement(f, rows[i:i+SQL_BATCH_SIZE])
 
 
-def generate_sql_seed(merged_df, zori_month):
-    logging.info(f"Writing idempotent SQL seed file: {OUTPUT_SQL_FILE}...")
+def _sql_int_literals(values, null='NULL'):
+    """Float array -> truncated integer literals, `null` where missing."""
+    out = np.full(len(values), null, dtype=object)
+    mask = ~np.isnan(values)
+    out[mask] = values[mask].astype(np.int64).astype(str)
+    return out
+
+
+def _metro_text(metro):
+    """Metro names as strings plus a mask of missing or literal 'nan' values."""
+    text = metro.astype(object).where(metro.notna(), None).map(str, na_action='ignore')
+    is_null = text.isna() | (text.str.strip().str.lower() == 'nan')
+    return text, is_null
+
+
+def _sql_metro_literals(metro):
+    """Quoted/escaped metro names, 'NULL' for missing or literal 'nan' strings."""
+    text, is_null = _metro_text(metro)
+    quoted = "'" + text.str.replace("'", "''", regex=False) + "'"
+    return quoted.where(~is_null, 'NULL').to_numpy(dtype=object)
+
+
+def _copy_escape(text):
+    """Escapes a string Series for PostgreSQL COPY text format."""
+    return (
+        text.str.replace("\\", "\\\\", regex=False)
+        .str.replace("\t", "\\t", regex=False)
+        .str.replace("\n", "\\n", regex=False)
+        .str.replace("\r", "\\r", regex=False)
+    )
+
+
+def _zori_literals(chunk, null):
+    zori = pd.to_numeric(chunk['zori_rent'], errors='coerce').to_numpy(dtype=np.float64)
+    has_zori = ~np.isnan(zori)
+    z = np.full(len(chunk), null, dtype=object)
+    # Python round() on native floats keeps output byte-identical to the historical writer
+    z[has_zori] = [str(round(v, 2)) for v in zori[has_zori].tolist()]
+    return z, has_zori
+
+
+def _fmr_literals(chunk, null):
+    return [
+        _sql_int_literals(pd.to_numeric(chunk[col], errors='coerce').to_numpy(dtype=np.float64), null)
+        for col in ('fmr_studio', 'fmr_1br', 'fmr_2br', 'fmr_3br', 'fmr_4br')
+    ]
+
+
+def _format_seed_rows(chunk, zori_month, suffix):
+    """Vectorized formatting of one batch of merged rows into SQL VALUES tuples."""
+    zips = chunk['zip'].astype(object).map(str).to_numpy(dtype=object)
+    metro = _sql_metro_literals(chunk['metro_area'])
+    fmr = _fmr_literals(chunk, 'NULL')
+    z, has_zori = _zori_literals(chunk, 'NULL')
+    # Semantically clean: if Zillow rent is NULL, the "as of" date shouldn't be populated for that row
+    month = np.where(has_zori, f"'{zori_month}'", 'NULL').astype(object)
+
+    sep = ", "
+    return (
+        "  ('" + zips + "', " + metro + sep + fmr[0] + sep + fmr[1] + sep + fmr[2] + sep
+        + fmr[3] + sep + fmr[4] + sep + z + f", '{HUD_VERSION}', " + month + suffix
+    ).tolist()
+
+
+def _format_copy_rows(chunk, zori_month, suffix):
+    """Vectorized formatting of one batch of merged rows into COPY text-format lines."""
+    zips = _copy_escape(chunk['zip'].astype(object).map(str)).to_numpy(dtype=object)
+    text, is_null = _metro_text(chunk['metro_area'])
+    metro = _copy_escape(text).where(~is_null, COPY_NULL).to_numpy(dtype=object)
+    fmr = _fmr_literals(chunk, COPY_NULL)
+    z, has_zori = _zori_literals(chunk, COPY_NULL)
+    month = np.where(has_zori, zori_month, COPY_NULL).astype(object)
+
+    tab = "\t"
+    return (
+        zips + tab + metro + tab + fmr[0] + tab + fmr[1] + tab + fmr[2] + tab + fmr[3] + tab
+        + fmr[4] + tab + z + tab + HUD_VERSION + tab + month + suffix
+    ).tolist()
+
+
+def generate_copy_seed(merged_df, zori_month):
+    """
+    Writes a psql script that bulk-loads a temp staging table via COPY FROM STDIN and
+    merges it into zip_housing_costs with one set-based INSERT ... SELECT ... ON CONFLICT,
+    all inside the same transaction as the schema preamble.
+    """
+    logging.info(f"Writing COPY-format SQL seed file: {OUTPUT_SQL_FILE}...")
     pulled_at = datetime.now(timezone.utc).isoformat()
-    urls_json = json.dumps({"hud": HUD_SAFMR_URL, "zori": ZILLOW_ZORI_URL}).replace("'", "''")
+    urls_json = json.dumps({"hud": HUD_SAFMR_URL, "zori": ZILLOW_ZORI_URL})
+    suffix = "\t" + _copy_escape(pd.Series([pulled_at, urls_json])).str.cat(sep="\t") + "\tf\n"
 
     with open(OUTPUT_SQL_FILE, 'w', encoding='utf-8') as f:
+        f.write("-- COPY format: load with psql (e.g. psql \"$DATABASE_URL\" -f insert_zip_housing.sql)\n")
         _write_sql_headers(f)
 
-        records = merged_df.to_dict(orient='records')
-        rows = []
-        for row in records:
-            zip_val = str(row['zip'])
-
-            metro_raw = row['metro_area']
-            if pd.isna(metro_raw) or str(metro_raw).strip().lower() == 'nan':
-                metro_str = 'NULL'
-            else:
-                metro_str = f"'{str(metro_raw).replace(chr(39), chr(39)*2)}'"
+        f.write("CREATE TEMP TABLE zip_housing_costs_staging\n")
+        f.write("  (LIKE zip_housing_costs INCLUDING DEFAULTS) ON COMMIT DROP;\n\n")
+        f.write(f"COPY zip_housing_costs_staging ({SEED_COLUMNS}) FROM STDIN;\n")
+        for i in range(0, len(merged_df), SQL_BATCH_SIZE):
+            chunk = merged_df.iloc[i:i + SQL_BATCH_SIZE]
+            f.write("".join(_format_copy_rows(chunk, zori_month, suffix)))
+        f.write("\\.\n\n")
+
+        f.write(f"INSERT INTO zip_housing_costs ({SEED_COLUMNS})\n")
+        f.write(f"SELECT {SEED_COLUMNS} FROM zip_housing_costs_staging\n")
+        _write_upsert_clause(f)
+        f.write("COMMIT;\n")
 
-            s = int(row['fmr_studio']) if pd.notna(row['fmr_studio']) else 'NULL'
-            b1 = int(row['fmr_1br']) if pd.notna(row['fmr_1br']) else 'NULL'
-            b2 = int(row['fmr_2br']) if pd.notna(row['fmr_2br']) else 'NULL'
-            b3 = int(row['fmr_3br']) if pd.notna(row['fmr_3br']) else 'NULL'
-            b4 = int(row['fmr_4br']) if pd.notna(row['fmr_4br']) else 'NULL'
-            z = round(row['zori_rent'], 2) if pd.notna(row['zori_rent']) else 'NULL'
+    logging.info("SQL generation complete.")
 
-            # Semantically clean: if Zillow rent is NULL, the "as of" date shouldn't be populated for that row
-            zori_month_val = f"'{zori_month}'" if z != 'NULL' else 'NULL'
 
-            rows.append(
-                f"  ('{zip_val}', {metro_str}, {s}, {b1}, {b2}, {b3}, {b4}, {z}, "
-                f"'{HUD_VERSION}', {zori_month_val}, '{pulled_at}', '{urls_json}', false)"
-            )
+def generate_sql_seed(merged_df, zori_month):
+    logging.info(f"Writing idempotent SQL seed file: {OUTPUT_SQL_FILE}...")
+    pulled_at = datetime.now(timezone.utc).isoformat()
+    urls_json = json.dumps({"hud": HUD_SAFMR_URL, "zori": ZILLOW_ZORI_URL}).replace("'", "''")
+    suffix = f", '{pulled_at}', '{urls_json}', false)"
 
-        _write_sql_batches(f, rows)
+    # Stream: format one INSERT batch at a time straight to the file handle
+    with open(OUTPUT_SQL_FILE, 'w', encoding='utf-8') as f:
+        _write_sql_headers(f)
+        for i in range(0, len(merged_df), SQL_BATCH_SIZE):
+            chunk = merged_df.iloc[i:i + SQL_BATCH_SIZE]
+            _write_insert_statement(f, _format_seed_rows(chunk, zori_month, suffix))
         f.write("COMMIT;\n")
 
     logging.info("SQL generation complete.")
 
 
-def main():
+# --- ZORI HISTORY STORE ---
+
+def load_zori_history(path=ZORI_HISTORY_FILE):
+    """Returns (zips, months, rents): sorted ZIPs, sorted months and a float32 ZIP x month matrix."""
+    if not os.path.exists(path):
+        return np.empty(0, dtype='U5'), np.empty(0, dtype='U10'), np.empty((0, 0), dtype=np.float32)
+    with np.load(path) as data:
+        return data['zips'], data['months'], data['rents']
+
+
+def save_zori_history(zips, months, rents, path=ZORI_HISTORY_FILE):
+    tmp = f"{path}.tmp.npz"
+    np.savez_compressed(tmp, zips=zips, months=months, rents=rents)
+    os.replace(tmp, path)
+
+
+def append_zori_months(history, new_zips, new_months, new_rents):
+    """Merges new month columns (and any new ZIPs) into the store, keeping both axes sorted."""
+    zips, months, rents = history
+    new_zips = np.asarray(new_zips, dtype='U5')
+    new_zips, first = np.unique(new_zips, return_index=True)
+    new_rents = new_rents[first]
+
+    all_zips = np.union1d(zips, new_zips)
+    all_months = np.concatenate([months, np.asarray(new_months, dtype='U10')])
+    merged = np.full((len(all_zips), len(all_months)), np.nan, dtype=np.float32)
+    merged[np.searchsorted(all_zips, zips), :len(months)] = rents
+    merged[np.searchsorted(all_zips, new_zips), len(months):] = new_rents
+
+    order = np.argsort(all_months, kind='stable')
+    return all_zips, all_months[order], merged[:, order]
+
+
+def _write_history_rows(f, zips, months, rents, fmt):
+    """Streams the non-NULL cells of a ZIP x month block as INSERT batches or COPY lines."""
+    rows, cols = np.nonzero(~np.isnan(rents))
+    for i in range(0, len(rows), SQL_BATCH_SIZE):
+        r, c = rows[i:i + SQL_BATCH_SIZE], cols[i:i + SQL_BATCH_SIZE]
+        z = zips[r].astype(object)
+        m = months[c].astype(object)
+        v = np.char.mod('%.2f', rents[r, c].astype(np.float64)).astype(object)
+        if fmt == "copy":
+            f.write("".join((z + "\t" + m + "\t" + v + "\n").tolist()))
+            continue
+        f.write("INSERT INTO zip_rent_history (zip, month, zori_rent) VALUES\n")
+        f.write(",\n".join(("  ('" + z + "', '" + m + "', " + v + ")").tolist()))
+        f.write("\nON CONFLICT (zip, month) DO UPDATE SET zori_rent = EXCLUDED.zori_rent;\n\n")
+
+
+def history_sql_path(months):
+    """One seed file per month range, so a later run can't clobber an unapplied one."""
+    return OUTPUT_HISTORY_SQL_FILE.format(first=str(min(months))[:7], last=str(max(months))[:7])
+
+
+def generate_history_sql(zips, months, rents, fmt="insert"):
+    path = history_sql_path(months)
+    logging.info(f"Writing ZORI history seed file ({len(months)} new months): {path}...")
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w', encoding='utf-8') as f:
+        _write_compliance_notice(f)
+        f.write("BEGIN;\n\n")
+        f.write("CREATE TABLE IF NOT EXISTS zip_rent_history (\n")
+        f.write("  zip TEXT NOT NULL,\n")
+        f.write("  month DATE NOT NULL,\n")
+        f.write("  zori_rent NUMERIC,\n")
+        f.write("  PRIMARY KEY (zip, month)\n")
+        f.write(");\n\n")
+        f.write("CREATE INDEX IF NOT EXISTS idx_zip_rent_history_month ON zip_rent_history (month);\n\n")
+        if fmt == "copy":
+            # Stage + merge like generate_copy_seed, so re-applying or overlapping files upsert
+            f.write("CREATE TEMP TABLE zip_rent_history_staging\n")
+            f.write("  (LIKE zip_rent_history INCLUDING DEFAULTS) ON COMMIT DROP;\n\n")
+            f.write("COPY zip_rent_history_staging (zip, month, zori_rent) FROM STDIN;\n")
+            _write_history_rows(f, zips, months, rents, fmt)
+            f.write("\\.\n\n")
+            f.write("INSERT INTO zip_rent_history (zip, month, zori_rent)\n")
+            f.write("SELECT zip, month, zori_rent FROM zip_rent_history_staging\n")
+            f.write("ON CONFLICT (zip, month) DO UPDATE SET zori_rent = EXCLUDED.zori_rent;\n\n")
+        else:
+            _write_history_rows(f, zips, months, rents, fmt)
+        f.write("COMMIT;\n")
+    os.replace(tmp, path)  # complete before the store marks these months as known
+    return path
+
+
+def update_zori_history(body_path, fmt="insert"):
+    """
+    Appends ZORI months missing from the local store and emits SQL for just those months.
+    body_path is the ZORI CSV fetch_zillow_zori() already downloaded this run.
+    """
+    history = load_zori_history()
+    _, date_columns = sniff_zori_header(body_path)
+
+    known = set(history[1].tolist())
+    new_months = [m for m in date_columns if m not in known]
+    if not new_months:
+        logging.info(f"ZORI history already current through {history[1][-1] if len(history[1]) else 'n/a'}.")
+        return 0
+
+    zips, rents = read_zori_columns(body_path, new_months, dtype=np.float32)
+    zips = zips.astype('U5')
+    _, first = np.unique(zips, return_index=True)
+    keep = np.sort(first)
+    path = generate_history_sql(zips[keep], np.asarray(new_months, dtype='U10'), rents[keep], fmt)
+
+    save_zori_history(*append_zori_months(history, zips, new_months, rents))
+    logging.info(f"ZORI history store now spans {len(known) + len(new_months)} months ({ZORI_HISTORY_FILE}); "
+                 f"apply {path} to zip_rent_history.")
+    return len(new_months)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the zip_housing_costs seed from HUD SAFMR + Zillow ZORI.")
+    parser.add_argument("--format", choices=["insert", "copy"], default="insert",
+                        help="insert: batched INSERT ... ON CONFLICT; copy: COPY into staging + set-based merge (psql)")
+    parser.add_argument("--offline", action="store_true",
+                        help=f"Serve HUD/ZORI from the local cache ({HOUSING_CACHE_DIR}) without touching the network")
+    parser.add_argument("--no-history", action="store_true",
+                        help="Skip appending new ZORI months to the zip_rent_history store")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
     try:
-        hud_df = fetch_hud_safmr()
-        zori_df, zori_month = fetch_zillow_zori()
+        hud_df = fetch_hud_safmr(offline=args.offline)
+        zori_df, zori_month, zori_path = fetch_zillow_zori(offline=args.offline)
 
         logging.info("Merging datasets via Left Join (retaining HUD baseline)...")
         merged_df = pd.merge(hud_df, zori_df, on='zip', how='left')
@@ -235,14 +683,21 @@ def main():
             logging.error(f"Zillow join failed: Only matched {zori_match_count} ZIPs with Market Rent. Aborting.")
             sys.exit(1)
 
-        generate_sql_seed(merged_df, zori_month)
+        if args.format == "copy":
+            generate_copy_seed(merged_df, zori_month)
+        else:
+            generate_sql_seed(merged_df, zori_month)
+
+        if not args.no_history:
+            update_zori_history(zori_path, fmt=args.format)
+        evict_cache()  # after the history step, which still reads the cached ZORI body
 
     except requests.exceptions.RequestException as e:
         is_ci = os.environ.get("CI", "").lower() == "true"
         allow_mock = os.environ.get("ALLOW_MOCK_FALLBACK", "").lower() == "true"
 
         if is_ci and allow_mock:
-            logging.warning("Offline network detected in CI environment. Generating mock SQL seed...")
+            logging.warning("Offline network detected in CI environment. Generating mock SQL seed (INSERT format)...")
             fallback_mock_generator()
         else:
             logging.error(f"Network error fetching housing data: {e}")
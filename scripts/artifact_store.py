@@ -0,0 +1,278 @@
+#!/usr/bin/env python3
+"""
+Artifact Store — typed columnar sidecars for the pipeline CSVs
+
+Each CSV artifact (layer4_facilities_FINAL.csv, enriched_facilities_intel.csv,
+ahrq_hospital_linkage.csv, layer3_market_analysis_SEED.csv, stipend_scores.csv) gets a typed
+sidecar next to it: <stem>.parquet (zstd; memory-mapped, only the requested columns read) plus
+<stem>.artifact.json recording the schema version, the sidecar format and the size/mtime of
+the CSV it was written with. Sidecars need pyarrow (pip install pyarrow). Without it none are
+written and loaders read the CSV itself, only the requested columns (usecols), with the same
+types applied -- there is no pickle fallback, so nothing in the working tree is unpickled.
+
+The CSV stays the human-readable copy and the source of truth: a sidecar is only used when
+its schema version matches and the CSV hasn't changed since. Otherwise loaders parse the CSV
+and apply the same types, so callers always get one set of dtypes: CCNs and ZIPs as
+zero-padded strings, counts as nullable ints, flags as nullable booleans.
+
+Usage (build sidecars for CSVs produced elsewhere, e.g. a fresh AHRQ download):
+  python artifact_store.py ahrq_hospital_linkage.csv
+  python artifact_store.py layer4_facilities_FINAL.csv enriched_facilities_intel.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+# Bump when a schema below changes meaning; older sidecars are then ignored until rewritten
+ARTIFACT_SCHEMA_VERSION = 1
+CSV_ENCODINGS = ("utf-8", "latin-1")  # AHRQ linkage files ship as latin-1
+
+# column -> dtype; columns not listed load as "string". "ccn" / "zip5" are zero-padded strings.
+LAYER4_SCHEMA: Dict[str, str] = {
+    "facility_id": "ccn",
+    "zip_code": "zip5",
+    "msp_exclusive": "boolean",
+    "radius_rule_miles": "float64",
+}
+ARTIFACT_SCHEMAS: Dict[str, Dict[str, str]] = {
+    "layer4_facilities_FINAL.csv": LAYER4_SCHEMA,
+    "enriched_facilities_intel.csv": {
+        **LAYER4_SCHEMA,
+        "ccn": "ccn",
+        "hos_beds": "Int32",
+        "hos_dsch": "Int32",
+        "hos_net_revenue": "Int64",
+        "hos_ucburden": "float64",
+    },
+    "ahrq_hospital_linkage.csv": {
+        "ccn": "ccn",
+        "hospital_zip": "zip5",
+        "acutehosp_flag": "Int8",
+        "hos_beds": "Int32",
+        "hos_dsch": "Int32",
+        "hos_res": "float64",           # resident FTEs
+        "hos_children": "Int8",
+        "hos_majteach": "Int8",
+        "hos_vmajteach": "Int8",
+        "hos_teachint": "float64",      # resident-to-bed ratio
+        "hos_highdpp": "Int8",
+        "hos_ucburden": "float64",
+        "hos_highuc": "Int8",
+        "hos_net_revenue": "Int64",
+        "hos_total_revenue": "Int64",
+    },
+    "layer3_market_analysis_SEED.csv": {
+        "zip_code": "zip5",
+        "is_sub_vendor": "boolean",
+        "gross_weekly_pay": "float64",
+        "gsa_monthly_stipend": "float64",
+        "zillow_observed_rent": "float64",
+        "actual_margin_taken": "float64",
+        "implied_weekly_bill": "float64",
+        "est_hourly_bill_rate": "float64",
+        "weekly_rent_cost": "float64",
+        "weekly_stipend_max": "float64",
+        "rent_burden_pct": "float64",
+        "weekly_pocketed_cash": "float64",
+    },
+    "stipend_scores.csv": {
+        "zip": "zip5",
+        "fiscal_year": "Int16",
+        **{c: "float64" for c in (
+            "hours", "weekly_gross", "lodging_daily", "meals_daily", "hud_fmr_1br", "gsa_weekly_max",
+            "gsa_monthly_max", "stipend_weekly", "taxable_weekly", "taxable_hourly", "tax_estimate_weekly",
+            "net_weekly", "zori_rent", "market_ratio", "stipend_monthly_est", "stipend_surplus_monthly",
+            "pct_70", "pct_80", "pct_95", "pct_of_max", "contract_gross", "contract_net_estimate",
+            "contract_tax_free_total",
+        )},
+    },
+}
+
+# Files we don't write: pandas' default NA markers ("N/A", "NULL", ...) mean missing there.
+# Our own CSVs only use empty cells, so a facility literally named "NA" survives.
+UPSTREAM_ARTIFACTS = {"ahrq_hospital_linkage.csv"}
+
+TRUE_STRINGS = {"true", "1", "yes"}
+FALSE_STRINGS = {"false", "0", "no"}
+
+def sidecar_format() -> Optional[str]:
+    """"parquet" when pyarrow is installed, else None (no sidecars; loaders read the CSV)."""
+    try:
+        import pyarrow  # noqa: F401
+        return "parquet"
+    except ImportError:
+        return None
+
+def schema_for(csv_path: str) -> Dict[str, str]:
+    return ARTIFACT_SCHEMAS.get(os.path.basename(str(csv_path)), {})
+
+def _stem(csv_path: str) -> str:
+    root, ext = os.path.splitext(str(csv_path))
+    return root if ext.lower() == ".csv" else str(csv_path)
+
+def meta_path(csv_path: str) -> str:
+    return f"{_stem(csv_path)}.artifact.json"
+
+def _padded(values: pd.Series, width: int, pattern: str) -> pd.Series:
+    """Strips, drops a float-style '.0' and zero-pads values that are all digits."""
+    text = values.astype("string").str.strip().str.replace(r"\.0$", "", regex=True)
+    text = text.mask(text == "")
+    short = text.str.fullmatch(pattern).fillna(False)
+    return text.where(~short, text.str.zfill(width))
+
+def coerce_types(df: pd.DataFrame, schema: Dict[str, str]) -> pd.DataFrame:
+    """Applies `schema` to a frame of CSV text (or already-typed values); column order is kept."""
+    typed = {}
+    for col in df.columns:
+        kind = schema.get(col, "string")
+        values = df[col]
+        if kind == "ccn":
+            typed[col] = _padded(values, 6, r"\d{1,5}")
+        elif kind == "zip5":
+            typed[col] = _padded(values, 5, r"\d{1,4}")
+        elif kind == "boolean":
+            if pd.api.types.is_bool_dtype(values.dtype):
+                typed[col] = values.astype("boolean")
+            else:
+                text = values.astype("string").str.strip().str.lower()
+                flags = pd.Series(pd.NA, index=values.index, dtype="boolean")
+                flags[text.isin(TRUE_STRINGS).fillna(False)] = True
+                flags[text.isin(FALSE_STRINGS).fillna(False)] = False
+                typed[col] = flags
+        elif kind == "string":
+            typed[col] = values.astype("string")
+        else:
+            typed[col] = pd.to_numeric(values, errors="coerce").astype(kind)
+    return pd.DataFrame(typed, index=df.index, columns=df.columns)
+
+def read_csv_text(
+    path: str,
+    columns: Optional[Iterable[str]] = None,
+    encodings: Sequence[str] = CSV_ENCODINGS,
+    default_na: Optional[bool] = None,
+) -> pd.DataFrame:
+    """
+    CSV cells as text. Only empty cells are NaN unless `default_na` (default: the file is in
+    UPSTREAM_ARTIFACTS), which also applies pandas' default NA markers.
+    """
+    wanted = set(columns) if columns is not None else None
+    if default_na is None:
+        default_na = os.path.basename(str(path)) in UPSTREAM_ARTIFACTS
+    na_options = {} if default_na else {"keep_default_na": False, "na_values": [""]}
+    for encoding in encodings:
+        try:
+            return pd.read_csv(
+                path, dtype=str, encoding=encoding, **na_options,
+                usecols=(lambda c: c in wanted) if wanted is not None else None,
+            )
+        except UnicodeDecodeError:
+            continue
+    raise ValueError(f"Could not decode {path} with any of {list(encodings)}")
+
+def _csv_stat(csv_path: str) -> Dict[str, int]:
+    st = os.stat(csv_path)
+    return {"csv_size": st.st_size, "csv_mtime_ns": st.st_mtime_ns}
+
+def load_meta(csv_path: str) -> Optional[Dict[str, Any]]:
+    """The sidecar's metadata, or None when it is missing, outdated or stale against the CSV."""
+    path = meta_path(csv_path)
+    if not os.path.exists(path) or not os.path.exists(csv_path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    if meta.get("schema_version") != ARTIFACT_SCHEMA_VERSION:
+        return None
+    if {k: meta.get(k) for k in ("csv_size", "csv_mtime_ns")} != _csv_stat(csv_path):
+        return None
+    if meta.get("format") != "parquet" or sidecar_format() != "parquet":
+        return None
+    meta["path"] = os.path.join(os.path.dirname(str(csv_path)), meta["file"])
+    return meta if os.path.exists(meta["path"]) else None
+
+def write_sidecar(df: pd.DataFrame, csv_path: str, schema: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """Writes the typed sidecar for an already-written CSV. Returns its path, or None without pyarrow."""
+    fmt = sidecar_format()
+    if fmt is None:
+        if os.path.exists(meta_path(csv_path)):
+            os.remove(meta_path(csv_path))  # an older sidecar no longer describes this CSV
+        return None
+    schema = schema if schema is not None else schema_for(csv_path)
+    typed = coerce_types(df.reset_index(drop=True), schema)
+    path = f"{_stem(csv_path)}.{fmt}"
+    tmp = f"{path}.tmp"
+    typed.to_parquet(tmp, index=False, compression="zstd")
+    os.replace(tmp, path)
+
+    meta = {
+        "schema_version": ARTIFACT_SCHEMA_VERSION,
+        "format": fmt,
+        "file": os.path.basename(path),
+        "rows": len(typed),
+        "dtypes": {c: str(t) for c, t in typed.dtypes.items()},
+        **_csv_stat(csv_path),
+    }
+    tmp_meta = f"{meta_path(csv_path)}.tmp"
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+    os.replace(tmp_meta, meta_path(csv_path))
+    return path
+
+def write_artifact(df: pd.DataFrame, csv_path: str, schema: Optional[Dict[str, str]] = None) -> Optional[str]:
+    """Writes the CSV (unchanged format, for humans) and then its typed sidecar."""
+    df.to_csv(csv_path, index=False)
+    return write_sidecar(df, csv_path, schema)
+
+def artifact_columns(csv_path: str) -> List[str]:
+    """Column names of an artifact, from the sidecar metadata or the CSV header."""
+    meta = load_meta(csv_path)
+    if meta is not None:
+        return list(meta["dtypes"])
+    return read_csv_text(csv_path).columns.tolist() if os.path.getsize(csv_path) else []
+
+def read_artifact(
+    csv_path: str,
+    columns: Optional[Iterable[str]] = None,
+    schema: Optional[Dict[str, str]] = None,
+    encodings: Sequence[str] = CSV_ENCODINGS,
+    default_na: Optional[bool] = None,
+) -> pd.DataFrame:
+    """
+    Typed frame for an artifact. `columns` selects by name; names the artifact lacks are
+    ignored, and the result keeps the file's column order (like a callable usecols).
+    """
+    meta = load_meta(csv_path)
+    if meta is None:
+        schema = schema if schema is not None else schema_for(csv_path)
+        return coerce_types(read_csv_text(csv_path, columns, encodings, default_na), schema)
+
+    wanted = set(columns) if columns is not None else None
+    names = [c for c in meta["dtypes"] if wanted is None or c in wanted]
+    return pd.read_parquet(meta["path"], columns=names, memory_map=True)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Write typed columnar sidecars for existing pipeline CSVs.")
+    parser.add_argument("csv_paths", nargs="+", help="CSV artifacts to convert (schema chosen by file name)")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    for csv_path in args.csv_paths:
+        if not os.path.exists(csv_path):
+            print(f"⚠️ {csv_path} not found. Skipping.")
+            continue
+        if not schema_for(csv_path):
+            print(f"⚠️ No schema registered for {os.path.basename(csv_path)}; every column will load as text.")
+        if sidecar_format() is None:
+            raise SystemExit("❌ Sidecars need pyarrow (pip install pyarrow); loaders read the CSVs directly meanwhile.")
+        df = read_csv_text(csv_path)
+        path = write_sidecar(df, csv_path)
+        print(f"✅ {csv_path} -> {path} ({len(df):,} rows, schema v{ARTIFACT_SCHEMA_VERSION})")
+
+if __name__ == "__main__":
+    main()
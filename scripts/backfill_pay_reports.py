@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+pay_reports Backfill — recompute implied bill rates and rental linkage snapshots in bulk
+
+pay_reports (v2) carries derived columns that nothing refreshes after housing or GSA data
+changes:
+  - implied_bill_rate_13 .. _35   gross_weekly_pay / (1 - margin), one per margin tier
+  - zori_monthly_at_insert        zip_housing_costs.zori_rent
+  - hud_fmr_at_insert             zip_housing_costs.fmr_1br
+  - gsa_monthly_lodging_at_insert max_lodging x 30 for the ZIP's GSA destination
+  - rent_burden_pct               zori / gsa_monthly_lodging x 100
+
+This job streams pay_reports in keyset pages (id > last id, ordered by id), joins each page in
+memory against ZIP-indexed arrays built once from the local lookup DB (one slot per 5-digit
+ZIP, so the join is a gather, not a merge), recomputes every derived column vectorized and
+upserts only the rows whose stored values differ, through push_facility_intel's pipelined
+batcher. After a yearly FMR or monthly ZORI refresh that is one pass instead of per-row SQL.
+
+Values are rounded half away from zero to the column's scale, as NUMERIC does; a rent burden
+that doesn't fit NUMERIC(5,2) is written as NULL rather than failing its batch.
+
+Usage:
+  python backfill_pay_reports.py                                  # Supabase -> Supabase
+  python backfill_pay_reports.py --dry-run                        # report what would change
+  python backfill_pay_reports.py --csv pay_reports.csv --output pay_reports_backfill.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from typing import Dict, Iterator, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+import push_facility_intel as postgrest
+from local_lookup import LOOKUP_DB_PATH, PICKED_MAPPINGS_SQL, LocalLookup, gsa_fiscal_year
+from seed_layer3_arbitrage import ZIP_SPACE, encode_zips
+
+TABLE = "pay_reports"
+KEY = "id"
+DEFAULT_PAGE_SIZE = 5000
+MARGIN_TIERS = (13, 20, 25, 30, 35)
+MONTH_DAYS = 30
+RENT_BURDEN_MAX = 999.99  # NUMERIC(5, 2)
+
+BILL_RATE_COLUMNS = [f"implied_bill_rate_{m}" for m in MARGIN_TIERS]
+SNAPSHOT_COLUMNS = ["zori_monthly_at_insert", "hud_fmr_at_insert", "gsa_monthly_lodging_at_insert", "rent_burden_pct"]
+DERIVED_COLUMNS = BILL_RATE_COLUMNS + SNAPSHOT_COLUMNS
+# NOT NULL columns ride along so the upsert's INSERT half is valid; ON CONFLICT updates them to themselves
+REQUIRED_COLUMNS = ["zip_code", "gross_weekly_pay", "profession"]
+READ_COLUMNS = [KEY, *REQUIRED_COLUMNS, *DERIVED_COLUMNS]
+
+# ━━━ ZIP ARRAYS ━━━
+
+def load_zip_arrays(lookup: LocalLookup, fiscal_year: Optional[int] = None) -> Dict[str, np.ndarray]:
+    """ZIP_SPACE-long float arrays (NaN = no data) for every snapshot source column."""
+    arrays = {c: np.full(ZIP_SPACE, np.nan) for c in ("zori_rent", "fmr_1br", "gsa_monthly_lodging")}
+
+    housing = pd.read_sql_query("SELECT zip, fmr_1br, zori_rent FROM zip_housing_costs", lookup.conn)
+    slots = encode_zips(housing["zip"])
+    ok = slots >= 0
+    for col in ("zori_rent", "fmr_1br"):
+        arrays[col][slots[ok]] = housing[col].to_numpy(dtype=np.float64, na_value=np.nan)[ok]
+
+    gsa = pd.read_sql_query(
+        f"""
+        SELECT m.zip, r.max_lodging * {MONTH_DAYS} AS gsa_monthly_lodging
+        FROM ({PICKED_MAPPINGS_SQL}) m
+        JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = :fy
+        """,
+        lookup.conn,
+        params={"fy": fiscal_year or gsa_fiscal_year()},
+    )
+    slots = encode_zips(gsa["zip"])
+    ok = slots >= 0
+    arrays["gsa_monthly_lodging"][slots[ok]] = gsa["gsa_monthly_lodging"].to_numpy(dtype=np.float64, na_value=np.nan)[ok]
+    return arrays
+
+# ━━━ RECOMPUTE ━━━
+
+def numeric_round(values: np.ndarray, places: int = 2) -> np.ndarray:
+    """Postgres NUMERIC rounding: half away from zero (np.round would go half to even)."""
+    scale = 10.0 ** places
+    return np.sign(values) * np.floor(np.abs(values) * scale + 0.5) / scale
+
+def recompute(page: pd.DataFrame, arrays: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """DERIVED_COLUMNS for a page of reports, vectorized; the page's index is kept."""
+    gross = pd.to_numeric(page["gross_weekly_pay"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    derived = {f"implied_bill_rate_{m}": numeric_round(gross / (1 - m / 100)) for m in MARGIN_TIERS}
+
+    slots = encode_zips(page["zip_code"].fillna(""))
+    known = slots >= 0
+    def gather(col: str) -> np.ndarray:
+        out = np.full(len(page), np.nan)
+        out[known] = arrays[col][slots[known]]
+        return out
+
+    zori, fmr, lodging = gather("zori_rent"), gather("fmr_1br"), gather("gsa_monthly_lodging")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        burden = numeric_round(np.where(lodging > 0, zori / lodging * 100, np.nan))
+    derived.update({
+        "zori_monthly_at_insert": numeric_round(zori),
+        "hud_fmr_at_insert": numeric_round(fmr),
+        "gsa_monthly_lodging_at_insert": numeric_round(lodging),
+        "rent_burden_pct": np.where(np.abs(burden) <= RENT_BURDEN_MAX, burden, np.nan),
+    })
+    return pd.DataFrame(derived, index=page.index)
+
+def changed_mask(page: pd.DataFrame, derived: pd.DataFrame) -> np.ndarray:
+    """Rows where any stored derived value differs from the recomputed one (NULL == NULL)."""
+    changed = np.zeros(len(page), dtype=bool)
+    for col in DERIVED_COLUMNS:
+        fresh = derived[col].to_numpy()
+        if col not in page.columns:
+            changed |= ~np.isnan(fresh)
+            continue
+        stored = pd.to_numeric(page[col], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        both_null = np.isnan(stored) & np.isnan(fresh)
+        changed |= ~both_null & ~(stored == fresh)
+    return changed
+
+def update_rows(page: pd.DataFrame, derived: pd.DataFrame) -> List[Dict[str, object]]:
+    """Upsert payloads: key + required columns as read + the recomputed columns (NaN -> null)."""
+    out = pd.concat([page[[KEY, *REQUIRED_COLUMNS]], derived], axis=1)
+    out = out.astype(object).where(out.notna(), None)
+    return out.to_dict("records")
+
+# ━━━ SOURCES ━━━
+
+def iter_postgrest_pages(
+    supabase_url: str,
+    api_key: str,
+    page_size: int,
+    columns: List[str] = READ_COLUMNS,
+    key: str = KEY,
+    after: Optional[object] = None,
+    filters: Sequence[str] = (),
+) -> Iterator[pd.DataFrame]:
+    """Keyset pages of pay_reports ordered by `key` (comma-separated for a compound keyset)."""
+    keys = key.split(",")
+    while True:
+        for attempt in range(1, postgrest.MAX_RETRIES + 2):
+            code, rows = postgrest.postgrest_select_page(supabase_url, api_key, TABLE, columns, key, after, page_size, filters)
+            if code == 200 or code not in postgrest.RETRYABLE_CODES or attempt > postgrest.MAX_RETRIES:
+                break
+            time.sleep(min(30.0, 2 ** attempt))
+        if code != 200:
+            raise SystemExit(f"❌ Reading {TABLE} after {key}={after} failed (HTTP {code}): {str(rows)[:500]}")
+        if not rows:
+            return
+        page = pd.DataFrame(rows, columns=columns)
+        last = page[keys].iloc[-1]
+        after = last.iloc[0] if len(keys) == 1 else tuple(last)
+        yield page
+        if len(rows) < page_size:
+            return
+
+def iter_csv_pages(path: str, page_size: int, columns: List[str] = READ_COLUMNS) -> Iterator[pd.DataFrame]:
+    """A pay_reports CSV export in page_size chunks; derived columns it lacks count as NULL."""
+    wanted = set(columns)
+    for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""],
+                             usecols=lambda c: c in wanted, chunksize=page_size):
+        yield chunk.reset_index(drop=True)
+
+# ━━━ CLI ━━━
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Recompute pay_reports bill rates and rental snapshots in bulk.")
+    parser.add_argument("--db", default=LOOKUP_DB_PATH, help=f"Local lookup DB with housing + GSA (default: {LOOKUP_DB_PATH})")
+    parser.add_argument("--fiscal-year", type=int, default=None, help="GSA fiscal year for lodging (default: current)")
+    parser.add_argument("--csv", default=None, help="Read a pay_reports CSV export instead of Supabase")
+    parser.add_argument("--output", default=None, help="Write changed rows to this CSV instead of upserting")
+    parser.add_argument("--dry-run", action="store_true", help="Only count rows that would change")
+    parser.add_argument("--full", action="store_true", help="Write every row, not only the ones that changed")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"Rows per keyset page (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--batch-size", type=int, default=postgrest.DEFAULT_BATCH_SIZE, help="Initial upsert batch size")
+    parser.add_argument("--concurrency", type=int, default=postgrest.DEFAULT_CONCURRENCY, help="Upsert batches in flight")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    lookup = LocalLookup(args.db)
+    arrays = load_zip_arrays(lookup, args.fiscal_year)
+    lookup.close()
+
+    supabase_url = api_key = ""
+    if args.csv is None or not (args.output or args.dry_run):
+        postgrest.load_dotenv_if_present()
+        supabase_url, api_key = postgrest.supabase_url_from_env(), postgrest.pick_key()
+    pages = iter_csv_pages(args.csv, args.page_size) if args.csv else iter_postgrest_pages(supabase_url, api_key, args.page_size)
+    if args.output and os.path.exists(args.output):
+        os.remove(args.output)
+
+    started = time.monotonic()
+    scanned = changed = written = failed = 0
+    for page in pages:
+        derived = recompute(page, arrays)
+        mask = np.ones(len(page), dtype=bool) if args.full else changed_mask(page, derived)
+        scanned += len(page)
+        changed += int(mask.sum())
+        if mask.any() and not args.dry_run:
+            if args.output:
+                out = pd.concat([page.loc[mask, [KEY]], derived[mask]], axis=1)
+                out.to_csv(args.output, mode="a", header=not os.path.exists(args.output), index=False)
+                written += len(out)
+            else:
+                stats = postgrest.pipelined_upsert(
+                    supabase_url, api_key, TABLE, update_rows(page[mask], derived[mask]),
+                    concurrency=args.concurrency, batch_size=args.batch_size, key=KEY,
+                )
+                written += stats.updated
+                failed += stats.failed_rows
+        print(f"📊 {scanned:,} reports scanned, {changed:,} changed ({time.monotonic() - started:.1f}s)")
+
+    target = args.output or f"{TABLE} (upsert)"
+    action = "would change" if args.dry_run else f"written to {target}"
+    print(f"✅ Backfill complete: {changed:,} of {scanned:,} reports {action}"
+          + ("" if args.dry_run else f" ({written:,} ok, {failed:,} failed)"))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+ETL Benchmark Harness — Python pipelines (housing, Layer 3, Layer 4, facility push)
+
+Builds deterministic synthetic fixtures at 1x/10x/100x production size and times each
+pipeline stage in a fresh subprocess so peak RSS is attributable to that stage alone.
+Records wall time, peak RSS and rows/sec, and fails (exit 1) when a stage regresses
+past the tolerance against the stored baseline. A missing baseline, or a stage/scale it has
+no entry for, fails too: baselines are machine-specific, so record one on the reference
+machine with --update-baseline before gating on it.
+
+Usage:
+  python scripts/bench_etl.py                       # scales 1,10 vs bench_baseline.json
+  python scripts/bench_etl.py --scales 1,10,100 --stages layer4_routing,housing_sql_insert
+  python scripts/bench_etl.py --update-baseline     # record the current numbers as the baseline
+
+Fixtures: ZIP housing rows follow fallback_mock_generator() (seeded, 38,601 ZIPs at 1x);
+facility/AHRQ rows replicate the repo's layer4_facilities_FINAL.csv and
+ahrq_hospital_linkage.csv with suffixed IDs; Layer 3 job feeds scale from 250k rows at 1x
+against a fixed country-sized housing export; pay-report names are noisy copies of
+facility names (20k at 1x).
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+import pandas as pd
+
+SCRIPTS_DIR = Path(__file__).resolve().parent
+REPO_ROOT = SCRIPTS_DIR.parent
+sys.path.insert(0, str(SCRIPTS_DIR))
+sys.path.insert(0, str(REPO_ROOT))
+
+DEFAULT_BASELINE = SCRIPTS_DIR / "bench_baseline.json"
+DEFAULT_SCALES = [1, 10]
+DEFAULT_TOLERANCE = 0.25
+
+HOUSING_ROWS_1X = 38_601
+ZORI_ROWS_1X = 7_500
+ZORI_MONTHS = 120
+JOB_ROWS_1X = 250_000
+REPORT_ROWS_1X = 20_000
+
+# ━━━ FIXTURES ━━━
+
+def build_housing_fixture(path: Path, scale: int) -> None:
+    """Merged HUD+ZORI frame shaped like fetch_housing_data's merge, seeded like the CI mock."""
+    metro_areas = [
+        "New York-Newark-Jersey City, NY-NJ-PA HUD Metro FMR Area",
+        "Los Angeles-Long Beach-Anaheim, CA HUD Metro FMR Area",
+        "Chicago-Naperville-Elgin, IL-IN-WI HUD Metro FMR Area",
+        "Dallas-Fort Worth-Arlington, TX HUD Metro FMR Area",
+    ]
+    n = HOUSING_ROWS_1X * scale
+    rng = np.random.default_rng(42)
+    studio = rng.integers(800, 2000, n)
+    br1 = studio + rng.integers(100, 300, n)
+    br2 = br1 + rng.integers(100, 300, n)
+    br3 = br2 + rng.integers(200, 400, n)
+    br4 = br3 + rng.integers(200, 500, n)
+    zori = np.where(rng.random(n) > 0.3, br1 + rng.uniform(-100, 500, n), np.nan)
+    pd.DataFrame({
+        "zip": [str(i).zfill(5) for i in range(501, 501 + n)],
+        "metro_area": np.asarray(metro_areas, dtype=object)[rng.integers(0, len(metro_areas), n)],
+        "fmr_studio": studio.astype(float), "fmr_1br": br1.astype(float), "fmr_2br": br2.astype(float),
+        "fmr_3br": br3.astype(float), "fmr_4br": br4.astype(float), "zori_rent": zori,
+    }).to_pickle(path)
+
+def build_zori_fixture(path: Path, scale: int) -> None:
+    """Wide Zillow-style CSV: metadata columns followed by ZORI_MONTHS month-end columns."""
+    n = ZORI_ROWS_1X * scale
+    rng = np.random.default_rng(7)
+    months = pd.date_range("2015-01-31", periods=ZORI_MONTHS, freq="ME").strftime("%Y-%m-%d")
+    with path.open("w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f)
+        w.writerow(["RegionID", "SizeRank", "RegionName", "RegionType", "StateName", *months])
+        for start in range(0, n, 10_000):
+            rows = min(10_000, n - start)
+            rents = np.round(rng.uniform(900, 3500, (rows, ZORI_MONTHS)), 2).astype(str)
+            for i in range(rows):
+                w.writerow([start + i, start + i, 501 + start + i, "zip", "CA", *rents[i]])
+
+def _replica_ccns(ccns: pd.Series, lookup: Dict[str, int], k: int) -> pd.Series:
+    """Replica k's CCNs: distinct, valid 6-char base-36 codes, consistent across fixture files."""
+    alphabet = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+    def to_base36(n: int) -> str:
+        out = ""
+        for _ in range(6):
+            n, r = divmod(n, 36)
+            out = alphabet[r] + out
+        return out
+    return ccns.map(lambda c: c if pd.isna(c) else to_base36(k * 10_000_000 + lookup[c]))
+
+def build_facility_fixtures(fac_path: Path, ahrq_path: Path, scale: int) -> None:
+    """Replicates the repo's Layer 4 and AHRQ CSVs `scale` times; replicas get fresh valid CCNs."""
+    fac = pd.read_csv(SCRIPTS_DIR / "layer4_facilities_FINAL.csv", dtype=str)
+    ahrq = pd.read_csv(SCRIPTS_DIR / "ahrq_hospital_linkage.csv", dtype=str, encoding="latin-1")
+    lookup = {c: i for i, c in enumerate(sorted(set(fac["facility_id"].dropna()) | set(ahrq["ccn"].dropna())))}
+    fac_parts, ahrq_parts = [], []
+    for k in range(scale):
+        if k == 0:
+            fac_parts.append(fac)
+            ahrq_parts.append(ahrq)
+            continue
+        fac_parts.append(fac.assign(facility_id=_replica_ccns(fac["facility_id"], lookup, k)))
+        ahrq_parts.append(ahrq.assign(ccn=_replica_ccns(ahrq["ccn"], lookup, k)))
+    pd.concat(fac_parts, ignore_index=True).to_csv(fac_path, index=False)
+    pd.concat(ahrq_parts, ignore_index=True).to_csv(ahrq_path, index=False, encoding="latin-1")
+
+def build_job_feed_fixtures(housing_path: Path, jobs_path: Path, scale: int) -> None:
+    """Layer 3 inputs: a country-sized housing export (fixed, ZIPs are 5-digit) and a scaled job feed."""
+    rng = np.random.default_rng(11)
+    zips = rng.choice(np.arange(501, 100_000), HOUSING_ROWS_1X, replace=False)
+    fmr_1br = rng.integers(900, 2500, HOUSING_ROWS_1X).astype(float)
+    pd.DataFrame({
+        "zip": [f"{z:05d}" for z in zips],
+        "city": rng.choice(["Mesa", "Dallas", "Miami", "Akron", "Boise", "Tulsa"], HOUSING_ROWS_1X),
+        "state": rng.choice(["AZ", "TX", "FL", "OH", "ID", "OK"], HOUSING_ROWS_1X),
+        "fmr_1br": fmr_1br,
+        "zori_rent": np.where(rng.random(HOUSING_ROWS_1X) > 0.3, fmr_1br + rng.uniform(-100, 500, HOUSING_ROWS_1X), np.nan),
+        "gsa_monthly_stipend": rng.integers(3000, 6000, HOUSING_ROWS_1X).astype(float),
+    }).to_csv(housing_path, index=False)
+
+    n = JOB_ROWS_1X * scale
+    block = 1_000_000
+    for start in range(0, n, block):
+        m = min(block, n - start)
+        job_zips = np.where(rng.random(m) < 0.9, rng.choice(zips, m), rng.integers(501, 100_000, m))
+        pd.DataFrame({
+            "zip_code": [f"{z:05d}" for z in job_zips],
+            "profession": rng.choice(["RN", "Allied"], m),
+            "specialty": rng.choice(["ICU", "MedSurg", "Cath Lab Tech", "Rad Tech"], m),
+            "is_sub_vendor": rng.random(m) < 0.5,
+            "gross_weekly_pay": rng.uniform(1800, 3200, m).round(2),
+        }).to_csv(jobs_path, index=False, mode="w" if start == 0 else "a", header=(start == 0))
+
+def build_pay_report_fixture(path: Path, scale: int) -> None:
+    """Raw facility names as travelers type them: case changes, dropped words, typos, missing ZIPs."""
+    fac = pd.read_csv(SCRIPTS_DIR / "layer4_facilities_FINAL.csv", dtype=str)
+    rng = random.Random(5)
+    rows = []
+    for _ in range(REPORT_ROWS_1X * scale):
+        f = fac.iloc[rng.randrange(len(fac))]
+        words = f["facility_name"].split()
+        op = rng.random()
+        if op < 0.3:
+            words = [w.title() for w in words]
+        elif op < 0.6 and len(words) > 2:
+            words.pop(rng.randrange(len(words)))
+        name = " ".join(words)
+        if rng.random() < 0.2:
+            i = rng.randrange(len(name))
+            name = name[:i] + name[i + 1:]
+        rows.append((name, f["zip_code"] if rng.random() < 0.9 else "", f["facility_id"]))
+    pd.DataFrame(rows, columns=["facility_name_raw", "zip_code", "expected_facility_id"]).to_csv(path, index=False)
+
+def ensure_fixtures(root: Path, scale: int) -> Path:
+    d = root / f"x{scale}"
+    d.mkdir(parents=True, exist_ok=True)
+    builders = [
+        ("housing.pkl", lambda p: build_housing_fixture(p, scale)),
+        ("zori.csv", lambda p: build_zori_fixture(p, scale)),
+    ]
+    for name, build in builders:
+        if not (d / name).exists():
+            build(d / name)
+    if not (d / "facilities.csv").exists() or not (d / "ahrq.csv").exists():
+        build_facility_fixtures(d / "facilities.csv", d / "ahrq.csv", scale)
+    if not (d / "pay_reports.csv").exists():
+        build_pay_report_fixture(d / "pay_reports.csv", scale)
+    if not (d / "l3_housing.csv").exists() or not (d / "l3_jobs.csv").exists():
+        build_job_feed_fixtures(d / "l3_housing.csv", d / "l3_jobs.csv", scale)
+    return d
+
+# ━━━ STAGES ━━━
+# Each stage takes (fixture_dir, work_dir) and returns the number of rows it processed.
+
+def stage_housing_sql_insert(fx: Path, work: Path) -> int:
+    import fetch_housing_data as fhd
+    merged = pd.read_pickle(fx / "housing.pkl")
+    fhd.OUTPUT_SQL_FILE = str(work / "insert_zip_housing.sql")
+    fhd.generate_sql_seed(merged, "2026-01-31")
+    return len(merged)
+
+def stage_housing_sql_copy(fx: Path, work: Path) -> int:
+    import fetch_housing_data as fhd
+    merged = pd.read_pickle(fx / "housing.pkl")
+    fhd.OUTPUT_SQL_FILE = str(work / "insert_zip_housing.sql")
+    fhd.generate_copy_seed(merged, "2026-01-31")
+    return len(merged)
+
+def stage_zori_parse(fx: Path, work: Path) -> int:
+    import fetch_housing_data as fhd
+    _, months = fhd.sniff_zori_header(fx / "zori.csv")
+    zips, _ = fhd.read_zori_columns(fx / "zori.csv", [months[-1]])
+    return len(zips)
+
+def stage_layer4_routing(fx: Path, work: Path) -> int:
+    import seed_layer4_facilities as l4
+    hospitals = pd.read_csv(fx / "facilities.csv", dtype=str)
+    # Keep the AHRQ-derived health_system; clear everything the router assigns
+    for col in [c for c in l4.ROUTING_COLUMNS if c != "health_system"] + ["msp_notes"]:
+        hospitals[col] = None
+    routed = l4.apply_routing_engine(hospitals)
+    return len(routed)
+
+def stage_layer4_reroute(fx: Path, work: Path) -> int:
+    """Routing-only rebuild: a cold pass that seeds the manifest, then a re-run after one rule edit."""
+    import shutil
+    import seed_layer4_facilities as l4
+    shutil.copy(fx / "facilities.csv", work / l4.LAYER4_OUTPUT_PATH)
+    shutil.copy(fx / "ahrq.csv", work / "ahrq_hospital_linkage.csv")
+    with contextlib.chdir(work):
+        l4.build_facility_matrix(routing_only=True)
+        l4.SYSTEM_MAP["MERCY"] = l4.SYSTEM_MAP["MERCY"][:5] + (60,)
+        l4.build_facility_matrix(routing_only=True)
+    return len(pd.read_csv(work / l4.LAYER4_OUTPUT_PATH, usecols=[0]))
+
+def stage_layer3_arbitrage(fx: Path, work: Path) -> int:
+    import seed_layer3_arbitrage as l3
+    with contextlib.chdir(work):
+        l3.build_arbitrage_engine()
+    return len(pd.read_csv(work / "layer3_market_analysis_SEED.csv", usecols=[0]))
+
+def stage_layer3_full(fx: Path, work: Path) -> int:
+    import seed_layer3_arbitrage as l3
+    return l3.run_production_engine(fx / "l3_housing.csv", [fx / "l3_jobs.csv"], output_path=None, index_path=work / "index.sql")
+
+def stage_layer3_sweep(fx: Path, work: Path) -> int:
+    import seed_layer3_arbitrage as l3
+    grid = l3.scenario_grid(*(l3.parse_sweep_values(v) for v in (l3.SWEEP_MARGINS, l3.SWEEP_PENALTIES, l3.SWEEP_HOURS)))
+    bands = l3.run_margin_sweep(fx / "l3_housing.csv", [fx / "l3_jobs.csv"], grid, output_path=work / "bands.csv")
+    return int(bands["jobs"].sum())
+
+def stage_facility_resolve(fx: Path, work: Path) -> int:
+    import resolve_facility_names as resolver
+    index = resolver.FacilityNameIndex.from_csv(str(SCRIPTS_DIR / "layer4_facilities_FINAL.csv"))
+    reports = pd.read_csv(fx / "pay_reports.csv", dtype=str)
+    resolved = index.resolve(reports["facility_name_raw"], reports["zip_code"])
+    return len(resolved)
+
+def stage_ahrq_join(fx: Path, work: Path) -> int:
+    import facility_enrichment as fe
+    facilities = pd.read_csv(fx / "facilities.csv", dtype=str)
+    sources = fe.load_sources([dict(fe.ENRICHMENT_SOURCES[0], path=str(fx / "ahrq.csv"))])
+    enriched = fe.enrich_facilities(facilities, sources)
+    return len(fe.intel_output(enriched, facilities.columns.tolist()))
+
+def stage_facility_payloads(fx: Path, work: Path) -> int:
+    import push_facility_intel as push
+    with (fx / "facilities.csv").open("r", encoding="utf-8-sig", newline="") as f:
+        built = [p for p in (push.build_payload(r) for r in csv.DictReader(f)) if p is not None]
+    manifest = push.open_manifest(work / "bench.manifest.sqlite")
+    changed, hashes, _, _, _ = push.diff_against_manifest(manifest, built)
+    push.record_manifest(manifest, hashes, [p["facility_id"] for p in changed], [])
+    manifest.close()
+    return len(built)
+
+class _StubPostgrest(BaseHTTPRequestHandler):
+    """Accepts every upsert with a latency proportional to payload size."""
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self) -> None:
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        time.sleep(0.005 + len(body) / 50e6)
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+def stage_facility_upsert(fx: Path, work: Path) -> int:
+    import push_facility_intel as push
+    with (fx / "facilities.csv").open("r", encoding="utf-8-sig", newline="") as f:
+        built = [p for p in (push.build_payload(r) for r in csv.DictReader(f)) if p is not None]
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _StubPostgrest)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        stats = push.pipelined_upsert(url, "bench", "facility_intel", built)
+    finally:
+        server.shutdown()
+    return stats.updated
+
+STAGES: Dict[str, Callable[[Path, Path], int]] = {
+    "housing_sql_insert": stage_housing_sql_insert,
+    "housing_sql_copy": stage_housing_sql_copy,
+    "zori_parse": stage_zori_parse,
+    "layer4_routing": stage_layer4_routing,
+    "layer4_reroute": stage_layer4_reroute,
+    "layer3_arbitrage": stage_layer3_arbitrage,
+    "layer3_full": stage_layer3_full,
+    "layer3_sweep": stage_layer3_sweep,
+    "ahrq_join": stage_ahrq_join,
+    "facility_resolve": stage_facility_resolve,
+    "facility_payloads": stage_facility_payloads,
+    "facility_upsert": stage_facility_upsert,
+}
+
+# ━━━ RUNNER ━━━
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process. Prefers VmHWM, since Linux carries ru_maxrss across exec from the parent."""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+def run_stage_in_process(name: str, fixture_dir: Path) -> Dict[str, Any]:
+    """Child-process entry point: runs one stage with its output silenced."""
+    logging.getLogger().setLevel(logging.WARNING)
+    with tempfile.TemporaryDirectory() as work, contextlib.redirect_stdout(io.StringIO()):
+        random.seed(42)
+        t0 = time.perf_counter()
+        rows = STAGES[name](fixture_dir, Path(work))
+        wall = time.perf_counter() - t0
+    peak_mb = peak_rss_mb()
+    return {
+        "rows": rows,
+        "wall_s": round(wall, 4),
+        "peak_rss_mb": round(peak_mb, 1),
+        "rows_per_sec": round(rows / wall, 1) if wall > 0 else None,
+    }
+
+def run_stage(name: str, fixture_dir: Path) -> Dict[str, Any]:
+    proc = subprocess.run(
+        [sys.executable, __file__, "--run-stage", name, "--fixture-dir", str(fixture_dir)],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"Stage {name} failed:\n{proc.stderr[-2000:]}")
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    regressions = []
+    for key, cur in results.items():
+        base = baseline.get(key)
+        if not base:
+            regressions.append(f"{key}: no baseline entry (record one with --update-baseline)")
+            continue
+        for metric in ("wall_s", "peak_rss_mb"):
+            if base.get(metric) and cur[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{key} {metric}: {cur[metric]} vs baseline {base[metric]} (+{tolerance:.0%} allowed)")
+    return regressions
+
+def parse_args(argv: List[str] | None = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the Python ETL stages on synthetic fixtures.")
+    parser.add_argument("--scales", default=",".join(map(str, DEFAULT_SCALES)), help="Comma list, e.g. 1,10,100")
+    parser.add_argument("--stages", default=",".join(STAGES), help="Comma list of stage names")
+    parser.add_argument("--fixtures", default=os.path.join(tempfile.gettempdir(), "perdiem_bench_fixtures"))
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help="Allowed fractional slowdown")
+    parser.add_argument("--update-baseline", action="store_true")
+    parser.add_argument("--run-stage", help=argparse.SUPPRESS)
+    parser.add_argument("--fixture-dir", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv: List[str] | None = None) -> int:
+    args = parse_args(argv)
+    if args.run_stage:
+        print(json.dumps(run_stage_in_process(args.run_stage, Path(args.fixture_dir))))
+        return 0
+
+    scales = [int(s) for s in args.scales.split(",") if s]
+    stages = [s for s in args.stages.split(",") if s]
+    unknown = [s for s in stages if s not in STAGES]
+    if unknown:
+        raise SystemExit(f"❌ Unknown stage(s): {', '.join(unknown)}. Available: {', '.join(STAGES)}")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for scale in scales:
+        print(f"\n🧪 Building fixtures at {scale}x in {args.fixtures}...")
+        fixture_dir = ensure_fixtures(Path(args.fixtures), scale)
+        for name in stages:
+            r = run_stage(name, fixture_dir)
+            results[f"{name}@{scale}x"] = r
+            print(f"   {name:<20} {scale:>4}x  {r['rows']:>10,} rows  {r['wall_s']:>8.3f}s  "
+                  f"{r['peak_rss_mb']:>8.1f} MB  {r['rows_per_sec'] or 0:>12,.0f} rows/s")
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        merged = json.loads(baseline_path.read_text()) if baseline_path.exists() else {}
+        merged.update(results)
+        baseline_path.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
+        print(f"\n💾 Baseline updated: {baseline_path}")
+        return 0
+
+    if not baseline_path.exists():
+        print(f"\n❌ No baseline at {baseline_path}. Run with --update-baseline to record one.")
+        return 1
+
+    regressions = compare(results, json.loads(baseline_path.read_text()), args.tolerance)
+    if regressions:
+        print("\n❌ REGRESSIONS:")
+        for line in regressions:
+            print(f"   {line}")
+        return 1
+    print("\n✅ No regressions against baseline.")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Facility Enrichment Stage — CMS hospitals x AHRQ (x future sources) in one indexed pass
+
+Every source is read once, with only the columns it contributes and typed dtypes (from its
+artifact_store sidecar when one is current), and indexed by an integer-encoded CCN.
+Joining a source is a single hash lookup (Index.get_indexer) from the hospital keys, so
+nothing is string-padded or re-merged.
+
+One pass feeds both outputs:
+  - the Layer 4 facility matrix (health_system from AHRQ, left-join semantics)
+  - enriched_facilities_intel.csv (facilities with an AHRQ record + beds/discharges/revenue)
+
+Adding a source = appending a spec to ENRICHMENT_SOURCES.
+
+Usage (re-enrich an existing matrix without refetching CMS):
+  python facility_enrichment.py
+  python facility_enrichment.py --facilities layer4_facilities_FINAL.csv --ahrq /path/to/chsp-hospital-linkage-2023.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import read_artifact, write_artifact
+
+FACILITIES_PATH = "layer4_facilities_FINAL.csv"
+ENRICHED_OUTPUT_PATH = "enriched_facilities_intel.csv"
+CCN_WIDTH = 6
+CCN_RADIX = 36  # CCNs are 6 alphanumerics ('010001', '01014F'); base 36 packs them losslessly into int64
+
+# key -> column holding the CCN; columns -> dtype; intel -> columns carried into the enriched intel output
+ENRICHMENT_SOURCES: List[Dict[str, Any]] = [
+    {
+        "name": "ahrq",
+        "path": "ahrq_hospital_linkage.csv",
+        "encodings": ["utf-8", "latin-1"],
+        "key": "ccn",
+        "aliases": {"ID_MCR": "ccn", "SYS_NAME": "health_sys_name"},  # older AHRQ linkage headers
+        "columns": {
+            "health_sys_name": "string",
+            "corp_parent_name": "string",
+            "hos_beds": "Int32",
+            "hos_dsch": "Int32",
+            "hos_net_revenue": "Int64",
+            "hos_ucburden": "float64",
+        },
+        "intel": ["hos_beds", "hos_dsch", "corp_parent_name", "hos_net_revenue", "hos_ucburden"],
+    },
+]
+
+def encode_ccn(values: pd.Series) -> np.ndarray:
+    """CCN strings -> int64 keys (base 36 over 6 chars). Missing or malformed CCNs become -1."""
+    text = values.astype("string").str.strip().str.upper()
+    numeric = text.str.fullmatch(r"\d{1,6}").fillna(False)
+    text = text.where(~numeric, text.str.zfill(CCN_WIDTH))  # numeric CCNs that lost their leading zeros
+    valid = text.str.fullmatch(r"[0-9A-Z]{6}").fillna(False).to_numpy()
+
+    keys = np.full(len(text), -1, dtype=np.int64)
+    if valid.any():
+        raw = np.frombuffer(text[valid].str.cat().encode("ascii"), dtype=np.uint8).reshape(-1, CCN_WIDTH)
+        digits = np.where(raw <= ord("9"), raw - ord("0"), raw - ord("A") + 10).astype(np.int64)
+        keys[valid] = digits @ (CCN_RADIX ** np.arange(CCN_WIDTH - 1, -1, -1, dtype=np.int64))
+    return keys
+
+def load_source(spec: Dict[str, Any]) -> Optional[pd.DataFrame]:
+    """Reads one source's key + contributed columns once, indexed by integer CCN. None if absent."""
+    path = spec["path"]
+    if not os.path.exists(path):
+        print(f"⚠️ {spec['name'].upper()} source not found at '{path}'. Skipping.")
+        return None
+    columns = spec["columns"]
+    aliases = spec.get("aliases", {})
+    wanted = {spec["key"], *columns, *aliases}
+    # Typed sidecar when current; source files are upstream downloads, so "N/A" & co. mean missing
+    df = read_artifact(path, wanted, encodings=spec.get("encodings", ["utf-8"]), default_na=True)
+
+    df = df.rename(columns={a: c for a, c in aliases.items() if c not in df.columns})
+    missing = [c for c in [spec["key"], *columns] if c not in df.columns]
+    if missing:
+        print(f"⚠️ {spec['name'].upper()} file is missing expected column(s): {missing}")
+        return None
+
+    typed = pd.DataFrame(index=pd.Index(encode_ccn(df[spec["key"]]), name="ccn_key"))
+    for col, dtype in columns.items():
+        if dtype == "string":
+            typed[col] = df[col].astype("string").array
+        else:
+            typed[col] = pd.to_numeric(df[col], errors="coerce").astype(dtype).array
+    typed = typed[typed.index >= 0]
+    return typed[~typed.index.duplicated(keep="first")]
+
+def load_sources(specs: Optional[List[Dict[str, Any]]] = None) -> Dict[str, pd.DataFrame]:
+    loaded = {}
+    for spec in specs if specs is not None else ENRICHMENT_SOURCES:
+        df = load_source(spec)
+        if df is not None:
+            loaded[spec["name"]] = df
+    return loaded
+
+def enrich_facilities(hospitals: pd.DataFrame, sources: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+    """
+    Joins every loaded source onto hospitals in one pass. Adds each source's columns plus a
+    `<name>_matched` flag; the row set and order of `hospitals` are unchanged (left join).
+    """
+    keys = encode_ccn(hospitals["facility_id"])
+    enriched = hospitals.copy()
+    for name, source in sources.items():
+        joined = source.reindex(keys)  # hash lookup on the unique int64 index; -1 / unknown -> NA
+        for col in source.columns:
+            enriched[col] = joined[col].array
+        enriched[f"{name}_matched"] = source.index.get_indexer(keys) >= 0
+    return enriched
+
+def intel_output(enriched: pd.DataFrame, matrix_columns: List[str], specs: Optional[List[Dict[str, Any]]] = None) -> pd.DataFrame:
+    """Enriched intel = matrix columns + ccn + each source's intel columns, for facilities AHRQ knows."""
+    specs = specs if specs is not None else ENRICHMENT_SOURCES
+    intel_cols = [c for spec in specs for c in spec.get("intel", []) if c in enriched.columns]
+    if "ahrq_matched" not in enriched.columns:
+        return pd.DataFrame(columns=matrix_columns + ["ccn"] + intel_cols)
+    intel = enriched.loc[enriched["ahrq_matched"], matrix_columns + intel_cols].reset_index(drop=True)
+    intel.insert(len(matrix_columns), "ccn", intel["facility_id"])  # the join key, kept for existing readers
+    return intel
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Re-run the facility enrichment join on an existing Layer 4 matrix.")
+    parser.add_argument("--facilities", default=FACILITIES_PATH, help=f"Layer 4 matrix CSV (default: {FACILITIES_PATH})")
+    parser.add_argument("--ahrq", default=None, help="Override the AHRQ linkage CSV path")
+    parser.add_argument("--output", default=ENRICHED_OUTPUT_PATH, help=f"Enriched intel CSV (default: {ENRICHED_OUTPUT_PATH})")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    specs = [dict(s, path=args.ahrq) if s["name"] == "ahrq" and args.ahrq else s for s in ENRICHMENT_SOURCES]
+    facilities = read_artifact(args.facilities)
+    matrix_columns = facilities.columns.tolist()
+
+    enriched = enrich_facilities(facilities, load_sources(specs))
+    intel = intel_output(enriched, matrix_columns, specs)
+    write_artifact(intel, args.output)
+    print(f"✅ Joined {len(intel):,} / {len(facilities):,} facilities with AHRQ financial/operational data -> {args.output}")
+
+    if len(intel):
+        print("\nTop 5 Facilities by Bed Count (Demand Signal) with Corporate Parent (MSP Proxy):")
+        top = intel.sort_values("hos_beds", ascending=False, na_position="last")
+        print(top[["facility_name", "state", "hos_beds", "hos_dsch", "corp_parent_name", "hos_net_revenue"]].head().to_string(index=False))
+
+if __name__ == "__main__":
+    main()
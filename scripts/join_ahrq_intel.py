@@ -1,31 +1,13 @@
-import pandas as pd
+# Kept for the original repo-root invocation; the join itself is facility_enrichment's
+# single indexed pass (also run by seed_layer4_facilities.build_facility_matrix()).
+import facility_enrichment
 
-# Load the core facility list (has facility_id which is actually the CMS Certification Number)
-facilities = pd.read_csv('scripts/layer4_facilities_FINAL.csv')
+FACILITIES_PATH = 'scripts/layer4_facilities_FINAL.csv'
+AHRQ_LINKAGE_PATH = '/Users/k.far.88/Downloads/chsp-hospital-linkage-2023.csv'
+OUTPUT_PATH = 'scripts/enriched_facilities_intel.csv'
 
-# Load the AHRQ linkage file (has ccn which matches facility_id)
-ahrq = pd.read_csv('/Users/k.far.88/Downloads/chsp-hospital-linkage-2023.csv', dtype={'ccn': str}, encoding='latin-1')
+def main():
+    facility_enrichment.main(['--facilities', FACILITIES_PATH, '--ahrq', AHRQ_LINKAGE_PATH, '--output', OUTPUT_PATH])
 
-# Ensure join keys are strings and padded correctly
-facilities['facility_id'] = facilities['facility_id'].astype(str).str.zfill(6)
-ahrq['ccn'] = ahrq['ccn'].astype(str).str.zfill(6)
-
-# Perform the hidden join you didn't realize you had
-enriched = pd.merge(
-    facilities,
-    ahrq[['ccn', 'hos_beds', 'hos_dsch', 'corp_parent_name', 'hos_net_revenue', 'hos_ucburden']],
-    left_on='facility_id',
-    right_on='ccn',
-    how='inner'
-)
-
-# Show the highest value hidden insights
-top_insights = enriched.sort_values('hos_beds', ascending=False)[
-    ['facility_name', 'state', 'hos_beds', 'hos_dsch', 'corp_parent_name', 'hos_net_revenue']
-]
-
-print("Joined", len(enriched), "facilities with AHRQ financial/operational data.")
-print("\nTop 5 Facilities by Bed Count (Demand Signal) with Corporate Parent (MSP Proxy):")
-print(top_insights.head().to_string(index=False))
-
-enriched.to_csv('scripts/enriched_facilities_intel.csv', index=False)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,524 @@
+#!/usr/bin/env python3
+"""
+Local Lookup DB — offline GSA stipend / housing / facility lookups by ZIP
+
+Compiles gsa_zip_mappings, gsa_rates, zip_housing_costs, ZIP centroids and the Layer 4 facility matrix into
+one read-only SQLite file (LOOKUP_DB_PATH). Every table is WITHOUT ROWID and keyed the way
+src/lib/gsa.ts queries it, so a lookup is one B-tree probe instead of a Supabase round-trip.
+LocalLookup mirrors the TypeScript semantics:
+  - location():  ZIP -> mapping for the current GSA fiscal year, else the latest year on file
+  - gsa_rates(): destination_id -> this month's seasonal lodging (max_lodging fallback),
+                 weekly_max / monthly_total with the (lodging + meals) * 7 / * 30 fallbacks
+  - stipend():   both of the above in a single query
+  - housing():   lookupHudFmr, including ZIP normalization and the toFixed(2) market_ratio
+  - centroid():  ZIP -> (latitude, longitude), the points radius_index.py indexes
+
+The build also precomputes gsa_seasonal: for every destination, fiscal year and contract start
+month, the day-weighted lodging and M&IE totals of a 13-week contract and of its first 30 days.
+Each metric is one row of 12 start-month columns, so a contract projection is one lookup
+(contract_totals()) and scoring jobs load a whole metric as a (destinations x 12) matrix
+(seasonal_matrix()) instead of looping over months.
+
+Sources may be CSV table exports or the INSERT-format seeds this repo generates
+(insert_zips.sql, insert_zip_housing.sql from `fetch_housing_data.py --format insert`); ZIP
+centroids also load from a Census ZCTA gazetteer file (2023_Gaz_zcta_national.txt).
+Missing sources are skipped; their lookups return None.
+
+Usage:
+  python local_lookup.py build --zips ../insert_zips.sql --gsa-rates gsa_rates.csv --housing zip_housing_costs.csv
+  python local_lookup.py query 90210 07030
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import os
+import re
+import sqlite3
+import time
+from datetime import date, datetime, timedelta, timezone
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import coerce_types, read_artifact
+
+LOOKUP_DB_PATH = "perdiem_lookup.sqlite"
+LOOKUP_SCHEMA_VERSION = 3
+DEFAULT_ZIPS_PATH = "../insert_zips.sql"
+DEFAULT_GSA_RATES_PATH = "gsa_rates.csv"
+DEFAULT_HOUSING_PATH = "zip_housing_costs.csv"
+DEFAULT_FACILITIES_PATH = "layer4_facilities_FINAL.csv"
+DEFAULT_CENTROIDS_PATH = "zip_centroids.csv"
+
+MONTHS = ["jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"]
+SEASONAL_COLUMNS = [f"start_{m}" for m in MONTHS]
+CONTRACT_DAYS = 13 * 7
+MONTH_DAYS = 30  # gsa.ts prices a month as 30 days
+SEASONAL_METRICS = ["lodging_13wk", "mie_13wk", "lodging_30d", "mie_30d"]
+FMR_COLUMNS = ["fmr_studio", "fmr_1br", "fmr_2br", "fmr_3br", "fmr_4br"]
+FACILITY_COLUMNS = [
+    "facility_id", "facility_name", "city", "state", "zip_code", "facility_type",
+    "health_system", "msp_gatekeeper", "vms_software", "msp_exclusive", "ehr_system", "radius_rule_miles",
+]
+
+SCHEMA_SQL = f"""
+CREATE TABLE gsa_zip_mappings (
+    zip TEXT NOT NULL, fiscal_year INTEGER NOT NULL, destination_id TEXT,
+    state TEXT, city TEXT, county TEXT,
+    PRIMARY KEY (zip, fiscal_year)
+) WITHOUT ROWID;
+CREATE TABLE gsa_rates (
+    destination_id TEXT NOT NULL, fiscal_year INTEGER NOT NULL,
+    state TEXT, city TEXT, county TEXT, meals_daily REAL, max_lodging REAL,
+    weekly_max REAL, monthly_total REAL,
+    {", ".join(f"lodging_{m} REAL" for m in MONTHS)},
+    PRIMARY KEY (destination_id, fiscal_year)
+) WITHOUT ROWID;
+CREATE TABLE gsa_seasonal (
+    destination_id TEXT NOT NULL, fiscal_year INTEGER NOT NULL, metric TEXT NOT NULL,
+    {", ".join(f"{c} REAL" for c in SEASONAL_COLUMNS)},
+    PRIMARY KEY (destination_id, fiscal_year, metric)
+) WITHOUT ROWID;
+CREATE TABLE zip_housing_costs (
+    zip TEXT PRIMARY KEY, metro_area TEXT,
+    {", ".join(f"{c} REAL" for c in FMR_COLUMNS)}, zori_rent REAL
+) WITHOUT ROWID;
+CREATE TABLE facilities (
+    facility_id TEXT PRIMARY KEY, facility_name TEXT, city TEXT, state TEXT, zip_code TEXT,
+    facility_type TEXT, health_system TEXT, msp_gatekeeper TEXT, vms_software TEXT,
+    msp_exclusive INTEGER, ehr_system TEXT, radius_rule_miles REAL
+) WITHOUT ROWID;
+CREATE TABLE zip_centroids (zip TEXT PRIMARY KEY, latitude REAL NOT NULL, longitude REAL NOT NULL) WITHOUT ROWID;
+CREATE TABLE build_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+"""
+INDEX_SQL = "CREATE INDEX idx_facilities_zip ON facilities (zip_code, facility_id);"
+
+# The gsa_zip_mappings row lookupLocation picks for every ZIP: fiscal year :fy, else the latest
+PICKED_MAPPINGS_SQL = """
+SELECT zip, destination_id, state, city, county FROM (
+    SELECT zip, destination_id, state, city, county,
+           ROW_NUMBER() OVER (PARTITION BY zip ORDER BY fiscal_year = :fy DESC, fiscal_year DESC) AS pick
+    FROM gsa_zip_mappings
+) WHERE pick = 1
+"""
+
+INSERT_HEADER_RE = re.compile(r"INSERT\s+INTO\s+(\w+)\s*\(([^)]*)\)\s*VALUES", re.IGNORECASE)
+COPY_HEADER_RE = re.compile(r"COPY\s+(\w+)\s*\(([^)]*)\)\s*FROM\s+STDIN", re.IGNORECASE)
+COPY_ESCAPES = {"t": "\t", "n": "\n", "r": "\r", "\\": "\\"}
+
+# ━━━ SOURCES ━━━
+
+def _copy_unescape(value: str) -> Optional[str]:
+    if value == "\\N":
+        return None
+    return re.sub(r"\\(.)", lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), value)
+
+def read_seed_rows(path: str, table: str) -> pd.DataFrame:
+    """
+    Rows of `table` from a seed this repo generates: INSERT ... VALUES with one tuple per line
+    (insert_zips.sql, fetch_housing_data.py --format insert) or a COPY ... FROM STDIN block into
+    `table` or its `<table>_staging` temp table (--format copy). NULL / \\N become NaN.
+    """
+    columns: Optional[List[str]] = None  # set while inside a statement for `table`
+    seed_columns: List[str] = []
+    in_copy = False
+    rows: List[List[Optional[str]]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if in_copy:
+                if line.rstrip("\n") == "\\.":
+                    in_copy, columns = False, None
+                else:
+                    rows.append([_copy_unescape(v) for v in line.rstrip("\n").split("\t")])
+                continue
+            text = line.strip()
+            header = INSERT_HEADER_RE.match(text) or COPY_HEADER_RE.match(text)
+            if header:
+                matches = header.group(1) in (table, f"{table}_staging")
+                columns = [c.strip() for c in header.group(2).split(",")] if matches else None
+                seed_columns = columns or seed_columns
+                in_copy = matches and header.re is COPY_HEADER_RE
+                continue
+            if columns is None or not text.startswith("("):
+                continue
+            inner = text[1:text.rstrip(",;").rfind(")")]
+            values = next(csv.reader([inner], quotechar="'", skipinitialspace=True))
+            rows.append([None if v == "NULL" else v for v in values])
+    if not rows:
+        raise ValueError(f"No {table} rows found in {path}")
+    return pd.DataFrame(rows, columns=seed_columns)
+
+def read_source(path: str, table: str) -> Optional[pd.DataFrame]:
+    """A CSV export or an INSERT seed as text columns. None (with a warning) if the file is absent."""
+    if not path or not os.path.exists(path):
+        print(f"⚠️ {table} source not found at '{path}'. Skipping.")
+        return None
+    if path.lower().endswith(".sql"):
+        return read_seed_rows(path, table)
+    sep = "\t" if path.lower().endswith(".txt") else ","  # Census gazetteer files are tab-separated
+    df = pd.read_csv(path, dtype=str, sep=sep, keep_default_na=False, na_values=[""])
+    return df.rename(columns=str.strip)
+
+def _numeric(df: pd.DataFrame, col: str) -> pd.Series:
+    if col not in df.columns:
+        return pd.Series(float("nan"), index=df.index)
+    return pd.to_numeric(df[col], errors="coerce")
+
+def _text(df: pd.DataFrame, col: str) -> pd.Series:
+    return df[col].astype("string") if col in df.columns else pd.Series(pd.NA, index=df.index, dtype="string")
+
+def prepare_zip_mappings(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame({
+        "zip": coerce_types(df[["zip"]], {"zip": "zip5"})["zip"],
+        "fiscal_year": _numeric(df, "fiscal_year").astype("Int64"),
+        "destination_id": _text(df, "destination_id"),
+        "state": _text(df, "state"),
+        "city": _text(df, "city"),
+        "county": _text(df, "county"),
+    })
+    out = out.dropna(subset=["zip", "fiscal_year"])
+    return out.drop_duplicates(["zip", "fiscal_year"], keep="first")
+
+def prepare_gsa_rates(df: pd.DataFrame) -> pd.DataFrame:
+    """Accepts the app's lodging_<mon> columns or the init migration's jan..sep / dec_ columns."""
+    out = pd.DataFrame({
+        "destination_id": _text(df, "destination_id"),
+        "fiscal_year": _numeric(df, "fiscal_year").astype("Int64"),
+        "state": _text(df, "state"),
+        "city": _text(df, "city"),
+        "county": _text(df, "county"),
+        "meals_daily": _numeric(df, "meals_daily"),
+    })
+    for m in MONTHS:
+        source = next((c for c in (f"lodging_{m}", m, f"{m}_") if c in df.columns), None)
+        out[f"lodging_{m}"] = _numeric(df, source) if source else float("nan")
+    lodging = out[[f"lodging_{m}" for m in MONTHS]]
+    out["max_lodging"] = _numeric(df, "max_lodging").fillna(lodging.max(axis=1))  # the migration's GREATEST(...)
+    out["weekly_max"] = _numeric(df, "weekly_max")
+    out["monthly_total"] = _numeric(df, "monthly_total")
+    out = out.dropna(subset=["destination_id", "fiscal_year"])
+    return out.drop_duplicates(["destination_id", "fiscal_year"], keep="first")
+
+def prepare_housing(df: pd.DataFrame) -> pd.DataFrame:
+    zip_col = "zip" if "zip" in df.columns else "zip_code"
+    out = pd.DataFrame({"zip": coerce_types(df[[zip_col]], {zip_col: "zip5"})[zip_col], "metro_area": _text(df, "metro_area")})
+    for col in FMR_COLUMNS + ["zori_rent"]:
+        out[col] = _numeric(df, col)
+    return out.dropna(subset=["zip"]).drop_duplicates("zip", keep="first")
+
+def prepare_centroids(df: pd.DataFrame) -> pd.DataFrame:
+    """zip_county_crosswalk exports / seeds (zip, latitude, longitude) or a Census ZCTA gazetteer (GEOID, INTPTLAT, INTPTLONG)."""
+    def pick(*names: str) -> str:
+        col = next((c for c in names if c in df.columns), None)
+        if col is None:
+            raise ValueError(f"ZIP centroid source needs one of {list(names)}")
+        return col
+    zip_col = pick("zip", "zip_code", "GEOID", "ZCTA5")
+    out = pd.DataFrame({
+        "zip": coerce_types(df[[zip_col]], {zip_col: "zip5"})[zip_col],
+        "latitude": _numeric(df, pick("latitude", "lat", "INTPTLAT")),
+        "longitude": _numeric(df, pick("longitude", "lon", "lng", "INTPTLONG")),
+    })
+    valid = out["latitude"].between(-90, 90) & out["longitude"].between(-180, 180)
+    return out[valid].dropna(subset=["zip"]).drop_duplicates("zip", keep="first")
+
+def prepare_facilities(df: pd.DataFrame) -> pd.DataFrame:
+    out = pd.DataFrame({c: (df[c] if c in df.columns else pd.NA) for c in FACILITY_COLUMNS})
+    out["msp_exclusive"] = out["msp_exclusive"].astype("boolean").astype("Int8")
+    return out.dropna(subset=["facility_id"]).drop_duplicates("facility_id", keep="first")
+
+# ━━━ SEASONAL PRECOMPUTE ━━━
+
+def contract_day_counts(fiscal_year: int, days: int) -> np.ndarray:
+    """
+    (12, 12) matrix: row = start month (Jan..Dec), column = calendar month, value = how many
+    days of a `days`-long stay starting on the 1st of the start month fall in that month.
+    Start months sit inside `fiscal_year` (Oct-Dec in the prior calendar year). Days running
+    past the fiscal year reuse the same month's column: next year's rates aren't published yet.
+    """
+    counts = np.zeros((12, 12))
+    for start in range(1, 13):
+        first = date(fiscal_year - 1 if start >= 10 else fiscal_year, start, 1)
+        months = [(first + timedelta(days=d)).month - 1 for d in range(days)]
+        np.add.at(counts[start - 1], months, 1)
+    return counts
+
+def seasonal_totals(rates: pd.DataFrame) -> pd.DataFrame:
+    """
+    gsa_seasonal rows from prepared gsa_rates: per (destination, fiscal year) one row per
+    SEASONAL_METRICS entry with a value per start month. A month's lodging falls back to
+    max_lodging, then 0, exactly like lookupGsaRates.
+    """
+    frames = []
+    for fy, group in rates.groupby("fiscal_year", sort=True):
+        daily = group[[f"lodging_{m}" for m in MONTHS]].to_numpy(dtype=np.float64, na_value=np.nan)
+        fallback = group["max_lodging"].fillna(0).to_numpy(dtype=np.float64)[:, None]
+        daily = np.where(np.isnan(daily), fallback, daily)
+        meals = group["meals_daily"].fillna(0).to_numpy(dtype=np.float64)[:, None]
+
+        contract, month = contract_day_counts(int(fy), CONTRACT_DAYS), contract_day_counts(int(fy), MONTH_DAYS)
+        metrics = {
+            "lodging_13wk": daily @ contract.T,                 # (destinations x calendar) @ (calendar x start)
+            "mie_13wk": np.broadcast_to(meals * CONTRACT_DAYS, daily.shape),
+            "lodging_30d": daily @ month.T,
+            "mie_30d": np.broadcast_to(meals * MONTH_DAYS, daily.shape),
+        }
+        for metric, values in metrics.items():
+            frame = pd.DataFrame(values, columns=SEASONAL_COLUMNS)
+            frame.insert(0, "metric", metric)
+            frame.insert(0, "fiscal_year", int(fy))
+            frame.insert(0, "destination_id", group["destination_id"].to_numpy())
+            frames.append(frame)
+    columns = ["destination_id", "fiscal_year", "metric", *SEASONAL_COLUMNS]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+# ━━━ BUILD ━━━
+
+def _insert_frame(conn: sqlite3.Connection, table: str, df: pd.DataFrame) -> int:
+    rows = df.astype(object).where(df.notna(), None).itertuples(index=False, name=None)
+    placeholders = ", ".join("?" for _ in df.columns)
+    conn.executemany(f"INSERT INTO {table} ({', '.join(df.columns)}) VALUES ({placeholders})", rows)
+    return len(df)
+
+def build_lookup_db(
+    output_path: str = LOOKUP_DB_PATH,
+    zips_path: str = DEFAULT_ZIPS_PATH,
+    rates_path: str = DEFAULT_GSA_RATES_PATH,
+    housing_path: str = DEFAULT_HOUSING_PATH,
+    facilities_path: str = DEFAULT_FACILITIES_PATH,
+    centroids_path: str = DEFAULT_CENTROIDS_PATH,
+) -> Dict[str, int]:
+    """Builds the DB into a temp file and swaps it in, so readers never see a partial build."""
+    sources = {
+        "gsa_zip_mappings": (zips_path, lambda p: read_source(p, "gsa_zip_mappings"), prepare_zip_mappings),
+        "gsa_rates": (rates_path, lambda p: read_source(p, "gsa_rates"), prepare_gsa_rates),
+        "zip_housing_costs": (housing_path, lambda p: read_source(p, "zip_housing_costs"), prepare_housing),
+        "facilities": (facilities_path, lambda p: read_artifact(p) if p and os.path.exists(p) else read_source(p, "facilities"), prepare_facilities),
+        "zip_centroids": (centroids_path, lambda p: read_source(p, "zip_county_crosswalk"), prepare_centroids),
+    }
+    tmp = f"{output_path}.tmp"
+    if os.path.exists(tmp):
+        os.remove(tmp)
+    conn = sqlite3.connect(tmp)
+    conn.execute("PRAGMA journal_mode = OFF")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.executescript(SCHEMA_SQL)
+
+    counts: Dict[str, int] = {}
+    prepared: Dict[str, pd.DataFrame] = {}
+    with conn:
+        for table, (path, read, prepare) in sources.items():
+            raw = read(path)
+            if raw is not None:
+                prepared[table] = prepare(raw)
+            counts[table] = _insert_frame(conn, table, prepared[table]) if table in prepared else 0
+            print(f"   {'✅' if counts[table] else '⚠️'} {table}: {counts[table]:,} rows")
+        if "gsa_rates" in prepared:
+            counts["gsa_seasonal"] = _insert_frame(conn, "gsa_seasonal", seasonal_totals(prepared["gsa_rates"]))
+            print(f"   ✅ gsa_seasonal: {counts['gsa_seasonal']:,} rows ({len(SEASONAL_METRICS)} metrics x 12 start months)")
+        conn.executescript(INDEX_SQL)
+        meta = {
+            "schema_version": str(LOOKUP_SCHEMA_VERSION),
+            "built_at": datetime.now(timezone.utc).isoformat(),
+            **{f"source.{t}": str(p) for t, (p, _, _) in sources.items()},
+        }
+        conn.executemany("INSERT INTO build_meta VALUES (?, ?)", meta.items())
+    conn.execute("ANALYZE")
+    conn.execute("VACUUM")
+    conn.close()
+    os.replace(tmp, output_path)
+    return counts
+
+# ━━━ QUERY API ━━━
+
+def gsa_fiscal_year(on: Optional[date] = None) -> int:
+    """GSA fiscal year: October onward belongs to the next calendar year (getGsaFiscalYear)."""
+    on = on or date.today()
+    return on.year + 1 if on.month >= 10 else on.year
+
+def normalize_zip(value: Any) -> Optional[str]:
+    """normalizeZip from gsa.ts: digits only, 4 digits get their leading zero back, ZIP+4 truncated."""
+    if value is None:
+        return None
+    digits = re.sub(r"\D", "", str(value).strip())
+    if len(digits) == 4:
+        return f"0{digits}"
+    return digits[:5] if len(digits) >= 5 else None
+
+def to_fixed(value: float, places: int = 2) -> float:
+    """Number(x.toFixed(places)): half-up rounding of the exact binary value, like JavaScript."""
+    return float(Decimal(value).quantize(Decimal(1).scaleb(-places), rounding=ROUND_HALF_UP))
+
+class LocalLookup:
+    """Read-only lookups against a built DB. Safe to share across threads only with check_same_thread=False."""
+
+    def __init__(self, path: str = LOOKUP_DB_PATH, check_same_thread: bool = True):
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Lookup DB not found at {path} (run: python local_lookup.py build)")
+        uri = f"file:{os.path.abspath(path)}?mode=ro&immutable=1"
+        self.conn = sqlite3.connect(uri, uri=True, check_same_thread=check_same_thread)
+        self.conn.row_factory = sqlite3.Row
+        self.meta = dict(self.conn.execute("SELECT key, value FROM build_meta").fetchall())
+        if self.meta.get("schema_version") != str(LOOKUP_SCHEMA_VERSION):
+            raise ValueError(f"{path} has schema v{self.meta.get('schema_version')}, expected v{LOOKUP_SCHEMA_VERSION}; rebuild it")
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def location(self, zip_code: Any, fiscal_year: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return None
+        fy = fiscal_year or gsa_fiscal_year()
+        row = self.conn.execute(
+            "SELECT zip, destination_id, state, city, county, fiscal_year FROM gsa_zip_mappings "
+            "WHERE zip = ? ORDER BY fiscal_year = ? DESC, fiscal_year DESC LIMIT 1",
+            (zip5, fy),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            "zip": row["zip"], "city": row["city"] or "", "county": row["county"] or "",
+            "state": row["state"], "destination_id": row["destination_id"],
+        }
+
+    @staticmethod
+    def _rates(row: sqlite3.Row, fy: int, month: int) -> Dict[str, Any]:
+        lodging = row[f"lodging_{MONTHS[month - 1]}"]
+        if lodging is None:
+            lodging = row["max_lodging"] if row["max_lodging"] is not None else 0
+        meals = row["meals_daily"] if row["meals_daily"] is not None else 0
+        weekly = row["weekly_max"] if row["weekly_max"] is not None else (lodging + meals) * 7
+        monthly = row["monthly_total"] if row["monthly_total"] is not None else (lodging + meals) * 30
+        return {
+            "fiscal_year": fy, "lodging_daily": lodging, "meals_daily": meals,
+            "weekly_max": weekly, "monthly_max": monthly,
+            "city": row["city"] if row["city"] is not None else "",
+            "county": row["county"] if row["county"] is not None else "",
+        }
+
+    def gsa_rates(self, destination_id: str, fiscal_year: Optional[int] = None, on: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        on = on or date.today()
+        fy = fiscal_year or gsa_fiscal_year(on)
+        row = self.conn.execute(
+            "SELECT * FROM gsa_rates WHERE destination_id = ? AND fiscal_year = ?", (destination_id, fy)
+        ).fetchone()
+        return self._rates(row, fy, on.month) if row is not None else None
+
+    def stipend(self, zip_code: Any, on: Optional[date] = None) -> Optional[Dict[str, Any]]:
+        """location() + gsa_rates() in one query. None when the ZIP is unmapped or has no rates."""
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return None
+        on = on or date.today()
+        fy = gsa_fiscal_year(on)
+        row = self.conn.execute(
+            "SELECT r.*, m.zip AS zip, m.destination_id AS destination_id, m.state AS zip_state "
+            "FROM (SELECT zip, destination_id, state FROM gsa_zip_mappings WHERE zip = ? "
+            "      ORDER BY fiscal_year = ? DESC, fiscal_year DESC LIMIT 1) m "
+            "JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = ?",
+            (zip5, fy, fy),
+        ).fetchone()
+        if row is None:
+            return None
+        return {"zip": row["zip"], "destination_id": row["destination_id"], "state": row["zip_state"], **self._rates(row, fy, on.month)}
+
+    def contract_totals(self, destination_id: str, start_month: int, fiscal_year: Optional[int] = None) -> Optional[Dict[str, float]]:
+        """SEASONAL_METRICS for a contract starting on the 1st of `start_month` (1-12)."""
+        fy = fiscal_year or gsa_fiscal_year()
+        column = SEASONAL_COLUMNS[start_month - 1]
+        rows = self.conn.execute(
+            f"SELECT metric, {column} FROM gsa_seasonal WHERE destination_id = ? AND fiscal_year = ?", (destination_id, fy)
+        ).fetchall()
+        return {metric: value for metric, value in rows} if rows else None
+
+    def seasonal_matrix(self, metric: str, fiscal_year: Optional[int] = None) -> pd.DataFrame:
+        """One metric for every destination: index destination_id, columns start_jan..start_dec."""
+        if metric not in SEASONAL_METRICS:
+            raise ValueError(f"Unknown seasonal metric '{metric}'; expected one of {SEASONAL_METRICS}")
+        return pd.read_sql_query(
+            f"SELECT destination_id, {', '.join(SEASONAL_COLUMNS)} FROM gsa_seasonal "
+            "WHERE metric = ? AND fiscal_year = ? ORDER BY destination_id",
+            self.conn, params=(metric, fiscal_year or gsa_fiscal_year()), index_col="destination_id",
+        )
+
+    def housing(self, zip_code: Any) -> Optional[Dict[str, Any]]:
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return None
+        row = self.conn.execute("SELECT * FROM zip_housing_costs WHERE zip = ?", (zip5,)).fetchone()
+        if row is None:
+            return None
+        data = {k: row[k] for k in row.keys()}
+        fmr_1br, zori = data["fmr_1br"], data["zori_rent"]
+        data["market_ratio"] = to_fixed(zori / fmr_1br) if fmr_1br and zori and fmr_1br > 0 else None
+        data["fmr_1br_compat"] = fmr_1br if fmr_1br is not None else 0
+        data["county"] = data["metro_area"] if data["metro_area"] is not None else ""
+        return data
+
+    def facilities_in_zip(self, zip_code: Any) -> List[Dict[str, Any]]:
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return []
+        rows = self.conn.execute("SELECT * FROM facilities WHERE zip_code = ? ORDER BY facility_id", (zip5,)).fetchall()
+        return [{k: r[k] for k in r.keys()} for r in rows]
+
+    def centroid(self, zip_code: Any) -> Optional[Tuple[float, float]]:
+        """(latitude, longitude) of the ZIP's centroid, or None."""
+        zip5 = normalize_zip(zip_code)
+        if zip5 is None:
+            return None
+        row = self.conn.execute("SELECT latitude, longitude FROM zip_centroids WHERE zip = ?", (zip5,)).fetchone()
+        return (row["latitude"], row["longitude"]) if row is not None else None
+
+    def facility(self, facility_id: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute("SELECT * FROM facilities WHERE facility_id = ?", (facility_id,)).fetchone()
+        return {k: row[k] for k in row.keys()} if row is not None else None
+
+# ━━━ CLI ━━━
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Build or query the local GSA / housing / facility lookup DB.")
+    parser.add_argument("--db", default=LOOKUP_DB_PATH, help=f"Lookup DB path (default: {LOOKUP_DB_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    build = sub.add_parser("build", help="Compile the sources into the lookup DB")
+    build.add_argument("--zips", default=DEFAULT_ZIPS_PATH, help=f"gsa_zip_mappings CSV export or seed (default: {DEFAULT_ZIPS_PATH})")
+    build.add_argument("--gsa-rates", default=DEFAULT_GSA_RATES_PATH, help=f"gsa_rates CSV export (default: {DEFAULT_GSA_RATES_PATH})")
+    build.add_argument("--housing", default=DEFAULT_HOUSING_PATH, help=f"zip_housing_costs CSV export or INSERT seed (default: {DEFAULT_HOUSING_PATH})")
+    build.add_argument("--facilities", default=DEFAULT_FACILITIES_PATH, help=f"Layer 4 matrix (default: {DEFAULT_FACILITIES_PATH})")
+    build.add_argument("--centroids", default=DEFAULT_CENTROIDS_PATH,
+                       help=f"ZIP centroids: zip_county_crosswalk CSV export or seed, or a Census ZCTA gazetteer .txt (default: {DEFAULT_CENTROIDS_PATH})")
+
+    query = sub.add_parser("query", help="Print stipend + housing + facility count for ZIPs")
+    query.add_argument("zips", nargs="+")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.command == "build":
+        print(f"🚀 Building local lookup DB -> {args.db}")
+        started = time.perf_counter()
+        build_lookup_db(args.db, args.zips, args.gsa_rates, args.housing, args.facilities, args.centroids)
+        print(f"✅ Built {args.db} ({os.path.getsize(args.db) / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+        return
+
+    lookup = LocalLookup(args.db)
+    for z in args.zips:
+        started = time.perf_counter()
+        stipend, housing, facilities = lookup.stipend(z), lookup.housing(z), lookup.facilities_in_zip(z)
+        elapsed_us = (time.perf_counter() - started) * 1e6
+        print(f"\n📍 {z} ({elapsed_us:.0f} µs)")
+        print(f"   GSA:      {stipend}")
+        print(f"   Housing:  {housing}")
+        if stipend:
+            print(f"   13-week from {MONTHS[date.today().month - 1]}: "
+                  f"{lookup.contract_totals(stipend['destination_id'], date.today().month, stipend['fiscal_year'])}")
+        print(f"   Facilities: {len(facilities)}")
+
+if __name__ == "__main__":
+    main()
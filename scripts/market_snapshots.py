@@ -0,0 +1,543 @@
+#!/usr/bin/env python3
+"""
+Market Snapshots — materialize public.market_snapshots from pay_reports, housing and GSA
+
+market_snapshots keeps one row per (state, county, specialty, snapshot_date) but nothing
+populated it. This job builds every row for a snapshot date in one pass:
+  - markets: each ZIP's picked gsa_zip_mappings row (state; county from its gsa_rates
+    destination, else the mapping) from the local lookup DB, grouped by (state, county)
+  - GSA: the rates of the destination most of the county's ZIPs map to, for the snapshot
+    date's month (seasonal column, then max_lodging) and fiscal year
+  - housing: HUD FMR studio / 1BR / 2BR averages and the 1BR median over the county's ZIPs;
+    housing_listings_count is the number of ZIPs with a 1BR figure (there is no listings feed)
+  - pay: pay_reports streamed once in keyset pages (or a CSV export), every report gathered
+    to its market through a ZIP-indexed array and counted into a grouped log-bucket quantile
+    sketch per (market, profession). Memory follows the buckets in use, not the number of
+    reports, and p25 / median / p75 come back within 0.05% of percentile_cont.
+  - stipend_surplus_monthly: gsa_weekly_total x 52 / 12 - housing_1br_median, as the
+    lookup-stipend route derives it per ZIP
+
+Rows accumulate by date: a re-run on the same snapshot date overwrites that date's rows, a
+later date adds new ones. Readers must not assume a single date; the market pages read the
+market_snapshots_latest view (newest row per state, county and specialty).
+
+With --state the pay stage is incremental: the per-group sketches and agency sets are kept in
+a local SQLite state DB together with a (created_at, id) watermark. Each run reads only the
+reports past the watermark (leaving the last --settle-minutes for the next run, as they may
+still be committing), folds them into the stored sketches and re-emits only the groups they
+touched, so a nightly run costs the day's reports rather than the whole history. The state
+and watermark are committed only after the rows are written; --full rebuilds the state.
+Untouched groups keep the row of the run that last touched them, under its older snapshot
+date, so a delta run is only complete when read through market_snapshots_latest, never by
+filtering on one snapshot_date. Their GSA and housing columns stay as of that date too: after
+a lookup DB refresh (new fiscal year, FMR or ZORI), run with --full to re-date every group.
+
+pay_reports v2 keeps the discipline (RN, PT, OT, ...) in profession; its specialty column is
+the unit (ICU, ER) and doesn't split markets. Professions are upper-cased so "rn" and "RN"
+share a row.
+
+Usage:
+  python market_snapshots.py                                       # Supabase -> Supabase
+  python market_snapshots.py --csv pay_reports.csv --output market_snapshots.csv
+  python market_snapshots.py --all-markets --snapshot-date 2026-10-01
+  python market_snapshots.py --state market_snapshots_state.sqlite          # nightly delta
+  python market_snapshots.py --state market_snapshots_state.sqlite --full   # rebuild state
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import sqlite3
+import sys
+import time
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from urllib.parse import quote
+
+import numpy as np
+import pandas as pd
+
+import push_facility_intel as postgrest
+from backfill_pay_reports import iter_csv_pages, iter_postgrest_pages, numeric_round
+from local_lookup import LOOKUP_DB_PATH, MONTHS, PICKED_MAPPINGS_SQL, LocalLookup, gsa_fiscal_year
+from seed_layer3_arbitrage import ZIP_SPACE, encode_zips
+
+TABLE = "market_snapshots"
+CONFLICT_KEY = "state,county,specialty,snapshot_date"  # the table's UNIQUE constraint
+REPORT_COLUMNS = ["id", "created_at", "zip_code", "gross_weekly_pay", "profession", "agency_name_raw"]
+WATERMARK_KEY = "created_at,id"
+DEFAULT_PAGE_SIZE = 10000
+DEFAULT_SPECIALTY = "RN"  # market_snapshots.specialty default, used for --all-markets rows
+RELATIVE_ACCURACY = 0.0005
+STATE_PATH = "market_snapshots_state.sqlite"
+STATE_SCHEMA_VERSION = 1
+DEFAULT_SETTLE_MINUTES = 10  # reports younger than this may still be in uncommitted transactions
+QUANTILES = {"pay_weekly_p25": 0.25, "pay_weekly_median": 0.5, "pay_weekly_p75": 0.75}
+
+SNAPSHOT_COLUMNS = [
+    "state", "county", "city", "specialty",
+    "gsa_fiscal_year", "gsa_lodging_daily", "gsa_meals_daily", "gsa_weekly_total", "gsa_monthly_total",
+    "housing_studio_avg", "housing_1br_avg", "housing_2br_avg", "housing_1br_median", "housing_listings_count",
+    "pay_weekly_median", "pay_weekly_p25", "pay_weekly_p75", "pay_report_count", "agency_count",
+    "stipend_surplus_monthly", "snapshot_date",
+]
+MONEY_COLUMNS = [
+    "gsa_lodging_daily", "gsa_meals_daily", "gsa_weekly_total", "gsa_monthly_total",
+    "housing_studio_avg", "housing_1br_avg", "housing_2br_avg", "housing_1br_median",
+    *QUANTILES, "stipend_surplus_monthly",
+]
+
+# Sketch keys pack (market << SPECIALTY_BITS | specialty) << BUCKET_BITS | bucket into one int64
+SPECIALTY_BITS = 16
+BUCKET_BITS = 16
+
+# ━━━ QUANTILE SKETCH ━━━
+
+class QuantileSketch:
+    """
+    Grouped log-bucket quantile sketch (DDSketch-style). A value x > 0 is counted in bucket
+    ceil(log_gamma(x)) with gamma = (1 + a) / (1 - a), whose midpoint is within a relative
+    `a` of every value in it. Counts are kept per (group, bucket) as sorted key / count arrays,
+    so sketches merge by adding counts and one page at a time is enough.
+    """
+
+    def __init__(self, relative_accuracy: float = RELATIVE_ACCURACY, compact_at: int = 1_000_000) -> None:
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self.log_gamma = math.log(self.gamma)
+        self.compact_at = compact_at
+        self.keys = np.empty(0, dtype=np.int64)
+        self.counts = np.empty(0, dtype=np.int64)
+        self._pending: List[Tuple[np.ndarray, np.ndarray]] = []
+        self._pending_size = 0
+
+    def add(self, groups: np.ndarray, values: np.ndarray) -> None:
+        """Counts `values` (all > 0) into their `groups` (non-negative int64 ids)."""
+        buckets = np.ceil(np.log(values) / self.log_gamma).astype(np.int64)
+        buckets = np.clip(buckets, 0, (1 << BUCKET_BITS) - 1)
+        keys, counts = np.unique((groups.astype(np.int64) << BUCKET_BITS) | buckets, return_counts=True)
+        self.add_counts(keys, counts.astype(np.int64))
+
+    def merge(self, other: "QuantileSketch") -> None:
+        self.add_counts(*other.compacted())
+
+    def add_counts(self, keys: np.ndarray, counts: np.ndarray) -> None:
+        """Adds raw (group << BUCKET_BITS | bucket) keys with their counts, e.g. a stored sketch."""
+        self._pending.append((keys, counts))
+        self._pending_size += len(keys)
+        if self._pending_size >= self.compact_at:
+            self._compact()
+
+    def _compact(self) -> None:
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys, *(k for k, _ in self._pending)])
+        counts = np.concatenate([self.counts, *(c for _, c in self._pending)])
+        self.keys, inverse = np.unique(keys, return_inverse=True)
+        self.counts = np.bincount(inverse, weights=counts, minlength=len(self.keys)).astype(np.int64)
+        self._pending, self._pending_size = [], 0
+
+    def compacted(self) -> Tuple[np.ndarray, np.ndarray]:
+        """The sorted unique keys and their counts."""
+        self._compact()
+        return self.keys, self.counts
+
+    def quantiles(self, qs: Sequence[float]) -> pd.DataFrame:
+        """
+        Per group: the value count and each quantile, interpolated between the neighbouring
+        ranks like percentile_cont. Indexed by group id; column i holds qs[i].
+        """
+        self._compact()
+        groups = self.keys >> BUCKET_BITS
+        values = 2 * self.gamma ** (self.keys & ((1 << BUCKET_BITS) - 1)) / (self.gamma + 1)
+        cumulative = np.cumsum(self.counts)
+        starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.empty(0, dtype=np.int64)
+        totals = np.add.reduceat(self.counts, starts) if len(starts) else np.empty(0, dtype=np.int64)
+        before = cumulative[starts] - self.counts[starts]
+
+        out = pd.DataFrame({"count": totals}, index=pd.Index(groups[starts], name="group"))
+        for i, q in enumerate(qs):
+            rank = q * (totals - 1)
+            lo, hi = np.floor(rank).astype(np.int64), np.ceil(rank).astype(np.int64)
+            v_lo = values[np.searchsorted(cumulative, before + lo, side="right")]
+            v_hi = values[np.searchsorted(cumulative, before + hi, side="right")]
+            out[i] = v_lo + (rank - lo) * (v_hi - v_lo)
+        return out
+
+# ━━━ MARKETS ━━━
+
+def load_zip_markets(lookup: LocalLookup, on: date) -> pd.DataFrame:
+    """Every mapped ZIP with its (state, county, city), GSA rates on `on` (NULL if none) and HUD FMRs."""
+    month_col = f"lodging_{MONTHS[on.month - 1]}"
+    zips = pd.read_sql_query(
+        f"""
+        WITH mapped AS ({PICKED_MAPPINGS_SQL})
+        SELECT m.zip,
+               COALESCE(NULLIF(m.state, ''), r.state) AS state,
+               COALESCE(NULLIF(r.county, ''), NULLIF(m.county, '')) AS county,
+               COALESCE(NULLIF(m.city, ''), NULLIF(r.city, '')) AS city,
+               m.destination_id, r.fiscal_year,
+               COALESCE(r.{month_col}, r.max_lodging, 0) AS lodging_daily,
+               COALESCE(r.meals_daily, 0) AS meals_daily,
+               h.fmr_studio, h.fmr_1br, h.fmr_2br
+        FROM mapped m
+        LEFT JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = :fy
+        LEFT JOIN zip_housing_costs h ON h.zip = m.zip
+        ORDER BY m.zip
+        """,
+        lookup.conn,
+        params={"fy": gsa_fiscal_year(on)},
+        dtype={"zip": "string", "state": "string", "county": "string", "city": "string", "destination_id": "string"},
+    )
+    zips["state"] = zips["state"].str.strip().str.upper()
+    zips["county"] = zips["county"].str.strip()
+    zips = zips.dropna(subset=["state", "county"])
+    return zips[(zips["state"] != "") & (zips["county"] != "")].reset_index(drop=True)
+
+def build_markets(zips: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    One row per (state, county) market with its GSA, housing and city columns, indexed by
+    market id, plus a ZIP_SPACE-long array mapping each ZIP slot to its market id (-1: none).
+    """
+    zips = zips.copy()
+    zips["market"] = zips.groupby(["state", "county"], sort=True).ngroup()
+    markets = zips.groupby("market").agg(state=("state", "first"), county=("county", "first"))
+
+    # GSA: the destination covering most of the county's ZIPs (ties: lowest destination_id)
+    rated = zips.dropna(subset=["fiscal_year"])
+    dest = (rated.groupby(["market", "destination_id"])
+                 .agg(zip_count=("zip", "size"), gsa_fiscal_year=("fiscal_year", "first"),
+                      gsa_lodging_daily=("lodging_daily", "first"), gsa_meals_daily=("meals_daily", "first"))
+                 .reset_index()
+                 .sort_values(["market", "zip_count", "destination_id"], ascending=[True, False, True])
+                 .drop_duplicates("market")
+                 .set_index("market"))
+    markets = markets.join(dest[["gsa_fiscal_year", "gsa_lodging_daily", "gsa_meals_daily"]])
+    daily = markets["gsa_lodging_daily"] + markets["gsa_meals_daily"]
+    markets["gsa_weekly_total"] = daily * 7
+    markets["gsa_monthly_total"] = daily * 30
+
+    housing = zips.groupby("market").agg(
+        housing_studio_avg=("fmr_studio", "mean"),
+        housing_1br_avg=("fmr_1br", "mean"),
+        housing_2br_avg=("fmr_2br", "mean"),
+        housing_1br_median=("fmr_1br", "median"),
+        housing_listings_count=("fmr_1br", "count"),
+    )
+    markets = markets.join(housing)
+    markets["stipend_surplus_monthly"] = numeric_round(markets["gsa_weekly_total"] * (52 / 12)) - markets["housing_1br_median"]
+
+    # city: the county's most common non-empty city name
+    named = zips.dropna(subset=["city"])
+    named = named[named["city"].str.strip() != ""]
+    cities = named.groupby(["market", "city"]).size().rename("n").reset_index()
+    cities = cities.sort_values(["market", "n", "city"], ascending=[True, False, True]).drop_duplicates("market")
+    markets = markets.join(cities.set_index("market")["city"])
+
+    zip_market = np.full(ZIP_SPACE, -1, dtype=np.int64)
+    slots = encode_zips(zips["zip"])
+    ok = slots >= 0
+    zip_market[slots[ok]] = zips["market"].to_numpy()[ok]
+    return markets, zip_market
+
+# ━━━ PAY AGGREGATION ━━━
+
+class PayAggregator:
+    """Streams pay_reports pages into per-(market, profession) quantile sketches and agency sets."""
+
+    def __init__(self, zip_market: np.ndarray, relative_accuracy: float = RELATIVE_ACCURACY) -> None:
+        self.zip_market = zip_market
+        self.sketch = QuantileSketch(relative_accuracy)
+        self.specialties: List[str] = []
+        self._specialty_codes: dict = {}
+        self.agencies: Set[Tuple[int, str]] = set()
+        self.scanned = 0
+        self.unmatched = 0
+
+    def _codes(self, specialties: pd.Series) -> np.ndarray:
+        codes, uniques = pd.factorize(specialties)
+        for name in uniques:
+            if name not in self._specialty_codes:
+                if len(self.specialties) >= 1 << SPECIALTY_BITS:
+                    raise SystemExit(f"❌ More than {1 << SPECIALTY_BITS:,} distinct professions in pay_reports")
+                self._specialty_codes[name] = len(self.specialties)
+                self.specialties.append(name)
+        lookup = np.array([self._specialty_codes[name] for name in uniques], dtype=np.int64)
+        return lookup[codes] if len(lookup) else np.empty(0, dtype=np.int64)
+
+    def add(self, page: pd.DataFrame) -> None:
+        self.scanned += len(page)
+        slots = encode_zips(page["zip_code"].fillna(""))
+        market = np.where(slots >= 0, self.zip_market[np.maximum(slots, 0)], -1)
+        pay = pd.to_numeric(page["gross_weekly_pay"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        specialty = page["profession"].astype("string").str.strip().str.upper()
+        ok = (market >= 0) & (pay > 0) & (specialty.fillna("") != "").to_numpy(dtype=bool)
+        self.unmatched += int((~ok).sum())
+        if not ok.any():
+            return
+
+        groups = (market[ok] << SPECIALTY_BITS) | self._codes(specialty[ok].reset_index(drop=True))
+        self.sketch.add(groups, pay[ok])
+
+        if "agency_name_raw" in page.columns:
+            agency = page["agency_name_raw"].astype("string").str.strip().str.casefold()[ok].to_numpy(dtype=object, na_value=None)
+            named = np.array([a is not None and a != "" for a in agency], dtype=bool)
+            if named.any():
+                pairs = pd.DataFrame({"group": groups[named], "agency": agency[named]}).drop_duplicates()
+                self.agencies.update(zip(pairs["group"].tolist(), pairs["agency"].tolist()))
+
+    def summary(self) -> pd.DataFrame:
+        """One row per (market, specialty) with report count, quantiles and agency count."""
+        return summarize(self.sketch, self.agencies, self.specialties)
+
+def summarize(sketch: QuantileSketch, agencies: Set[Tuple[int, str]], specialties: Sequence[str]) -> pd.DataFrame:
+    stats = sketch.quantiles(list(QUANTILES.values()))
+    stats.columns = ["pay_report_count", *QUANTILES]
+    groups = stats.index.to_numpy()
+    agency_counts = pd.Series([g for g, _ in agencies], dtype=np.int64).value_counts()
+    stats["agency_count"] = agency_counts.reindex(groups, fill_value=0).to_numpy()
+    stats["market"] = groups >> SPECIALTY_BITS
+    stats["specialty"] = np.asarray(specialties, dtype=object)[groups & ((1 << SPECIALTY_BITS) - 1)] if len(groups) else []
+    return stats.reset_index(drop=True)
+
+# ━━━ INCREMENTAL STATE ━━━
+# Per (state, county, specialty): the serialized sketch and distinct agencies, plus a
+# (created_at, id) watermark. Groups are keyed by name so the state outlives lookup DB rebuilds.
+
+STATE_SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS pay_groups (
+    state TEXT NOT NULL, county TEXT NOT NULL, specialty TEXT NOT NULL,
+    report_count INTEGER NOT NULL,
+    buckets BLOB NOT NULL,   -- uint16 little-endian sketch buckets, ascending
+    counts BLOB NOT NULL,    -- int64 little-endian count per bucket
+    agencies TEXT NOT NULL,  -- JSON list of distinct casefolded agency names
+    PRIMARY KEY (state, county, specialty)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS state_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL) WITHOUT ROWID;
+"""
+
+def open_state(path: str) -> sqlite3.Connection:
+    """The incremental state DB; refuses one written with another sketch layout."""
+    conn = sqlite3.connect(path)
+    conn.executescript(STATE_SCHEMA_SQL)
+    meta = dict(conn.execute("SELECT key, value FROM state_meta"))
+    layout = {"schema_version": str(STATE_SCHEMA_VERSION), "relative_accuracy": repr(RELATIVE_ACCURACY)}
+    if not meta:
+        with conn:
+            conn.executemany("INSERT INTO state_meta (key, value) VALUES (?, ?)", layout.items())
+    elif any(meta.get(k) != v for k, v in layout.items()):
+        raise SystemExit(f"❌ {path} was built with another sketch layout; rebuild it with --full")
+    return conn
+
+def read_watermark(conn: sqlite3.Connection) -> Optional[Tuple[pd.Timestamp, str]]:
+    meta = dict(conn.execute("SELECT key, value FROM state_meta"))
+    if "watermark_created_at" not in meta:
+        return None
+    return pd.Timestamp(meta["watermark_created_at"]), meta["watermark_id"]
+
+def write_watermark(conn: sqlite3.Connection, watermark: Tuple[pd.Timestamp, str]) -> None:
+    conn.executemany(
+        "INSERT OR REPLACE INTO state_meta (key, value) VALUES (?, ?)",
+        [("watermark_created_at", watermark[0].isoformat()), ("watermark_id", watermark[1]),
+         ("updated_at", time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))],
+    )
+
+def since_watermark(
+    page: pd.DataFrame,
+    watermark: Optional[Tuple[pd.Timestamp, str]],
+    cutoff: pd.Timestamp,
+) -> Tuple[pd.DataFrame, Optional[Tuple[pd.Timestamp, str]]]:
+    """
+    The page's reports with (created_at, id) past `watermark` and created_at before `cutoff`,
+    and the newest (created_at, id) among them. PostgREST pages already satisfy both; CSV
+    exports come in any order.
+    """
+    if "created_at" not in page.columns:
+        raise SystemExit("❌ Incremental runs need a created_at column in the pay_reports export")
+    created = pd.to_datetime(page["created_at"], utc=True, errors="coerce", format="ISO8601")
+    ids = page["id"].astype("string").fillna("")
+    keep = created.notna() & (created < cutoff)
+    if watermark is not None:
+        keep &= (created > watermark[0]) | ((created == watermark[0]) & (ids > watermark[1]))
+    if not keep.any():
+        return page.iloc[0:0], None
+    last = np.lexsort((ids[keep].to_numpy(dtype=object), created[keep].to_numpy()))[-1]
+    return page[keep], (created[keep].iloc[last], ids[keep].iloc[last])
+
+def fold_into_state(conn: sqlite3.Connection, markets: pd.DataFrame, aggregator: PayAggregator) -> pd.DataFrame:
+    """
+    Merges the stored sketches and agencies of the groups `aggregator` touched with its new
+    reports and returns their summary (as PayAggregator.summary()). The merged groups are
+    written to pay_groups uncommitted, so the caller commits them with the watermark only
+    once the snapshot rows are out.
+    """
+    groups = np.unique(aggregator.sketch.compacted()[0] >> BUCKET_BITS)
+    market_ids = groups >> SPECIALTY_BITS
+    touched = pd.DataFrame({
+        "state": markets["state"].to_numpy()[market_ids] if len(groups) else [],
+        "county": markets["county"].to_numpy()[market_ids] if len(groups) else [],
+        "specialty": np.asarray(aggregator.specialties, dtype=object)[groups & ((1 << SPECIALTY_BITS) - 1)] if len(groups) else [],
+        "grp": groups,
+    })
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS touched (state TEXT, county TEXT, specialty TEXT, grp INTEGER)")
+    conn.execute("DELETE FROM touched")
+    conn.executemany("INSERT INTO touched VALUES (?, ?, ?, ?)", touched.itertuples(index=False, name=None))
+
+    merged = QuantileSketch()
+    merged.merge(aggregator.sketch)
+    agencies = set(aggregator.agencies)
+    stored = conn.execute(
+        "SELECT t.grp, p.buckets, p.counts, p.agencies FROM touched t "
+        "JOIN pay_groups p ON p.state = t.state AND p.county = t.county AND p.specialty = t.specialty"
+    )
+    for grp, buckets, counts, names in stored:
+        keys = (np.int64(grp) << BUCKET_BITS) | np.frombuffer(buckets, dtype="<u2").astype(np.int64)
+        merged.add_counts(keys, np.frombuffer(counts, dtype="<i8").astype(np.int64))
+        agencies.update((grp, name) for name in json.loads(names))
+
+    keys, counts = merged.compacted()
+    key_groups = keys >> BUCKET_BITS
+    bounds = np.searchsorted(key_groups, np.r_[groups, np.iinfo(np.int64).max])
+    by_group: Dict[int, List[str]] = {}
+    for grp, name in agencies:
+        by_group.setdefault(grp, []).append(name)
+    conn.executemany(
+        "INSERT OR REPLACE INTO pay_groups (state, county, specialty, report_count, buckets, counts, agencies) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (
+            (state, county, specialty, int(counts[lo:hi].sum()),
+             (keys[lo:hi] & ((1 << BUCKET_BITS) - 1)).astype("<u2").tobytes(), counts[lo:hi].astype("<i8").tobytes(),
+             json.dumps(sorted(by_group.get(grp, []))))
+            for (state, county, specialty, grp), lo, hi in zip(touched.itertuples(index=False, name=None), bounds[:-1], bounds[1:])
+        ),
+    )
+    return summarize(merged, agencies, aggregator.specialties)
+
+# ━━━ SNAPSHOT ROWS ━━━
+
+def snapshot_rows(
+    markets: pd.DataFrame,
+    pay: pd.DataFrame,
+    snapshot_date: date,
+    all_markets: bool = False,
+) -> pd.DataFrame:
+    """market_snapshots rows: one per market x profession with reports (plus empty RN rows with all_markets)."""
+    rows = pay.join(markets, on="market", how="inner")
+    if all_markets:
+        missing = markets.index.difference(pay["market"].unique())
+        empty = markets.loc[missing].assign(specialty=DEFAULT_SPECIALTY, pay_report_count=0, agency_count=0)
+        rows = pd.concat([rows, empty], ignore_index=True)
+    for col in MONEY_COLUMNS:
+        rows[col] = numeric_round(rows[col].astype(np.float64))
+    for col in ("gsa_fiscal_year", "housing_listings_count", "pay_report_count", "agency_count"):
+        rows[col] = rows[col].astype("Int64")
+    rows["snapshot_date"] = snapshot_date.isoformat()
+    return rows.sort_values(["state", "county", "specialty"])[SNAPSHOT_COLUMNS].reset_index(drop=True)
+
+def upsert_payloads(rows: pd.DataFrame) -> List[dict]:
+    out = rows.astype(object).where(rows.notna(), None)
+    return out.to_dict("records")
+
+def read_pages(
+    args: argparse.Namespace,
+    supabase_url: str,
+    api_key: str,
+    watermark: Optional[Tuple[pd.Timestamp, str]] = None,
+    cutoff: Optional[pd.Timestamp] = None,
+) -> Iterable[pd.DataFrame]:
+    """pay_reports pages: by id for a full build, by (created_at, id) past the watermark otherwise."""
+    if args.csv:
+        return iter_csv_pages(args.csv, args.page_size, REPORT_COLUMNS)
+    if cutoff is None:
+        return iter_postgrest_pages(supabase_url, api_key, args.page_size, REPORT_COLUMNS)
+    after = (watermark[0].isoformat(), watermark[1]) if watermark else None
+    filters = [f"created_at=lt.{quote(cutoff.isoformat(), safe='')}"]
+    return iter_postgrest_pages(supabase_url, api_key, args.page_size, REPORT_COLUMNS, WATERMARK_KEY, after, filters)
+
+# ━━━ CLI ━━━
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Materialize market_snapshots from pay_reports, housing and GSA.")
+    parser.add_argument("--db", default=LOOKUP_DB_PATH, help=f"Local lookup DB with mappings, rates + housing (default: {LOOKUP_DB_PATH})")
+    parser.add_argument("--snapshot-date", type=date.fromisoformat, default=None, help="Snapshot date, YYYY-MM-DD (default: today)")
+    parser.add_argument("--csv", default=None, help="Read a pay_reports CSV export instead of Supabase")
+    parser.add_argument("--output", default=None, help="Write snapshot rows to this CSV instead of upserting")
+    parser.add_argument("--all-markets", action="store_true", help=f"Also emit {DEFAULT_SPECIALTY} rows for counties with no reports")
+    parser.add_argument("--state", default=None, help=f"Incremental state DB: fold in only reports past its watermark (e.g. {STATE_PATH})")
+    parser.add_argument("--full", action="store_true", help="With --state: discard the stored state and rebuild it from every report")
+    parser.add_argument("--settle-minutes", type=float, default=DEFAULT_SETTLE_MINUTES,
+                        help=f"With --state: leave reports newer than this for the next run (default: {DEFAULT_SETTLE_MINUTES})")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help=f"pay_reports rows per keyset page (default: {DEFAULT_PAGE_SIZE})")
+    parser.add_argument("--batch-size", type=int, default=postgrest.DEFAULT_BATCH_SIZE, help="Initial upsert batch size")
+    parser.add_argument("--concurrency", type=int, default=postgrest.DEFAULT_CONCURRENCY, help="Upsert batches in flight")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    snapshot_date = args.snapshot_date or date.today()
+    started = time.monotonic()
+
+    lookup = LocalLookup(args.db)
+    markets, zip_market = build_markets(load_zip_markets(lookup, snapshot_date))
+    lookup.close()
+    print(f"🗺️  {len(markets):,} county markets from the lookup DB")
+
+    supabase_url = api_key = ""
+    if args.csv is None or args.output is None:
+        postgrest.load_dotenv_if_present()
+        supabase_url, api_key = postgrest.supabase_url_from_env(), postgrest.pick_key()
+
+    state = open_state(args.state) if args.state else None
+    watermark = cutoff = newest = None
+    if state is not None:
+        watermark = None if args.full else read_watermark(state)
+        cutoff = pd.Timestamp.now(tz="UTC") - pd.Timedelta(minutes=args.settle_minutes)
+        newest = watermark
+        print(f"🔖 Watermark: {watermark[0].isoformat() if watermark else 'none (full build)'}")
+
+    aggregator = PayAggregator(zip_market)
+    for page in read_pages(args, supabase_url, api_key, watermark, cutoff):
+        if state is not None:
+            page, page_newest = since_watermark(page, watermark, cutoff)
+            if page_newest is not None and (newest is None or page_newest > newest):
+                newest = page_newest
+        aggregator.add(page)
+        print(f"📊 {aggregator.scanned:,} reports scanned ({time.monotonic() - started:.1f}s)")
+    if aggregator.unmatched:
+        print(f"⚠️ {aggregator.unmatched:,} reports skipped (unmapped ZIP, no profession or no pay)")
+
+    if state is None:
+        rows = snapshot_rows(markets, aggregator.summary(), snapshot_date, args.all_markets)
+    else:
+        if args.full:
+            state.execute("DELETE FROM pay_groups")
+        rows = snapshot_rows(markets, fold_into_state(state, markets, aggregator), snapshot_date, args.all_markets and args.full)
+        print(f"🧮 {len(rows):,} groups affected by {aggregator.scanned:,} new reports")
+
+    failed = 0
+    if args.output:
+        rows.to_csv(args.output, index=False)
+        print(f"✅ {len(rows):,} snapshot rows for {snapshot_date} written to {args.output}")
+    elif len(rows):
+        stats = postgrest.pipelined_upsert(
+            supabase_url, api_key, TABLE, upsert_payloads(rows),
+            concurrency=args.concurrency, batch_size=args.batch_size, key=CONFLICT_KEY,
+        )
+        failed = stats.failed_rows
+        print(f"✅ {stats.updated:,} of {len(rows):,} snapshot rows for {snapshot_date} upserted "
+              f"({failed:,} failed, {time.monotonic() - started:.1f}s)")
+
+    if state is not None:
+        if failed:
+            state.rollback()  # keep the old watermark so the same reports are folded in next run
+            print(f"⚠️ {args.state} left at its previous watermark")
+        else:
+            if newest is not None:
+                write_watermark(state, newest)
+            state.commit()
+        state.close()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
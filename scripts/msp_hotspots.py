@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+MSP Hotspots — materialize _internal_msp_hotspots from the routed facility matrix (INTERNAL)
+
+_internal_msp_hotspots is the per-state summary of MSP rate control. This stage rebuilds it
+in one grouped pass instead of hand-written SQL:
+  - facilities: layer4_facilities_FINAL.csv as routed by seed_layer4_facilities.py. A
+    facility with a known msp_gatekeeper is MSP-controlled; msp_exclusive makes it sole source.
+  - verified intel: _internal_msp_control rows are matched to the matrix with the pg_trgm-style
+    FacilityNameIndex (ZIP prefix, then state) and override the routing map's vendor and type
+    for that facility. Rows that match nothing count as extra facilities. Bill rates and
+    compression only come from here.
+  - per state: MSP facility count, sole-source count, average bill rate and compression, the
+    dominant MSP (most facilities, ties alphabetical) and a 0-10 hotspot_score.
+
+hotspot_score = round(10 x weighted mean of four 0-1 factors):
+  coverage       MSP facilities / all facilities in the state          (HOTSPOT_WEIGHTS)
+  exclusivity    sole-source facilities / MSP facilities
+  concentration  dominant MSP's facilities / MSP facilities
+  compression    avg_compression_pct / COMPRESSION_SATURATION_PCT, capped at 1 (skipped,
+                 and the other weights rescaled, while no compression figure is known)
+
+Every state in the matrix gets a row so a market an MSP has left drops back to 0. All rows go
+out in one PostgREST upsert request, i.e. one transaction. demand_signal and notes are
+analyst-maintained and are not in the payload, so upserts leave them as they are.
+
+Usage:
+  python msp_hotspots.py                                  # Supabase -> Supabase
+  python msp_hotspots.py --control msp_control.csv --output msp_hotspots.csv
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+import push_facility_intel as postgrest
+from artifact_store import read_artifact
+from resolve_facility_names import DEFAULT_THRESHOLD, FacilityNameIndex
+from seed_layer4_facilities import LAYER4_OUTPUT_PATH
+
+HOTSPOTS_TABLE = "_internal_msp_hotspots"
+CONTROL_TABLE = "_internal_msp_control"
+CONTROL_COLUMNS = [
+    "id", "facility_name", "facility_city", "facility_state", "facility_zip", "health_system",
+    "msp_vendor", "msp_type", "base_bill_rate", "rate_compression_pct", "verified_date",
+]
+MATRIX_COLUMNS = ["facility_id", "facility_name", "facility_name_normalized", "state", "zip_code", "msp_gatekeeper", "msp_exclusive"]
+UNKNOWN_MSP = {"Unknown"}  # routing map placeholder: the system is known, its MSP isn't
+
+HOTSPOT_WEIGHTS = {"coverage": 0.35, "exclusivity": 0.30, "concentration": 0.20, "compression": 0.15}
+COMPRESSION_SATURATION_PCT = 20.0
+
+# Mirrors STATE_NAMES in src/lib/gsa.ts, plus the territories CMS lists hospitals in
+STATE_NAMES = {
+    "AL": "Alabama", "AK": "Alaska", "AZ": "Arizona", "AR": "Arkansas", "CA": "California",
+    "CO": "Colorado", "CT": "Connecticut", "DE": "Delaware", "FL": "Florida", "GA": "Georgia",
+    "HI": "Hawaii", "ID": "Idaho", "IL": "Illinois", "IN": "Indiana", "IA": "Iowa",
+    "KS": "Kansas", "KY": "Kentucky", "LA": "Louisiana", "ME": "Maine", "MD": "Maryland",
+    "MA": "Massachusetts", "MI": "Michigan", "MN": "Minnesota", "MS": "Mississippi", "MO": "Missouri",
+    "MT": "Montana", "NE": "Nebraska", "NV": "Nevada", "NH": "New Hampshire", "NJ": "New Jersey",
+    "NM": "New Mexico", "NY": "New York", "NC": "North Carolina", "ND": "North Dakota", "OH": "Ohio",
+    "OK": "Oklahoma", "OR": "Oregon", "PA": "Pennsylvania", "RI": "Rhode Island", "SC": "South Carolina",
+    "SD": "South Dakota", "TN": "Tennessee", "TX": "Texas", "UT": "Utah", "VT": "Vermont",
+    "VA": "Virginia", "WA": "Washington", "WV": "West Virginia", "WI": "Wisconsin", "WY": "Wyoming",
+    "DC": "District of Columbia",
+    "PR": "Puerto Rico", "GU": "Guam", "VI": "U.S. Virgin Islands", "AS": "American Samoa",
+    "MP": "Northern Mariana Islands",
+}
+
+# ━━━ INPUTS ━━━
+
+def load_matrix(path: str = LAYER4_OUTPUT_PATH) -> pd.DataFrame:
+    matrix = read_artifact(path, columns=MATRIX_COLUMNS)
+    matrix["state"] = matrix["state"].str.strip().str.upper()
+    return matrix.dropna(subset=["facility_id", "state"]).reset_index(drop=True)
+
+def fetch_control(supabase_url: str, api_key: str, page_size: int = postgrest.DEFAULT_BATCH_SIZE) -> pd.DataFrame:
+    """Every _internal_msp_control row, keyset-paged by id (service role only)."""
+    pages: List[pd.DataFrame] = []
+    after: Optional[str] = None
+    while True:
+        code, rows = postgrest.postgrest_select_page(supabase_url, api_key, CONTROL_TABLE, CONTROL_COLUMNS, "id", after, page_size)
+        if code != 200:
+            raise SystemExit(f"❌ Reading {CONTROL_TABLE} failed (HTTP {code}): {str(rows)[:500]}")
+        if rows:
+            pages.append(pd.DataFrame(rows, columns=CONTROL_COLUMNS))
+            after = rows[-1]["id"]
+        if len(rows) < page_size:
+            break
+    return pd.concat(pages, ignore_index=True) if pages else pd.DataFrame(columns=CONTROL_COLUMNS)
+
+def load_control_csv(path: str) -> pd.DataFrame:
+    control = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=[""])
+    missing = {"facility_name", "facility_state", "msp_vendor", "msp_type"} - set(control.columns)
+    if missing:
+        raise SystemExit(f"❌ {path} is missing column(s): {', '.join(sorted(missing))}")
+    return control.reindex(columns=CONTROL_COLUMNS)
+
+# ━━━ FACILITY-LEVEL MSP STATUS ━━━
+
+def facility_msp_status(matrix: pd.DataFrame, control: pd.DataFrame, threshold: float = DEFAULT_THRESHOLD) -> pd.DataFrame:
+    """
+    One row per facility (matrix facilities plus unmatched control rows) with state,
+    msp_vendor, msp_type ('sole_source' | 'preferred' | 'panel' | None), base_bill_rate and
+    rate_compression_pct. Verified control intel overrides the routing map.
+    """
+    gatekeeper = matrix["msp_gatekeeper"].astype("string").str.strip()
+    known = gatekeeper.notna() & (gatekeeper != "") & ~gatekeeper.isin(UNKNOWN_MSP)
+    exclusive = matrix["msp_exclusive"].astype("boolean").fillna(False)
+    facilities = pd.DataFrame({
+        "facility_id": matrix["facility_id"].astype(str),
+        "state": matrix["state"],
+        "msp_vendor": gatekeeper.where(known),
+        "msp_type": np.where(known, np.where(exclusive, "sole_source", "preferred"), None),
+        "base_bill_rate": np.nan,
+        "rate_compression_pct": np.nan,
+    })
+    if control.empty:
+        return facilities
+
+    control = control.copy()
+    control["facility_state"] = control["facility_state"].astype("string").str.strip().str.upper()
+    index = FacilityNameIndex(matrix)
+    resolved = index.resolve(control["facility_name"], control["facility_zip"].fillna(""), control["facility_state"], threshold)
+    control["facility_id"] = resolved["facility_id"]
+    control["id"] = control["id"].astype("string").fillna(pd.Series("row" + control.index.astype(str), index=control.index))
+    # Same matched facility twice: the most recently verified row wins
+    control = control.sort_values("verified_date", ascending=False, na_position="last", kind="stable")
+    intel = pd.DataFrame({
+        "facility_id": control["facility_id"].where(control["facility_id"].notna(), "control:" + control["id"].astype(str)),
+        "state": control["facility_state"],
+        "msp_vendor": control["msp_vendor"].astype("string").str.strip(),
+        "msp_type": control["msp_type"].astype("string").str.strip().str.lower(),
+        "base_bill_rate": pd.to_numeric(control["base_bill_rate"], errors="coerce"),
+        "rate_compression_pct": pd.to_numeric(control["rate_compression_pct"], errors="coerce"),
+    }).drop_duplicates("facility_id")
+
+    facilities = facilities[~facilities["facility_id"].isin(intel["facility_id"])]
+    matched = int(control["facility_id"].notna().sum())
+    print(f"🔗 {matched:,} of {len(control):,} {CONTROL_TABLE} rows matched to the facility matrix")
+    return pd.concat([facilities, intel], ignore_index=True)
+
+# ━━━ STATE SCORING ━━━
+
+def score_states(facilities: pd.DataFrame) -> pd.DataFrame:
+    """One _internal_msp_hotspots row per state, in a single grouped pass."""
+    msp = facilities[facilities["msp_vendor"].notna()]
+    states = facilities.groupby("state").agg(facility_count=("facility_id", "size"))
+    per_state = msp.groupby("state").agg(
+        total_msp_facilities=("facility_id", "size"),
+        sole_source_count=("msp_type", lambda t: int((t == "sole_source").sum())),
+        avg_bill_rate=("base_bill_rate", "mean"),
+        avg_compression_pct=("rate_compression_pct", "mean"),
+    )
+    vendors = msp.groupby(["state", "msp_vendor"]).size().rename("vendor_count").reset_index()
+    dominant = (vendors.sort_values(["state", "vendor_count", "msp_vendor"], ascending=[True, False, True])
+                       .drop_duplicates("state")
+                       .set_index("state")
+                       .rename(columns={"msp_vendor": "dominant_msp"}))
+    out = states.join(per_state).join(dominant)
+    for col in ("total_msp_facilities", "sole_source_count", "vendor_count"):
+        out[col] = out[col].fillna(0).astype(int)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factors = {
+            "coverage": out["total_msp_facilities"] / out["facility_count"],
+            "exclusivity": out["sole_source_count"] / out["total_msp_facilities"],
+            "concentration": out["vendor_count"] / out["total_msp_facilities"],
+            "compression": (out["avg_compression_pct"] / COMPRESSION_SATURATION_PCT).clip(0, 1),
+        }
+    weighted = sum(HOTSPOT_WEIGHTS[k] * f.fillna(0) for k, f in factors.items())
+    weights = sum(HOTSPOT_WEIGHTS[k] * f.notna() for k, f in factors.items())
+    score = np.floor(10 * weighted / weights.where(weights > 0) + 0.5)
+    out["hotspot_score"] = score.where(out["total_msp_facilities"] > 0, 0).fillna(0).clip(0, 10).astype(int)
+
+    out["avg_bill_rate"] = out["avg_bill_rate"].round(2)
+    out["avg_compression_pct"] = out["avg_compression_pct"].round(2)
+    out = out.reset_index().rename(columns={"state": "state_abbr"})
+    out["state_name"] = out["state_abbr"].map(STATE_NAMES).fillna(out["state_abbr"])
+    return out[["state_abbr", "state_name", "total_msp_facilities", "sole_source_count", "avg_bill_rate",
+                "avg_compression_pct", "dominant_msp", "hotspot_score"]]
+
+def hotspot_payloads(hotspots: pd.DataFrame) -> List[Dict[str, object]]:
+    rows = hotspots.assign(updated_at=time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()))
+    return rows.astype(object).where(rows.notna(), None).to_dict("records")
+
+def write_hotspots(supabase_url: str, api_key: str, rows: List[Dict[str, object]]) -> None:
+    """All rows in one upsert request: PostgREST runs it as a single transaction."""
+    for attempt in range(1, postgrest.MAX_RETRIES + 2):
+        code, msg = postgrest.postgrest_upsert(supabase_url, api_key, HOTSPOTS_TABLE, rows, on_conflict="state_abbr")
+        if code in (200, 201, 204):
+            return
+        if code not in postgrest.RETRYABLE_CODES or attempt > postgrest.MAX_RETRIES:
+            raise SystemExit(f"❌ Writing {HOTSPOTS_TABLE} failed (HTTP {code}): {msg[:1000]}")
+        time.sleep(min(30.0, 2 ** attempt))
+
+# ━━━ CLI ━━━
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Materialize _internal_msp_hotspots from the routed facility matrix.")
+    parser.add_argument("--facilities", default=LAYER4_OUTPUT_PATH, help=f"Routed facility matrix (default: {LAYER4_OUTPUT_PATH})")
+    parser.add_argument("--control", default=None, help=f"Read {CONTROL_TABLE} from this CSV instead of Supabase")
+    parser.add_argument("--output", default=None, help=f"Write the {HOTSPOTS_TABLE} rows to this CSV instead of upserting")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Name match threshold for control rows (default: {DEFAULT_THRESHOLD})")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.monotonic()
+    matrix = load_matrix(args.facilities)
+
+    supabase_url = api_key = ""
+    if args.control is None or args.output is None:
+        postgrest.load_dotenv_if_present()
+        supabase_url, api_key = postgrest.supabase_url_from_env(), postgrest.pick_key()
+    control = load_control_csv(args.control) if args.control else fetch_control(supabase_url, api_key)
+
+    hotspots = score_states(facility_msp_status(matrix, control, args.threshold))
+    hot = hotspots[hotspots["hotspot_score"] > 0].sort_values("hotspot_score", ascending=False)
+    print(f"📊 {len(hotspots):,} states, {len(hot):,} with MSP control; top: "
+          + ", ".join(f"{s} {n}" for s, n in zip(hot["state_abbr"].head(5), hot["hotspot_score"].head(5))))
+
+    if args.output:
+        hotspots.to_csv(args.output, index=False)
+        print(f"✅ {len(hotspots):,} hotspot rows written to {args.output}")
+    else:
+        write_hotspots(supabase_url, api_key, hotspot_payloads(hotspots))
+        print(f"✅ {len(hotspots):,} {HOTSPOTS_TABLE} rows upserted in one transaction ({time.monotonic() - started:.1f}s)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,20 +4,36 @@ Supabase PostgREST Upsert — facility_intel (Idempotent & Bulletproof)
 
 Reads a CSV and batch upserts into public.facility_intel using facility_id as the conflict key.
 Automatically sanitizes headers, maps IDs, and safely handles rate limits.
+
+Batches are pipelined: several upserts stay in flight over pooled keep-alive
+connections, each worker retries its own batch with jitter, and batch size
+adapts to observed latency and 413/429 responses. Point SUPABASE_URL at a local
+stub (http://127.0.0.1:PORT) to benchmark rows/sec offline.
+
+Delta sync: a SQLite sidecar manifest maps facility_id -> hash of build_payload(),
+so later runs only send inserted/modified rows (pass --full to resend everything,
+--delete-missing to delete IDs that vanished from the CSV).
 """
 
 from __future__ import annotations
 
+import argparse
 import csv
+import hashlib
+import http.client
 import json
 import os
+import ssl
 import sys
+import threading
 import time
 import random
-import urllib.request
-import urllib.error
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Deque, Dict, Any, Iterator, List, Optional, Sequence, Tuple
+from urllib.parse import quote, urlsplit
 
 DEFAULT_ENV_PATHS = [
     ".env.local", ".env",
@@ -26,12 +42,30 @@ DEFAULT_ENV_PATHS = [
 ]
 DEFAULT_BATCH_SIZE = 500
 DEFAULT_TIMEOUT_SECS = 60
+DEFAULT_CONCURRENCY = 4
+MIN_BATCH_SIZE = 50
+MAX_BATCH_SIZE = 2000
+TARGET_BATCH_LATENCY_SECS = 2.0
+MAX_RETRIES = 6
+RETRYABLE_CODES = (0, 429, 500, 502, 503, 504)
+DELETE_CHUNK_SIZE = 200
 
 # Candidate CSV headers for the primary unique ID
 FACILITY_ID_KEYS = [
     "facility_id", "ccn", "cms_ccn", "provider_id", "providerid"
 ]
 
+# Columns of public.facility_intel; anything else is stripped from the payload
+FACILITY_INTEL_COLUMNS = {
+    "facility_id", "facility_name", "facility_name_normalized",
+    "health_system", "facility_type", "zip_code", "city", "state",
+    "address", "msp_gatekeeper", "msp_exclusive", "msp_notes",
+    "vms_software", "vms_notes", "facility_rules_raw", "max_rto_days",
+    "block_scheduling", "float_required", "ehr_system", "orientation_days",
+    "parking_cost_monthly", "data_source", "confidence", "report_count",
+    "source_urls", "radius_rule_miles",
+}
+
 def load_dotenv_if_present() -> None:
     """Minimal .env loader."""
     for p in DEFAULT_ENV_PATHS:
@@ -106,19 +140,54 @@ def build_payload(row: Dict[str, str]) -> Optional[Dict[str, Any]]:
     # 7. Keep ehr_system as-is (DB column is ehr_system, not emr)
 
     # 8. Strip columns that don't exist in the facility_intel schema
-    VALID_COLUMNS = {
-        "facility_id", "facility_name", "facility_name_normalized",
-        "health_system", "facility_type", "zip_code", "city", "state",
-        "address", "msp_gatekeeper", "msp_exclusive", "msp_notes",
-        "vms_software", "vms_notes", "facility_rules_raw", "max_rto_days",
-        "block_scheduling", "float_required", "ehr_system", "orientation_days",
-        "parking_cost_monthly", "data_source", "confidence", "report_count",
-        "source_urls", "radius_rule_miles",
-    }
-    payload = {k: v for k, v in payload.items() if k in VALID_COLUMNS}
+    payload = {k: v for k, v in payload.items() if k in FACILITY_INTEL_COLUMNS}
 
     return payload
 
+def iter_csv_rows(csv_path: Path) -> Iterator[Dict[str, str]]:
+    """
+    CSV rows as text dicts, like csv.DictReader. When the CSV has a current artifact_store
+    sidecar, only the ID and facility_intel columns are read from it and rendered back to text.
+    """
+    from artifact_store import artifact_columns, load_meta, read_artifact
+    import pandas as pd
+
+    if load_meta(str(csv_path)) is None:
+        with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+        return
+
+    wanted = FACILITY_INTEL_COLUMNS.union(FACILITY_ID_KEYS)
+    columns = [c for c in artifact_columns(str(csv_path)) if sanitize_key(c) in wanted]
+    frame = read_artifact(str(csv_path), columns)
+    text = [["" if pd.isna(v) else str(v) for v in frame[c].tolist()] for c in columns]
+    for values in zip(*text):
+        yield dict(zip(columns, values))
+
+_conn_local = threading.local()
+
+
+def _pooled_connection(supabase_url: str) -> http.client.HTTPConnection:
+    """Returns this thread's keep-alive connection to the PostgREST host."""
+    parts = urlsplit(supabase_url)
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None and getattr(_conn_local, "netloc", None) == parts.netloc:
+        return conn
+    if parts.scheme == "https":
+        conn = http.client.HTTPSConnection(parts.netloc, timeout=DEFAULT_TIMEOUT_SECS, context=ssl.create_default_context())
+    else:
+        conn = http.client.HTTPConnection(parts.netloc, timeout=DEFAULT_TIMEOUT_SECS)
+    _conn_local.conn, _conn_local.netloc = conn, parts.netloc
+    return conn
+
+
+def _reset_connection() -> None:
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None:
+        conn.close()
+    _conn_local.conn = None
+
+
 def postgrest_upsert(
     supabase_url: str,
     api_key: str,
@@ -126,40 +195,367 @@ def postgrest_upsert(
     rows: List[Dict[str, Any]],
     on_conflict: str = "facility_id",
 ) -> Tuple[int, str]:
-    """Sends batch upsert via Supabase REST API."""
-    url = f"{supabase_url.rstrip('/')}/rest/v1/{table}?on_conflict={on_conflict}"
+    """Sends batch upsert via Supabase REST API. Returns (0, error) on connection failure."""
+    base = supabase_url.rstrip("/")
+    path = f"{urlsplit(base).path}/rest/v1/{table}?on_conflict={on_conflict}"
     body = json.dumps(rows).encode("utf-8")
+    headers = {
+        "Content-Type": "application/json",
+        "apikey": api_key,
+        "Authorization": f"Bearer {api_key}",
+        "Prefer": "resolution=merge-duplicates,return=minimal",
+        "Connection": "keep-alive",
+    }
+
+    try:
+        conn = _pooled_connection(base)
+        conn.request("POST", path, body=body, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read().decode("utf-8", errors="replace")
+    except (http.client.HTTPException, OSError) as e:
+        _reset_connection()
+        return 0, repr(e)
+
+
+class AdaptiveBatcher:
+    """
+    Hands out batches from a shared cursor and resizes them between requests.
+
+    Fast batches grow the size additively, slow ones shrink it, 429s halve it and a
+    413 splits the offending batch in two and requeues both halves.
+    """
+
+    def __init__(
+        self,
+        rows: List[Dict[str, Any]],
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        min_size: int = MIN_BATCH_SIZE,
+        max_size: int = MAX_BATCH_SIZE,
+        target_latency: float = TARGET_BATCH_LATENCY_SECS,
+    ) -> None:
+        self.rows = rows
+        self.cursor = 0
+        self.batch_size = max(1, batch_size)
+        self.min_size = max(1, min(min_size, self.batch_size))
+        self.max_size = max(max_size, self.batch_size)
+        self.target_latency = target_latency
+        self.requeued: Deque[List[Dict[str, Any]]] = deque()
+        self.lock = threading.Lock()
+
+    def next_batch(self) -> Optional[List[Dict[str, Any]]]:
+        with self.lock:
+            if self.requeued:
+                return self.requeued.popleft()
+            if self.cursor >= len(self.rows):
+                return None
+            batch = self.rows[self.cursor:self.cursor + self.batch_size]
+            self.cursor += len(batch)
+            return batch
+
+    def record_success(self, latency: float) -> None:
+        with self.lock:
+            if latency < self.target_latency / 2:
+                self.batch_size = min(self.max_size, self.batch_size + max(1, self.batch_size // 4))
+            elif latency > self.target_latency:
+                self.batch_size = max(self.min_size, self.batch_size * 3 // 4)
+
+    def record_throttle(self) -> None:
+        with self.lock:
+            self.batch_size = max(self.min_size, self.batch_size // 2)
+
+    def split(self, batch: List[Dict[str, Any]]) -> None:
+        mid = len(batch) // 2
+        with self.lock:
+            self.batch_size = max(1, min(self.batch_size, mid))
+            self.min_size = min(self.min_size, self.batch_size)
+            self.requeued.appendleft(batch[mid:])
+            self.requeued.appendleft(batch[:mid])
+
+
+class UploadStats:
+    def __init__(self, total: int, key: str = "facility_id") -> None:
+        self.total = total
+        self.key = key
+        self.key_columns = key.split(",")
+        self.updated = 0
+        self.failed_batches = 0
+        self.failed_rows = 0
+        self.batches = 0
+        self.synced_ids: List[str] = []
+        self.lock = threading.Lock()
+
+    def ok(self, batch: List[Dict[str, Any]]) -> int:
+        with self.lock:
+            self.updated += len(batch)
+            self.batches += 1
+            if len(self.key_columns) == 1:
+                self.synced_ids.extend(r[self.key] for r in batch)
+            else:
+                self.synced_ids.extend(tuple(r[k] for k in self.key_columns) for r in batch)
+            return self.updated
+
+    def fail(self, n: int) -> None:
+        with self.lock:
+            self.failed_batches += 1
+            self.failed_rows += n
+            self.batches += 1
+
+
+def upload_worker(
+    supabase_url: str,
+    api_key: str,
+    table: str,
+    batcher: AdaptiveBatcher,
+    stats: UploadStats,
+    key: str = "facility_id",
+) -> None:
+    """Pulls batches until the cursor is drained; retries only block this worker."""
+    while True:
+        batch = batcher.next_batch()
+        if batch is None:
+            return
+
+        attempt = 0
+        while True:
+            attempt += 1
+            t0 = time.monotonic()
+            code, msg = postgrest_upsert(supabase_url, api_key, table, batch, on_conflict=key)
+            latency = time.monotonic() - t0
+
+            if code in (200, 201, 204):
+                batcher.record_success(latency)
+                done = stats.ok(batch)
+                print(f"✅ Upsert OK: +{len(batch)} rows in {latency:.2f}s (Total: {done}/{stats.total})")
+                break
+
+            if code == 413 and len(batch) > 1:
+                print(f"⚠️ Payload too large ({len(batch)} rows). Splitting batch...")
+                batcher.split(batch)
+                break
+
+            if code in RETRYABLE_CODES and attempt <= MAX_RETRIES:
+                if code == 429:
+                    batcher.record_throttle()
+                # Full jitter so throttled workers don't retry in lockstep
+                backoff = random.uniform(0, min(30.0, 2 ** attempt))
+                print(f"⚠️ Rate limit/Server error (HTTP {code}). Retrying {len(batch)} rows in {backoff:.1f}s...")
+                time.sleep(backoff)
+                continue
+
+            stats.fail(len(batch))
+            print(f"❌ Batch of {len(batch)} rows FAILED (HTTP {code})")
+            print(f"Error Details: {msg[:1000]}")
+            break
+
+
+def pipelined_upsert(
+    supabase_url: str,
+    api_key: str,
+    table: str,
+    rows: List[Dict[str, Any]],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    key: str = "facility_id",
+) -> UploadStats:
+    """Upserts rows with `concurrency` batches in flight and adaptive batch sizing; `key` is the conflict column(s), comma-separated."""
+    batcher = AdaptiveBatcher(rows, batch_size=batch_size)
+    stats = UploadStats(len(rows), key)
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [
+            pool.submit(upload_worker, supabase_url, api_key, table, batcher, stats, key)
+            for _ in range(concurrency)
+        ]
+        for fut in futures:
+            fut.result()
+    return stats
+
+
+def postgrest_delete(
+    supabase_url: str,
+    api_key: str,
+    table: str,
+    ids: List[str],
+    key: str = "facility_id",
+) -> Tuple[int, str]:
+    """Deletes rows whose key is in `ids` via a PostgREST in.() filter."""
+    base = supabase_url.rstrip("/")
+    in_list = ",".join(f'"{i}"' for i in ids)
+    path = f"{urlsplit(base).path}/rest/v1/{table}?{key}=in.({quote(in_list, safe=',')})"
+    headers = {
+        "apikey": api_key,
+        "Authorization": f"Bearer {api_key}",
+        "Prefer": "return=minimal",
+        "Connection": "keep-alive",
+    }
+
+    try:
+        conn = _pooled_connection(base)
+        conn.request("DELETE", path, headers=headers)
+        resp = conn.getresponse()
+        return resp.status, resp.read().decode("utf-8", errors="replace")
+    except (http.client.HTTPException, OSError) as e:
+        _reset_connection()
+        return 0, repr(e)
+
+
+def _logic_value(value: Any) -> str:
+    """A value inside a PostgREST or=(...) tree, double-quoted since timestamps carry reserved chars."""
+    return '"' + str(value).replace("\\", "\\\\").replace('"', '\\"') + '"'
+
+
+def keyset_filter(keys: List[str], after: Tuple[Any, ...]) -> str:
+    """PostgREST or=(...) for (k1, k2, ...) > after: k1 > a1, or k1 = a1 and k2 > a2, and so on."""
+    terms = []
+    for i, key in enumerate(keys):
+        equal = [f"{k}.eq.{_logic_value(v)}" for k, v in zip(keys[:i], after)]
+        greater = f"{key}.gt.{_logic_value(after[i])}"
+        terms.append(f"and({','.join([*equal, greater])})" if equal else greater)
+    return f"({','.join(terms)})"
+
 
-    req = urllib.request.Request(url=url, data=body, method="POST")
-    req.add_header("Content-Type", "application/json")
-    req.add_header("apikey", api_key)
-    req.add_header("Authorization", f"Bearer {api_key}")
-    req.add_header("Prefer", "resolution=merge-duplicates,return=minimal")
+def postgrest_select_page(
+    supabase_url: str,
+    api_key: str,
+    table: str,
+    columns: List[str],
+    key: str,
+    after: Optional[Any] = None,
+    limit: int = DEFAULT_BATCH_SIZE,
+    filters: Sequence[str] = (),
+) -> Tuple[int, Any]:
+    """
+    One keyset page: rows with `key` > `after`, ordered by `key`, at most `limit`. Unlike
+    offset paging, every page is an index range scan however deep the cursor is. A
+    comma-separated `key` (e.g. "created_at,id") pages on the tuple; `after` is then a tuple.
+    `filters` are extra PostgREST query terms, already encoded (e.g. "created_at=lt.<ts>").
+    Returns (status, rows) or (status, error text).
+    """
+    base = supabase_url.rstrip("/")
+    keys = key.split(",")
+    query = f"select={','.join(columns)}&order={','.join(f'{k}.asc' for k in keys)}&limit={limit}"
+    if after is not None and len(keys) == 1:
+        query += f"&{key}=gt.{quote(str(after), safe='')}"
+    elif after is not None:
+        query += f"&or={quote(keyset_filter(keys, tuple(after)), safe='(),.')}"
+    for term in filters:
+        query += f"&{term}"
+    headers = {
+        "apikey": api_key,
+        "Authorization": f"Bearer {api_key}",
+        "Accept": "application/json",
+        "Connection": "keep-alive",
+    }
 
     try:
-        with urllib.request.urlopen(req, timeout=DEFAULT_TIMEOUT_SECS) as resp:
-            return resp.getcode(), resp.read().decode("utf-8", errors="replace")
-    except urllib.error.HTTPError as e:
-        return e.code, e.read().decode("utf-8", errors="replace")
-    except Exception as e:
+        conn = _pooled_connection(base)
+        conn.request("GET", f"{urlsplit(base).path}/rest/v1/{table}?{query}", headers=headers)
+        resp = conn.getresponse()
+        body = resp.read().decode("utf-8", errors="replace")
+    except (http.client.HTTPException, OSError) as e:
+        _reset_connection()
         return 0, repr(e)
+    return (resp.status, json.loads(body)) if resp.status == 200 else (resp.status, body)
 
-def chunked(items: List[Any], n: int) -> List[List[Any]]:
-    return [items[i:i+n] for i in range(0, len(items), n)]
 
-def main() -> int:
-    load_dotenv_if_present()
-    
-    # Support both SUPABASE_URL and NEXT_PUBLIC_SUPABASE_URL
+def supabase_url_from_env() -> str:
+    """SUPABASE_URL, or NEXT_PUBLIC_SUPABASE_URL as the Next.js app names it."""
     supabase_url = os.environ.get("SUPABASE_URL", "").strip()
     if not supabase_url:
         supabase_url = os.environ.get("NEXT_PUBLIC_SUPABASE_URL", "").strip()
     if not supabase_url:
         raise SystemExit("❌ Missing required env var: SUPABASE_URL or NEXT_PUBLIC_SUPABASE_URL")
-    
+    return supabase_url
+
+
+def chunked(items: List[Any], n: int) -> List[List[Any]]:
+    return [items[i:i+n] for i in range(0, len(items), n)]
+
+# ━━━ DELTA SYNC MANIFEST ━━━
+
+def payload_hash(payload: Dict[str, Any]) -> bytes:
+    """Stable 16-byte digest of a payload (key order independent)."""
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.blake2b(canonical.encode("utf-8"), digest_size=16).digest()
+
+def open_manifest(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(str(path))
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS facility_manifest ("
+        "facility_id TEXT PRIMARY KEY, payload_hash BLOB NOT NULL, synced_at TEXT NOT NULL)"
+    )
+    return conn
+
+def diff_against_manifest(
+    conn: sqlite3.Connection,
+    built: List[Dict[str, Any]],
+) -> Tuple[List[Dict[str, Any]], Dict[str, bytes], int, int, List[str]]:
+    """Returns (changed payloads, hashes by id, inserted count, modified count, vanished ids)."""
+    known: Dict[str, bytes] = dict(conn.execute("SELECT facility_id, payload_hash FROM facility_manifest"))
+    hashes: Dict[str, bytes] = {}
+    changed: List[Dict[str, Any]] = []
+    inserted = modified = 0
+    for payload in built:
+        fid = payload["facility_id"]
+        h = payload_hash(payload)
+        hashes[fid] = h
+        prev = known.get(fid)
+        if prev == h:
+            continue
+        changed.append(payload)
+        if prev is None:
+            inserted += 1
+        else:
+            modified += 1
+    vanished = sorted(set(known) - set(hashes))
+    return changed, hashes, inserted, modified, vanished
+
+def record_manifest(
+    conn: sqlite3.Connection,
+    hashes: Dict[str, bytes],
+    synced_ids: List[str],
+    deleted_ids: List[str],
+) -> None:
+    """Persists hashes only for rows the server acknowledged."""
+    synced_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    with conn:
+        conn.executemany(
+            "INSERT INTO facility_manifest (facility_id, payload_hash, synced_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (facility_id) DO UPDATE SET payload_hash = excluded.payload_hash, synced_at = excluded.synced_at",
+            [(fid, hashes[fid], synced_at) for fid in synced_ids],
+        )
+        conn.executemany("DELETE FROM facility_manifest WHERE facility_id = ?", [(fid,) for fid in deleted_ids])
+
+def delete_vanished(supabase_url: str, api_key: str, table: str, ids: List[str]) -> Tuple[List[str], int]:
+    """Deletes vanished IDs in chunks; returns (deleted ids, failed chunk count)."""
+    deleted: List[str] = []
+    failed = 0
+    for chunk in chunked(ids, DELETE_CHUNK_SIZE):
+        code, msg = postgrest_delete(supabase_url, api_key, table, chunk)
+        if code in (200, 204):
+            deleted.extend(chunk)
+            print(f"🗑️ Deleted {len(chunk)} vanished facilities")
+        else:
+            failed += 1
+            print(f"❌ Delete of {len(chunk)} IDs FAILED (HTTP {code}): {msg[:500]}")
+    return deleted, failed
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Upsert a facility CSV into public.facility_intel.")
+    parser.add_argument("csv_path", nargs="?", default="layer4_facilities_FINAL.csv")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Batches kept in flight")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Initial rows per batch")
+    parser.add_argument("--manifest", default=None, help="Delta manifest path (default: <csv>.manifest.sqlite)")
+    parser.add_argument("--full", action="store_true", help="Ignore the manifest and resend every row")
+    parser.add_argument("--delete-missing", action="store_true", help="Delete facility_ids no longer in the CSV")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    load_dotenv_if_present()
+    supabase_url = supabase_url_from_env()
     api_key = pick_key()
 
-    csv_path = Path(sys.argv[1]) if len(sys.argv) > 1 else Path("layer4_facilities_FINAL.csv")
+    csv_path = Path(args.csv_path)
     if not csv_path.exists():
         print(f"❌ CSV not found: {csv_path}", file=sys.stderr)
         return 2
@@ -168,14 +564,12 @@ def main() -> int:
     skipped_no_id = 0
 
     print(f"⏳ Reading CSV: {csv_path}...")
-    with csv_path.open("r", encoding="utf-8-sig", newline="") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            payload = build_payload(row)
-            if payload is None:
-                skipped_no_id += 1
-                continue
-            built.append(payload)
+    for row in iter_csv_rows(csv_path):
+        payload = build_payload(row)
+        if payload is None:
+            skipped_no_id += 1
+            continue
+        built.append(payload)
 
     total = len(built)
     print(f"📊 Rows parsed successfully: {total} (Skipped missing IDs: {skipped_no_id})")
@@ -187,40 +581,45 @@ def main() -> int:
     print(json.dumps(built[0], indent=2, default=str))
     print()
 
-    batches = chunked(built, DEFAULT_BATCH_SIZE)
-    updated, failed_batches = 0, 0
-
-    print(f"🚀 Pushing to Supabase in {len(batches)} batches...")
-    for i, batch in enumerate(batches, start=1):
-        attempt = 0
-        while True:
-            attempt += 1
-            code, msg = postgrest_upsert(supabase_url, api_key, "facility_intel", batch)
-
-            if code in (200, 201, 204):
-                updated += len(batch)
-                print(f"✅ [{i}/{len(batches)}] Upsert OK: +{len(batch)} rows (Total: {updated}/{total})")
-                break
-
-            if code in (429, 500, 502, 503, 504) and attempt <= 6:
-                backoff = min(30.0, (2 ** (attempt - 1)) + random.random())
-                print(f"⚠️ [{i}/{len(batches)}] Rate limit/Server error (HTTP {code}). Retrying in {backoff:.1f}s...")
-                time.sleep(backoff)
-                continue
-
-            failed_batches += 1
-            print(f"❌ [{i}/{len(batches)}] FAILED (HTTP {code})")
-            print(f"Error Details: {msg[:1000]}")
-            break
+    manifest_path = Path(args.manifest) if args.manifest else csv_path.with_suffix(".manifest.sqlite")
+    manifest = open_manifest(manifest_path)
+    changed, hashes, inserted, modified, vanished = diff_against_manifest(manifest, built)
+    if args.full:
+        changed = built
+    print(f"🧮 Delta vs {manifest_path.name}: {inserted} new, {modified} modified, "
+          f"{total - inserted - modified} unchanged, {len(vanished)} vanished")
+
+    if not changed:
+        print("✅ Nothing to upsert.")
+    else:
+        print(f"🚀 Pushing {len(changed)} rows to Supabase with {args.concurrency} batches in flight (initial batch size {args.batch_size})...")
+    t0 = time.monotonic()
+    stats = pipelined_upsert(
+        supabase_url, api_key, "facility_intel", changed,
+        concurrency=args.concurrency, batch_size=args.batch_size,
+    )
+    elapsed = time.monotonic() - t0
+
+    deleted: List[str] = []
+    failed_deletes = 0
+    if vanished and args.delete_missing:
+        deleted, failed_deletes = delete_vanished(supabase_url, api_key, "facility_intel", vanished)
+    elif vanished:
+        print(f"ℹ️ {len(vanished)} facility_ids vanished from the CSV (pass --delete-missing to remove them)")
+
+    record_manifest(manifest, hashes, stats.synced_ids, deleted)
+    manifest.close()
 
     print("\n" + "=" * 50)
     print(f"🎯 UPSERT COMPLETE")
-    print(f"Rows Target:  {total}")
-    print(f"Rows Success: {updated}")
-    print(f"Failed Batches: {failed_batches}")
+    print(f"Rows Target:  {len(changed)} (of {total})")
+    print(f"Rows Success: {stats.updated}")
+    print(f"Rows Deleted: {len(deleted)}")
+    print(f"Failed Batches: {stats.failed_batches + failed_deletes}")
+    print(f"Batches: {stats.batches} in {elapsed:.1f}s ({stats.updated / max(elapsed, 1e-9):,.0f} rows/sec)")
     print("=" * 50 + "\n")
 
-    return 1 if failed_batches > 0 else 0
+    return 1 if stats.failed_batches or failed_deletes else 0
 
 if __name__ == "__main__":
     raise SystemExit(main())
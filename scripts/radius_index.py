@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+"""
+Radius Index — batch radius queries over ZIP centroids and the facility matrix
+
+system_map gives every health system a radius_rule_miles (50/75/100): a traveler whose home
+ZIP is inside it is a local, not a traveler. Two questions come up constantly:
+  - rules: which ZIPs fall inside each facility's radius rule
+  - near:  which facilities are within N miles of these ZIPs
+
+Points are ZIP centroids from the local lookup DB (zip_centroids); a facility sits at its
+zip_code's centroid, since the matrix carries no coordinates. RadiusIndex buckets points into
+a fixed lat/lon grid (geohash-style cells, CELL_DEGREES on a side) and keeps them sorted by
+cell key, so a cell row's columns are one contiguous slice. A query walks the cell rows its
+circle touches, takes each row's key range with searchsorted and only measures haversine
+distance for the points in those cells. Everything is vectorized across the whole query
+batch, in QUERY_CHUNK-sized slices to bound memory, so thousands of facilities resolve
+against ~40k ZIPs without the 5k x 40k brute-force pair matrix.
+
+Distances are great-circle miles on a spherical earth (EARTH_RADIUS_MILES); radius edges are
+inclusive.
+
+Usage:
+  python radius_index.py rules --output facility_radius_zips.csv
+  python radius_index.py near 99336 59801 --miles 75
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from local_lookup import LOOKUP_DB_PATH, LocalLookup, normalize_zip
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = np.pi * EARTH_RADIUS_MILES / 180  # ~69.09
+CELL_DEGREES = 0.5  # ~35 x 25 miles at US latitudes; a 100-mile query touches ~7 x 9 cells
+QUERY_CHUNK = 2048
+DEFAULT_RULES_PATH = "facility_radius_zips.csv"
+
+Matches = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+# ━━━ GEOMETRY ━━━
+
+def haversine_miles(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """Great-circle distance in miles, broadcasting like any numpy ufunc."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(a, dtype=np.float64)) for a in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def _ragged_arange(starts: np.ndarray, stops: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Concatenated arange(start, stop) for every pair, plus which pair each value came from."""
+    lengths = np.maximum(stops - starts, 0)
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return starts[owner] + offsets, owner
+
+# ━━━ INDEX ━━━
+
+class RadiusIndex:
+    """Static grid index over (lat, lon) points; query() resolves a whole batch of circles."""
+
+    def __init__(self, lat: Sequence[float], lon: Sequence[float], cell_degrees: float = CELL_DEGREES):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        if self.lat.shape != self.lon.shape or self.lat.ndim != 1:
+            raise ValueError("lat and lon must be 1-D arrays of the same length")
+        self.cell = float(cell_degrees)
+        self.nrows = int(np.ceil(180 / self.cell))
+        self.ncols = int(np.ceil(360 / self.cell))
+        keys = self._keys(self._row(self.lat), self._col(self.lon))
+        self.order = np.argsort(keys, kind="stable")
+        self.keys = keys[self.order]
+
+    def __len__(self) -> int:
+        return len(self.lat)
+
+    def _row(self, lat: np.ndarray) -> np.ndarray:
+        return np.clip(np.floor((lat + 90) / self.cell), 0, self.nrows - 1).astype(np.int64)
+
+    def _col(self, lon: np.ndarray) -> np.ndarray:
+        return np.floor(np.mod(lon + 180, 360) / self.cell).astype(np.int64) % self.ncols
+
+    def _keys(self, row: np.ndarray, col: np.ndarray) -> np.ndarray:
+        return row * self.ncols + col
+
+    def _candidate_ranges(self, lat: np.ndarray, lon: np.ndarray, miles: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(query, start, stop) slices of the sorted keys that cover every query's circle."""
+        dlat = miles / MILES_PER_DEGREE_LAT
+        row_lo, row_hi = self._row(lat - dlat), self._row(lat + dlat)
+        # widest longitude span inside the circle: at the latitude edge nearest a pole
+        edge = np.minimum(np.abs(lat) + dlat, 90.0)
+        with np.errstate(divide="ignore"):
+            dlon = np.where(edge >= 89.999, 180.0, dlat / np.cos(np.radians(edge)))
+        full_width = dlon >= 180.0
+        col_lo = self._col(lon - np.where(full_width, 0.0, dlon))
+        col_hi = self._col(lon + np.where(full_width, 0.0, dlon))
+        col_lo = np.where(full_width, 0, col_lo)
+        col_hi = np.where(full_width, self.ncols - 1, col_hi)
+
+        query = np.arange(len(lat))
+        row, owner = _ragged_arange(row_lo, row_hi + 1)
+        query, col_lo, col_hi = query[owner], col_lo[owner], col_hi[owner]
+        # a span crossing the antimeridian is two ranges: [col_lo, end of row] and [0, col_hi]
+        wraps = col_lo > col_hi
+        ranges = [
+            (query, self._keys(row, col_lo), self._keys(row, np.where(wraps, self.ncols - 1, col_hi)) + 1),
+            (query[wraps], self._keys(row[wraps], 0), self._keys(row[wraps], col_hi[wraps]) + 1),
+        ]
+        query = np.concatenate([r[0] for r in ranges])
+        start = np.searchsorted(self.keys, np.concatenate([r[1] for r in ranges]), side="left")
+        stop = np.searchsorted(self.keys, np.concatenate([r[2] for r in ranges]), side="left")
+        return query, start, stop
+
+    def query(self, lat: Sequence[float], lon: Sequence[float], miles: Sequence[float] | float) -> Matches:
+        """
+        Every (query, point) pair within `miles` (scalar or per-query), as three aligned arrays:
+        query position, point position (into the lat/lon the index was built from) and distance.
+        Sorted by query, then distance. Queries with a NaN coordinate or radius match nothing.
+        """
+        lat = np.asarray(lat, dtype=np.float64)
+        lon = np.asarray(lon, dtype=np.float64)
+        miles = np.broadcast_to(np.asarray(miles, dtype=np.float64), lat.shape)
+        valid = np.flatnonzero(~(np.isnan(lat) | np.isnan(lon) | np.isnan(miles)) & (miles >= 0))
+
+        out_q: List[np.ndarray] = []
+        out_p: List[np.ndarray] = []
+        out_d: List[np.ndarray] = []
+        for at in range(0, len(valid), QUERY_CHUNK):
+            chunk = valid[at:at + QUERY_CHUNK]
+            query, start, stop = self._candidate_ranges(lat[chunk], lon[chunk], miles[chunk])
+            slots, owner = _ragged_arange(start, stop)
+            query, point = chunk[query[owner]], self.order[slots]
+            dist = haversine_miles(lat[query], lon[query], self.lat[point], self.lon[point])
+            hit = dist <= miles[query]
+            out_q.append(query[hit])
+            out_p.append(point[hit])
+            out_d.append(dist[hit])
+
+        if not out_q:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+        query, point, dist = np.concatenate(out_q), np.concatenate(out_p), np.concatenate(out_d)
+        order = np.lexsort((point, dist, query))
+        return query[order], point[order], dist[order]
+
+# ━━━ LOOKUP DB SOURCES ━━━
+
+def load_centroids(lookup: LocalLookup) -> pd.DataFrame:
+    """zip, latitude, longitude for every ZIP with a centroid."""
+    centroids = pd.read_sql_query("SELECT zip, latitude, longitude FROM zip_centroids ORDER BY zip", lookup.conn)
+    if centroids.empty:
+        raise SystemExit("❌ The lookup DB has no zip_centroids; rebuild it with `local_lookup.py build --centroids ...`")
+    return centroids
+
+def load_facility_points(lookup: LocalLookup, centroids: pd.DataFrame) -> pd.DataFrame:
+    """Facilities placed at their ZIP's centroid; those whose ZIP has none are dropped."""
+    facilities = pd.read_sql_query(
+        "SELECT facility_id, facility_name, state, zip_code, radius_rule_miles FROM facilities ORDER BY facility_id",
+        lookup.conn,
+    )
+    facilities["zip"] = facilities["zip_code"].map(normalize_zip)
+    return facilities.merge(centroids, on="zip", how="inner")
+
+# ━━━ BATCH API ━━━
+
+def zips_in_radius_rules(facilities: pd.DataFrame, centroids: pd.DataFrame, index: Optional[RadiusIndex] = None) -> pd.DataFrame:
+    """facility_id, zip, miles for every ZIP inside each facility's radius_rule_miles."""
+    ruled = facilities[pd.to_numeric(facilities["radius_rule_miles"], errors="coerce") > 0].reset_index(drop=True)
+    index = index or RadiusIndex(centroids["latitude"], centroids["longitude"])
+    query, point, dist = index.query(ruled["latitude"], ruled["longitude"], ruled["radius_rule_miles"].astype(float))
+    return pd.DataFrame({
+        "facility_id": ruled["facility_id"].to_numpy()[query],
+        "zip": centroids["zip"].to_numpy()[point],
+        "miles": np.round(dist, 1),
+    })
+
+def facilities_near(zips: Sequence[str], miles: float, facilities: pd.DataFrame, centroids: pd.DataFrame) -> pd.DataFrame:
+    """zip, facility_id, facility_name, state, miles, within_radius_rule for facilities within `miles` of each ZIP."""
+    wanted = pd.DataFrame({"zip": [normalize_zip(z) for z in zips]}).dropna().drop_duplicates()
+    located = wanted.merge(centroids, on="zip", how="inner").reset_index(drop=True)
+    facilities = facilities.reset_index(drop=True)
+    index = RadiusIndex(facilities["latitude"], facilities["longitude"])
+    query, point, dist = index.query(located["latitude"], located["longitude"], miles)
+    near = facilities.iloc[point][["facility_id", "facility_name", "state", "radius_rule_miles"]].reset_index(drop=True)
+    near.insert(0, "zip", located["zip"].to_numpy()[query])
+    near["miles"] = np.round(dist, 1)
+    near["within_radius_rule"] = dist <= pd.to_numeric(near["radius_rule_miles"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+    return near.drop(columns="radius_rule_miles")
+
+# ━━━ CLI ━━━
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Batch radius queries over ZIP centroids and the facility matrix.")
+    parser.add_argument("--db", default=LOOKUP_DB_PATH, help=f"Local lookup DB with zip_centroids (default: {LOOKUP_DB_PATH})")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rules = sub.add_parser("rules", help="ZIPs inside every facility's radius_rule_miles")
+    rules.add_argument("--output", default=DEFAULT_RULES_PATH, help=f"Output CSV (default: {DEFAULT_RULES_PATH})")
+    near = sub.add_parser("near", help="Facilities within --miles of each ZIP")
+    near.add_argument("zips", nargs="+")
+    near.add_argument("--miles", type=float, default=100.0, help="Search radius (default: 100)")
+    near.add_argument("--output", default=None, help="Write matches to this CSV instead of printing them")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    started = time.monotonic()
+    lookup = LocalLookup(args.db)
+    centroids = load_centroids(lookup)
+    facilities = load_facility_points(lookup, centroids)
+    lookup.close()
+    print(f"📍 {len(centroids):,} ZIP centroids, {len(facilities):,} located facilities")
+
+    if args.command == "rules":
+        matches = zips_in_radius_rules(facilities, centroids)
+        matches.to_csv(args.output, index=False)
+        print(f"✅ {len(matches):,} facility/ZIP pairs for {matches['facility_id'].nunique():,} facilities "
+              f"written to {args.output} ({time.monotonic() - started:.1f}s)")
+        return 0
+
+    matches = facilities_near(args.zips, args.miles, facilities, centroids)
+    if args.output:
+        matches.to_csv(args.output, index=False)
+        print(f"✅ {len(matches):,} matches written to {args.output}")
+    else:
+        print(matches.to_string(index=False) if len(matches) else f"⚠️ No facilities within {args.miles:g} miles")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Facility Name Resolver — pay_reports.facility_name_raw -> facility_id (offline, batched)
+
+Builds an in-process trigram index over layer4_facilities_FINAL.csv and resolves free-text
+facility names in one pass, instead of one pg_trgm similarity() query per report.
+
+Scores reproduce pg_trgm: each word is padded ("  word "), split into trigrams, and
+similarity = |shared trigrams| / |union of trigrams|, so the default 0.3 threshold means
+the same thing here as in Postgres.
+
+Blocking: candidates come from the report's 3-digit ZIP prefix first; when nothing there
+clears the threshold, the search widens to the report's state (given, or inferred from
+the ZIP prefix). Identical (name, ZIP prefix, state) triples are only scored once.
+
+Usage:
+  python resolve_facility_names.py pay_reports.csv
+  python resolve_facility_names.py pay_reports.csv --facilities layer4_facilities_FINAL.csv --threshold 0.4
+"""
+
+from __future__ import annotations
+
+import argparse
+import re
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from seed_layer4_facilities import normalize_facility_names
+
+DEFAULT_FACILITIES_PATH = "layer4_facilities_FINAL.csv"
+DEFAULT_OUTPUT_PATH = "pay_reports_resolved.csv"
+DEFAULT_THRESHOLD = 0.3  # pg_trgm.similarity_threshold default
+ZIP_PREFIX_LEN = 3
+
+WORD_RE = re.compile(r"[a-z0-9]+")
+
+def name_trigrams(normalized: str) -> frozenset:
+    """pg_trgm's trigram set for an already-normalized name."""
+    grams = set()
+    for word in WORD_RE.findall(normalized):
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+def trigram_similarity(a: str, b: str) -> float:
+    """Reference pg_trgm similarity() for two raw names (used for spot checks, not the batch path)."""
+    ta = name_trigrams(normalize_facility_names(pd.Series([a])).iloc[0])
+    tb = name_trigrams(normalize_facility_names(pd.Series([b])).iloc[0])
+    union = len(ta | tb)
+    return len(ta & tb) / union if union else 0.0
+
+def zip_prefixes(zips: pd.Series) -> pd.Series:
+    """First ZIP_PREFIX_LEN digits of a zero-padded ZIP, or None."""
+    digits = zips.astype("string").str.strip().str.extract(r"^(\d{3,5})", expand=False)
+    return digits.str.zfill(5).str[:ZIP_PREFIX_LEN].astype(object).where(digits.notna(), None)
+
+class FacilityNameIndex:
+    """Inverted trigram index over facilities, partitioned into ZIP-prefix and state blocks."""
+
+    def __init__(self, facilities: pd.DataFrame):
+        self.facility_ids = facilities["facility_id"].astype(str).to_numpy()
+        self.facility_names = facilities["facility_name"].astype(str).to_numpy()
+        normalized = (
+            facilities["facility_name_normalized"].fillna("")
+            if "facility_name_normalized" in facilities.columns
+            else normalize_facility_names(facilities["facility_name"].fillna(""))
+        )
+        self.vocab: Dict[str, int] = {}
+        encoded = [self._encode(name_trigrams(n), grow=True) for n in normalized]
+        self.sizes = np.array([len(e) for e in encoded], dtype=np.int32)
+
+        prefixes = zip_prefixes(facilities["zip_code"]).to_numpy()
+        states = facilities["state"].astype(str).str.upper().to_numpy()
+        self.blocks: Dict[str, Dict[int, np.ndarray]] = {}
+        postings: Dict[str, Dict[int, List[int]]] = {}
+        for i, grams in enumerate(encoded):
+            for block in (f"zip:{prefixes[i]}" if prefixes[i] else None, f"state:{states[i]}"):
+                if block is None:
+                    continue
+                bucket = postings.setdefault(block, {})
+                for g in grams:
+                    bucket.setdefault(g, []).append(i)
+        for block, bucket in postings.items():
+            self.blocks[block] = {g: np.asarray(ids, dtype=np.int32) for g, ids in bucket.items()}
+
+        # ZIP prefix -> most common facility state, for reports that only carry a ZIP
+        prefix_states = pd.DataFrame({"prefix": prefixes, "state": states}).dropna()
+        self.prefix_state: Dict[str, str] = (
+            prefix_states.groupby("prefix")["state"].agg(lambda s: s.value_counts().index[0]).to_dict()
+        )
+
+    @classmethod
+    def from_csv(cls, path: str) -> "FacilityNameIndex":
+        cols = ["facility_id", "facility_name", "facility_name_normalized", "state", "zip_code"]
+        return cls(pd.read_csv(path, dtype=str, usecols=lambda c: c in cols))
+
+    def _encode(self, grams: Iterable[str], grow: bool = False) -> np.ndarray:
+        ids = []
+        for g in grams:
+            gid = self.vocab.get(g)
+            if gid is None and grow:
+                gid = self.vocab[g] = len(self.vocab)
+            if gid is not None:
+                ids.append(gid)
+        return np.asarray(ids, dtype=np.int32)
+
+    def _best_in_block(self, block: str, grams: np.ndarray, n_grams: int) -> Tuple[int, float]:
+        bucket = self.blocks.get(block)
+        if not bucket:
+            return -1, 0.0
+        hits = [bucket[g] for g in grams if g in bucket]
+        if not hits:
+            return -1, 0.0
+        candidates, shared = np.unique(np.concatenate(hits), return_counts=True)
+        scores = shared / (n_grams + self.sizes[candidates] - shared)
+        best = int(np.argmax(scores))  # ties -> lowest row, i.e. CSV order
+        return int(candidates[best]), float(scores[best])
+
+    def resolve_one(self, normalized: str, prefix: Optional[str], state: Optional[str], threshold: float) -> Tuple[int, float, Optional[str]]:
+        all_grams = name_trigrams(normalized)
+        grams = self._encode(all_grams)  # trigrams no facility has still count toward the union
+        if not all_grams:
+            return -1, 0.0, None
+        state = state or (self.prefix_state.get(prefix) if prefix else None)
+        best = (-1, 0.0, None)
+        for block, label in ((f"zip:{prefix}" if prefix else None, "zip_prefix"), (f"state:{state}" if state else None, "state")):
+            if block is None:
+                continue
+            idx, score = self._best_in_block(block, grams, len(all_grams))
+            if score >= threshold:
+                return idx, score, label
+            if score > best[1]:
+                best = (idx, score, None)
+        return best
+
+    def resolve(self, names: pd.Series, zips: pd.Series, states: Optional[pd.Series] = None, threshold: float = DEFAULT_THRESHOLD) -> pd.DataFrame:
+        """
+        Batch-resolve raw names. Returns one row per input (same index) with facility_id,
+        matched_facility_name, match_score (best pg_trgm similarity seen) and match_block
+        ('zip_prefix' | 'state' | None). facility_id is None below the threshold.
+        """
+        keys = pd.DataFrame({
+            "name": normalize_facility_names(names.fillna("").astype(str)).to_numpy(),
+            "prefix": zip_prefixes(zips).to_numpy(),
+            "state": (states.astype("string").str.strip().str.upper().astype(object).where(states.notna(), None).to_numpy()
+                      if states is not None else None),
+        })
+        codes, uniques = pd.factorize(pd.MultiIndex.from_frame(keys.fillna("")))
+        resolved = [self.resolve_one(name, prefix or None, state or None, threshold) for name, prefix, state in uniques]
+
+        idx = np.array([r[0] for r in resolved], dtype=np.int64)[codes]
+        scores = np.array([r[1] for r in resolved], dtype=np.float64)[codes]
+        blocks = np.array([r[2] for r in resolved], dtype=object)[codes]
+        matched = blocks != None  # noqa: E711 -- elementwise on an object array
+        return pd.DataFrame({
+            "facility_id": np.where(matched, self.facility_ids[idx], None),
+            "matched_facility_name": np.where(matched, self.facility_names[idx], None),
+            "match_score": np.round(scores, 4),
+            "match_block": blocks,
+        }, index=names.index)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Resolve pay_reports.facility_name_raw to facility_id offline.")
+    parser.add_argument("reports_csv", help="CSV with facility_name_raw and zip_code (optional: state)")
+    parser.add_argument("--facilities", default=DEFAULT_FACILITIES_PATH, help=f"Facility matrix (default: {DEFAULT_FACILITIES_PATH})")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_PATH, help=f"Output CSV (default: {DEFAULT_OUTPUT_PATH})")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help=f"Minimum similarity (default: {DEFAULT_THRESHOLD})")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    start = time.time()
+    index = FacilityNameIndex.from_csv(args.facilities)
+    print(f"📇 Indexed {len(index.facility_ids):,} facilities ({len(index.vocab):,} trigrams, {len(index.blocks):,} blocks)")
+
+    reports = pd.read_csv(args.reports_csv, dtype=str)
+    missing = {"facility_name_raw", "zip_code"} - set(reports.columns)
+    if missing:
+        raise SystemExit(f"❌ {args.reports_csv} is missing column(s): {', '.join(sorted(missing))}")
+
+    resolved = index.resolve(
+        reports["facility_name_raw"], reports["zip_code"],
+        reports["state"] if "state" in reports.columns else None,
+        threshold=args.threshold,
+    )
+    out = pd.concat([reports, resolved], axis=1)
+    out.to_csv(args.output, index=False)
+
+    matched = out["facility_id"].notna()
+    elapsed = time.time() - start
+    print(f"✅ Resolved {matched.sum():,} / {len(out):,} reports ({matched.mean() * 100:.1f}%) in {elapsed:.2f}s -> {args.output}")
+    if matched.any():
+        print(f"📊 By block: {out.loc[matched, 'match_block'].value_counts().to_dict()}")
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,211 @@
+import argparse
+import contextlib
+import time
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
 import random
+from datetime import date
+
+from artifact_store import write_artifact
+from local_lookup import (DEFAULT_ZIPS_PATH, LOOKUP_DB_PATH, MONTHS, PICKED_MAPPINGS_SQL, LocalLookup, gsa_fiscal_year,
+                          prepare_zip_mappings, read_seed_rows, read_source)
+
+# -----------------------------------------------------------------
+# ENGINE CONSTANTS (shared by the demo and the full-scale production run)
+# -----------------------------------------------------------------
+# Using 28% assumed baseline margin (from NY State audits)
+BASELINE_MARGIN = 0.28
+# Sub-Vendor Penalty: MSP skims an extra 4% off the top if the nurse uses an outside agency
+SUB_VENDOR_PENALTY = 0.04
+CONTRACT_HOURS = 36
+WEEKS_PER_MONTH = 4.33
+ARBITRAGE_MAX_BURDEN = 55
+DANGER_MIN_BURDEN = 85
+
+OUTPUT_CSV = "layer3_market_analysis_SEED.csv"
+JOB_CHUNK_ROWS = 500_000
+ZIP_SPACE = 100_000  # Every 5-digit ZIP is its own slot in the integer lookup tables
+
+# Column aliases accepted from a zip_housing_costs export or seed (first match wins)
+HOUSING_TABLE = "zip_housing_costs"
+HOUSING_ZIP_COLUMNS = ["zip_code", "zip"]
+HOUSING_RENT_COLUMNS = ["zillow_observed_rent", "zori_rent"]
+HOUSING_RENT_FALLBACK = "fmr_1br"  # Same ZORI -> HUD fallback as the state market pages
+HOUSING_STIPEND_COLUMNS = ["gsa_monthly_stipend", "monthly_total"]
+HOUSING_LABEL_COLUMNS = ["city", "state"]  # Taken from gsa_zip_mappings when the export lacks them (zip_housing_costs has neither)
+# A --housing CSV that already carries the stipend, so no lookup DB is needed (psql, from the app's schema).
+# Prices the month at peak lodging; the lookup DB join uses the current month's seasonal rate instead.
+HOUSING_EXPORT_SQL = """psql "$DATABASE_URL" -c "COPY (
+    SELECT h.zip, h.zori_rent, h.fmr_1br, m.city, m.state,
+           (r.max_lodging + r.meals_daily) * 30 AS gsa_monthly_stipend
+    FROM zip_housing_costs h
+    JOIN LATERAL (SELECT * FROM gsa_zip_mappings g WHERE g.zip = h.zip
+                  ORDER BY g.fiscal_year DESC LIMIT 1) m ON true
+    JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = m.fiscal_year
+) TO STDOUT WITH CSV HEADER" > zip_housing_costs.csv"""
+JOB_COLUMNS = ["zip_code", "profession", "specialty", "is_sub_vendor", "gross_weekly_pay"]
+INDEX_TOP_K = 10
+INDEX_SQL_FILE = "insert_market_arbitrage_index.sql"
+INDEX_COLUMNS = ['state', 'specialty', 'kind', 'rank', 'zip_code', 'city', 'is_sub_vendor', 'gross_weekly_pay', 'est_hourly_bill_rate', 'weekly_pocketed_cash', 'rent_burden_pct']
+# kind -> (eligibility filter, column ranked descending); danger zones rank by the worst burden
+INDEX_RANKINGS = {
+    'arbitrage': (lambda df: df['rent_burden_pct'] < ARBITRAGE_MAX_BURDEN, 'weekly_pocketed_cash'),
+    'danger': (lambda df: df['rent_burden_pct'] > DANGER_MIN_BURDEN, 'rent_burden_pct'),
+}
+# Scenario sweep defaults: 17 margins x 7 penalties x 3 hour templates = 357 scenarios
+SWEEP_MARGINS = "0.20:0.36:0.01"
+SWEEP_PENALTIES = "0.00:0.06:0.01"
+SWEEP_HOURS = "36,40,48"
+SWEEP_PERCENTILES = (10, 25, 50, 75, 90)
+SWEEP_BLOCK_MARKETS = 20_000
+SWEEP_CSV = "layer3_margin_bands.csv"
+REPORT_COLUMNS = ['city', 'specialty', 'is_sub_vendor', 'gross_weekly_pay', 'est_hourly_bill_rate', 'weekly_pocketed_cash', 'rent_burden_pct']
+
+def score_market(df_market):
+    """Adds the margin and traveler ROI columns in place. Float32 inputs stay float32."""
+    # -----------------------------------------------------------------
+    # THE CLEAN ROOM MATH (State Margins + Sub-Vendor Penalty)
+    # -----------------------------------------------------------------
+    df_market['actual_margin_taken'] = np.where(df_market['is_sub_vendor'], BASELINE_MARGIN + SUB_VENDOR_PENALTY, BASELINE_MARGIN).astype(df_market['gross_weekly_pay'].dtype)
+
+    # Reverse engineer the Hospital's Hourly Bill Rate
+    df_market['implied_weekly_bill'] = df_market['gross_weekly_pay'] / (1 - df_market['actual_margin_taken'])
+    df_market['est_hourly_bill_rate'] = (df_market['implied_weekly_bill'] / CONTRACT_HOURS).round(2)
+
+    # -----------------------------------------------------------------
+    # THE TRAVELER'S ROI MATH (Fixed to Weekly)
+    # -----------------------------------------------------------------
+    # We must convert monthly Zillow and GSA to Weekly to match the paycheck!
+    df_market['weekly_rent_cost'] = (df_market['zillow_observed_rent'] / WEEKS_PER_MONTH).round(2)
+    df_market['weekly_stipend_max'] = (df_market['gsa_monthly_stipend'] / WEEKS_PER_MONTH).round(2)
+
+    # Rent Burden % = How much of my weekly tax-free stipend goes to my landlord?
+    # Undefined without a positive stipend: NaN keeps those rows out of both rankings instead of an inf burden
+    burden = ((df_market['weekly_rent_cost'] / df_market['weekly_stipend_max']) * 100).round(1)
+    df_market['rent_burden_pct'] = burden.where(df_market['weekly_stipend_max'] > 0)
+
+    # Net Tax-Free Cash = What the nurse actually pockets weekly after rent
+    df_market['weekly_pocketed_cash'] = (df_market['weekly_stipend_max'] - df_market['weekly_rent_cost']).round(2)
+    return df_market
+
+def top_unique(df_market, mask, n=5):
+    """Best n rows by pocketed cash with one row per (city, specialty)."""
+    # Same rows as sort + drop_duplicates(keep='first'), without sorting the whole chunk
+    best = df_market[mask].groupby(['city', 'specialty'], observed=True, dropna=False, sort=False)['weekly_pocketed_cash'].idxmax()
+    ranked = df_market.loc[np.sort(best.to_numpy())]
+    return ranked.sort_values(by='weekly_pocketed_cash', ascending=False, kind='stable').head(n)
+
+def select_top_k(df_market, mask, by, k=INDEX_TOP_K):
+    """
+    Top k distinct cities per (state, specialty) by `by`, descending. A hash groupby first keeps
+    each city's best row, so only those few thousand candidates are ever ordered -- never the
+    full frame. Ties keep the earliest row, like a stable sort + drop_duplicates.
+    """
+    eligible = df_market[mask & df_market['state'].notna()]
+    if eligible.empty:
+        return eligible
+    best = eligible.groupby(['state', 'specialty', 'city'], observed=True, dropna=False, sort=False)[by].idxmax()
+    candidates = eligible.loc[np.sort(best.to_numpy())]
+    candidates = candidates.sort_values(['state', 'specialty', by], ascending=[True, True, False], kind='stable')
+    return candidates.groupby(['state', 'specialty'], observed=True, sort=False).head(k)
+
+class ArbitrageIndex:
+    """
+    Streaming top-K index per (state, specialty, kind). Each update folds a scored chunk into
+    pools that never exceed k rows per group, so memory is independent of feed size.
+    """
+
+    def __init__(self, k=INDEX_TOP_K):
+        self.k = k
+        self.pools = {}
+
+    def update(self, df_market):
+        for kind, (eligible, by) in INDEX_RANKINGS.items():
+            picked = select_top_k(df_market, eligible(df_market), by, self.k)
+            pool = self.pools.get(kind)
+            if pool is not None:
+                picked = pd.concat([pool, picked], ignore_index=True)
+                picked = select_top_k(picked, np.ones(len(picked), dtype=bool), by, self.k)
+            self.pools[kind] = picked[[c for c in INDEX_COLUMNS if c in picked.columns]].reset_index(drop=True)
+
+    def rows(self):
+        """The index as one frame with 1-based ranks, ordered by its primary key."""
+        ranked = []
+        for kind, (_, by) in INDEX_RANKINGS.items():
+            pool = self.pools.get(kind)
+            if pool is None or pool.empty:
+                continue
+            pool = pool.astype({'state': str, 'specialty': str})
+            pool = pool.sort_values(['state', 'specialty', by], ascending=[True, True, False], kind='stable')
+            pool.insert(2, 'kind', kind)
+            pool.insert(3, 'rank', pool.groupby(['state', 'specialty'], sort=False).cumcount() + 1)
+            ranked.append(pool)
+        if not ranked:
+            return pd.DataFrame(columns=INDEX_COLUMNS)
+        return pd.concat(ranked, ignore_index=True)[INDEX_COLUMNS].sort_values(['state', 'specialty', 'kind', 'rank'], kind='stable')
+
+def _sql_text(values):
+    text = pd.Series(values, copy=False).astype(object)
+    quoted = "'" + text.astype(str).str.replace("'", "''", regex=False) + "'"
+    return quoted.where(text.notna(), 'NULL')
+
+def _sql_number(values, decimals, precision):
+    """NUMERIC(precision, decimals) literals: finite values clamped to the column's range, NULL otherwise."""
+    values = pd.Series(values, copy=False).astype(np.float64).round(decimals)
+    bound = 10.0 ** (precision - decimals) - 10.0 ** -decimals
+    finite = np.isfinite(values)
+    return values.clip(-bound, bound).map(lambda v: f"{v:.{decimals}f}").where(finite, 'NULL')
+
+def write_index_sql(index_rows, path=INDEX_SQL_FILE):
+    """Replaces market_arbitrage_index atomically -- ranks shift between runs, so no upserts."""
+    if index_rows.empty:
+        # The replacement is DELETE + INSERT in one transaction; without rows it would only wipe the live index
+        raise ValueError(f"Refusing to write '{path}': the arbitrage index is empty")
+    literals = pd.DataFrame({
+        'state': _sql_text(index_rows['state']),
+        'specialty': _sql_text(index_rows['specialty']),
+        'kind': _sql_text(index_rows['kind']),
+        'rank': index_rows['rank'].astype(int).astype(str),
+        'zip_code': _sql_text(index_rows['zip_code']),
+        'city': _sql_text(index_rows['city']),
+        'is_sub_vendor': index_rows['is_sub_vendor'].map({True: 'TRUE', False: 'FALSE'}).fillna('NULL'),
+        'gross_weekly_pay': _sql_number(index_rows['gross_weekly_pay'], 2, 8),
+        'est_hourly_bill_rate': _sql_number(index_rows['est_hourly_bill_rate'], 2, 8),
+        'weekly_pocketed_cash': _sql_number(index_rows['weekly_pocketed_cash'], 2, 8),
+        'rent_burden_pct': _sql_number(index_rows['rent_burden_pct'], 1, 5),
+    })
+    values = ("(" + literals.agg(", ".join, axis=1) + ")").tolist()
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write("-- Auto-generated by seed_layer3_arbitrage.py\n")
+        f.write("BEGIN;\n\n")
+        f.write("DELETE FROM market_arbitrage_index;\n\n")
+        if values:
+            f.write(f"INSERT INTO market_arbitrage_index ({', '.join(INDEX_COLUMNS)}) VALUES\n")
+            f.write(",\n".join(values))
+            f.write(";\n\n")
+        f.write("COMMIT;\n")
+    print(f"🗂️ Wrote {len(values)} ranked rows to '{path}' (top {INDEX_TOP_K} per state x specialty)")
+
+def print_insights(arbitrage, danger):
+    # Format for clean console printing
+    pd.options.display.float_format = '${:,.2f}'.format
+
+    print("💰 TOP ARBITRAGE MARKETS (High Pocketed Cash, Low Rent Burden):")
+    print(arbitrage[REPORT_COLUMNS].head(5).to_string(index=False))
+
+    print("\n🚨 DANGER ZONES (Rent eats the majority of the stipend):")
+    print(danger[REPORT_COLUMNS].head(5).to_string(index=False))
 
 def build_arbitrage_engine():
     print("🚀 Initiating Arbitrage Engine: Layer 3 (Pay & Margin Math)...\n")
 
     # ====================================================================
     # 1. LOAD YOUR EXISTING HOUSING DATA (Layers 1 & 2)
-    # 👇 UNCOMMENT THE LINE BELOW WHEN USING YOUR REAL 38K ROW CSV 👇
-    # df_housing = pd.read_csv('zip_housing_costs.csv', dtype={'zip_code': str})
+    # 👇 FOR YOUR REAL 38K ROW CSV + LIVE JOB FEEDS, RUN PRODUCTION MODE INSTEAD 👇
+    #    python seed_layer3_arbitrage.py --housing zip_housing_costs.csv --jobs feed1.csv feed2.csv
     
-    # 👇 DELETE THIS MOCK DATA BLOCK ONCE YOU UNCOMMENT THE LINE ABOVE 👇
+    # 👇 DEMO MOCK DATA BLOCK 👇
     df_housing = pd.DataFrame({
         'zip_code': ['85202', '10001', '33101', '97213', '75201', '44101'],
         'city': ['Mesa', 'New York', 'Miami', 'Portland', 'Dallas', 'Cleveland'],
@@ -50,51 +245,379 @@ def build_arbitrage_engine():
     # 3. MERGE THE DATA (Link the job offer to the absolute truth of the housing market)
     df_market = pd.merge(df_jobs, df_housing, on='zip_code', how='inner')
 
-    # -----------------------------------------------------------------
-    # 4. THE CLEAN ROOM MATH (State Margins + Sub-Vendor Penalty)
-    # -----------------------------------------------------------------
-    # Using 28% assumed baseline margin (from NY State audits)
-    BASELINE_MARGIN = 0.28 
-    
-    # Sub-Vendor Penalty: MSP skims an extra 4% off the top if the nurse uses an outside agency
-    df_market['actual_margin_taken'] = np.where(df_market['is_sub_vendor'], BASELINE_MARGIN + 0.04, BASELINE_MARGIN)
+    # 4-5. THE CLEAN ROOM + TRAVELER'S ROI MATH
+    score_market(df_market)
 
-    # Reverse engineer the Hospital's Hourly Bill Rate
-    df_market['implied_weekly_bill'] = df_market['gross_weekly_pay'] / (1 - df_market['actual_margin_taken'])
-    df_market['est_hourly_bill_rate'] = (df_market['implied_weekly_bill'] / 36).round(2)
+    # 6. OUTPUT THE INSIGHTS 
+    print_insights(
+        top_unique(df_market, df_market['rent_burden_pct'] < ARBITRAGE_MAX_BURDEN),
+        top_unique(df_market, df_market['rent_burden_pct'] > DANGER_MIN_BURDEN),
+    )
+    # No index seed here: mock markets must never replace market_arbitrage_index (production mode writes it)
 
-    # -----------------------------------------------------------------
-    # 5. THE TRAVELER'S ROI MATH (Fixed to Weekly)
-    # -----------------------------------------------------------------
-    WEEKS_PER_MONTH = 4.33
-    
-    # We must convert monthly Zillow and GSA to Weekly to match the paycheck!
-    df_market['weekly_rent_cost'] = (df_market['zillow_observed_rent'] / WEEKS_PER_MONTH).round(2)
-    df_market['weekly_stipend_max'] = (df_market['gsa_monthly_stipend'] / WEEKS_PER_MONTH).round(2)
+    # Export to database to populate your State Market Pages
+    df_market = df_market.sort_values(by='weekly_pocketed_cash', ascending=False)
+    write_artifact(df_market, OUTPUT_CSV)
+    print(f"\n✅ Saved {len(df_market)} validated market payloads to '{OUTPUT_CSV}'")
 
-    # Rent Burden % = How much of my weekly tax-free stipend goes to my landlord?
-    df_market['rent_burden_pct'] = ((df_market['weekly_rent_cost'] / df_market['weekly_stipend_max']) * 100).round(1)
-    
-    # Net Tax-Free Cash = What the nurse actually pockets weekly after rent
-    df_market['weekly_pocketed_cash'] = (df_market['weekly_stipend_max'] - df_market['weekly_rent_cost']).round(2)
+# =====================================================================
+# PRODUCTION MODE: every ZIP x every job, chunked and integer-joined
+# =====================================================================
 
-    # 6. OUTPUT THE INSIGHTS 
-    df_market = df_market.sort_values(by='weekly_pocketed_cash', ascending=False)
-    
-    # Format for clean console printing
-    pd.options.display.float_format = '${:,.2f}'.format
+def encode_zips(zips):
+    """5-digit ZIP strings (or ZIP+4) -> int32 slots. Unparseable ZIPs become -1."""
+    zips = pd.Series(zips, copy=False)
+    try:
+        codes = zips.astype(np.int64).to_numpy(copy=True)  # Fast path: clean digit-only feeds
+    except (TypeError, ValueError):
+        codes = pd.to_numeric(zips.astype(str).str.strip().str[:5], errors='coerce').fillna(-1).to_numpy(dtype=np.int64)
+    codes[(codes < 0) | (codes >= ZIP_SPACE)] = -1
+    return codes.astype(np.int32)
 
-    print("💰 TOP ARBITRAGE MARKETS (High Pocketed Cash, Low Rent Burden):")
-    arbitrage = df_market[df_market['rent_burden_pct'] < 55].drop_duplicates(subset=['city', 'specialty'])
-    print(arbitrage[['city', 'specialty', 'is_sub_vendor', 'gross_weekly_pay', 'est_hourly_bill_rate', 'weekly_pocketed_cash', 'rent_burden_pct']].head(5).to_string(index=False))
-    
-    print("\n🚨 DANGER ZONES (Rent eats the majority of the stipend):")
-    danger = df_market[df_market['rent_burden_pct'] > 85].drop_duplicates(subset=['city', 'specialty'])
-    print(danger[['city', 'specialty', 'is_sub_vendor', 'gross_weekly_pay', 'est_hourly_bill_rate', 'weekly_pocketed_cash', 'rent_burden_pct']].head(5).to_string(index=False))
+def _first_present(columns, candidates, what):
+    for c in candidates:
+        if c in columns:
+            return c
+    raise ValueError(f"Housing file has no {what} column (expected one of {candidates})")
 
-    # Export to database to populate your State Market Pages
-    df_market.to_csv("layer3_market_analysis_SEED.csv", index=False)
-    print("\n✅ Saved 500 validated market payloads to 'layer3_market_analysis_SEED.csv'")
+def load_zip_labels(path):
+    """city/state per 5-digit ZIP from a gsa_zip_mappings seed or export (latest fiscal year wins), or None."""
+    raw = read_source(path, "gsa_zip_mappings")
+    if raw is None:
+        return None
+    mappings = prepare_zip_mappings(raw).sort_values('fiscal_year', ascending=False, kind='stable')
+    labels = mappings.drop_duplicates('zip').set_index('zip')[HOUSING_LABEL_COLUMNS]
+    return labels.apply(lambda col: col.str.strip().replace('', pd.NA))  # The seed leaves city blank
+
+def load_gsa_stipends(db_path, on=None):
+    """
+    Monthly GSA max per ZIP from the local lookup DB, by LocalLookup.stipend()'s rules as one
+    query: the picked mapping's rates for the fiscal year of `on`, monthly_total else 30 days
+    of that month's lodging (max_lodging fallback) plus meals. ZIPs without rates are absent.
+    """
+    on = on or date.today()
+    month_col = f"lodging_{MONTHS[on.month - 1]}"
+    lookup = LocalLookup(db_path)
+    try:
+        stipends = pd.read_sql_query(
+            f"""
+            WITH mapped AS ({PICKED_MAPPINGS_SQL})
+            SELECT m.zip, COALESCE(r.monthly_total,
+                   (COALESCE(r.{month_col}, r.max_lodging, 0) + COALESCE(r.meals_daily, 0)) * 30) AS monthly_max
+            FROM mapped m
+            JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = :fy
+            """,
+            lookup.conn, params={"fy": gsa_fiscal_year(on)}, dtype={"zip": "string"},
+        )
+    finally:
+        lookup.close()
+    return stipends.set_index('zip')['monthly_max'].astype(np.float32)
+
+def load_housing_lookup(path, zip_mappings_path=None, lookup_db=None):
+    """
+    Loads the ~40k-row zip_housing_costs data into dense arrays indexed by integer ZIP,
+    so joining a job chunk is a single fancy-index instead of a string merge.
+    `path` is a CSV export or the .sql seed fetch_housing_data.py writes (--format insert or copy).
+    The monthly GSA stipend comes from the export (gsa_monthly_stipend, or gsa_rates.monthly_total)
+    or, when it has none (the seed never does), from the lookup DB at lookup_db.
+    City/state labels the export lacks are filled from zip_mappings_path when one is given.
+    """
+    seed = read_seed_rows(path, HOUSING_TABLE) if str(path).lower().endswith('.sql') else None
+    columns = seed.columns if seed is not None else pd.read_csv(path, nrows=0).columns
+    zip_col = _first_present(columns, HOUSING_ZIP_COLUMNS, "ZIP")
+    stipend_col = next((c for c in HOUSING_STIPEND_COLUMNS if c in columns), None)
+    if stipend_col is None and not lookup_db:
+        raise ValueError(f"Housing file has no GSA monthly stipend column (expected one of {HOUSING_STIPEND_COLUMNS}) "
+                         "and no lookup DB was given to join it from")
+    rent_cols = [c for c in HOUSING_RENT_COLUMNS if c in columns][:1]
+    if HOUSING_RENT_FALLBACK in columns:
+        rent_cols.append(HOUSING_RENT_FALLBACK)
+    if not rent_cols:
+        raise ValueError(f"Housing file has no rent column (expected one of {HOUSING_RENT_COLUMNS + [HOUSING_RENT_FALLBACK]})")
+    label_cols = [c for c in HOUSING_LABEL_COLUMNS if c in columns]
+
+    number_cols = [c for c in (stipend_col, *rent_cols) if c is not None]
+    if seed is not None:
+        df = seed[[zip_col, *number_cols, *label_cols]].copy()
+        for col in number_cols:
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(np.float32)
+        for col in label_cols:
+            df[col] = df[col].astype('category')
+    else:
+        df = pd.read_csv(
+            path,
+            usecols=[zip_col, *number_cols, *label_cols],
+            dtype={zip_col: str, **{c: np.float32 for c in number_cols}, **{c: 'category' for c in label_cols}},
+        )
+    if stipend_col is None:
+        stipend_col = HOUSING_STIPEND_COLUMNS[0]
+        df[stipend_col] = df[zip_col].str.strip().str.zfill(5).str[:5].map(load_gsa_stipends(lookup_db)).astype(np.float32)
+    missing_labels = [c for c in HOUSING_LABEL_COLUMNS if c not in label_cols]
+    labels = load_zip_labels(zip_mappings_path) if missing_labels and zip_mappings_path else None
+    if labels is not None:
+        keys = df[zip_col].str.strip().str.zfill(5).str[:5]
+        for col in missing_labels:
+            df[col] = keys.map(labels[col]).astype('category')
+        label_cols = HOUSING_LABEL_COLUMNS
+
+    rent = df[rent_cols[0]]
+    if len(rent_cols) > 1:
+        rent = rent.fillna(df[rent_cols[1]])  # ZORI first, HUD FMR when Zillow has no coverage
+
+    zips = encode_zips(df[zip_col].str.zfill(5))
+    keep = (zips >= 0) & rent.notna().to_numpy() & df[stipend_col].notna().to_numpy()
+    zips = zips[keep]
+
+    lookup = {
+        'rent': np.full(ZIP_SPACE, np.nan, dtype=np.float32),
+        'stipend': np.full(ZIP_SPACE, np.nan, dtype=np.float32),
+        'present': np.zeros(ZIP_SPACE, dtype=bool),
+        'zip_count': int(keep.sum()),
+    }
+    lookup['rent'][zips] = rent.to_numpy(dtype=np.float32)[keep]
+    lookup['stipend'][zips] = df[stipend_col].to_numpy(dtype=np.float32)[keep]
+    lookup['present'][zips] = True
+    lookup['zip_labels'] = pd.Index([f"{z:05d}" for z in range(ZIP_SPACE)])
+    # City/state ride along as categorical codes (-1 = unknown) so the output can still be labelled
+    for col in HOUSING_LABEL_COLUMNS:
+        codes = np.full(ZIP_SPACE, -1, dtype=np.int32)
+        if col in label_cols:
+            codes[zips] = df[col].cat.codes.to_numpy()[keep]
+            lookup[col] = (codes, df[col].cat.categories)
+        else:
+            lookup[col] = (codes, pd.Index([], dtype=object))
+    return lookup
+
+def iter_job_chunks(paths, chunk_rows=JOB_CHUNK_ROWS):
+    """Streams job feeds with tight dtypes; memory is bounded by chunk_rows, not feed size."""
+    for path in paths:
+        reader = pd.read_csv(
+            path,
+            usecols=JOB_COLUMNS,
+            dtype={'zip_code': str, 'profession': 'category', 'specialty': 'category', 'gross_weekly_pay': np.float32},
+            chunksize=chunk_rows,
+        )
+        for chunk in reader:
+            if chunk['is_sub_vendor'].dtype != bool:
+                chunk['is_sub_vendor'] = chunk['is_sub_vendor'].astype(str).str.lower().isin(['true', 't', '1', 'yes'])
+            yield chunk
+
+def join_job_chunk(jobs, lookup):
+    """Inner join of a job chunk onto the ZIP lookup via integer indexing."""
+    zips = encode_zips(jobs['zip_code'])
+    hit = zips >= 0
+    hit[hit] = lookup['present'][zips[hit]]
+    zips = zips[hit]
+
+    df_market = jobs.loc[hit].reset_index(drop=True)
+    df_market['zip_code'] = pd.Categorical.from_codes(zips, categories=lookup['zip_labels'])
+    for col in ('city', 'state'):
+        codes, categories = lookup[col]
+        df_market[col] = pd.Categorical.from_codes(codes[zips], categories=categories)
+    df_market['gsa_monthly_stipend'] = lookup['stipend'][zips]
+    df_market['zillow_observed_rent'] = lookup['rent'][zips]
+    return df_market
+
+def run_production_engine(housing_path, job_paths, output_path=OUTPUT_CSV, chunk_rows=JOB_CHUNK_ROWS, index_path=INDEX_SQL_FILE, zip_mappings_path=DEFAULT_ZIPS_PATH, lookup_db=LOOKUP_DB_PATH):
+    """
+    Scores every job in the feeds against every ZIP in the housing export, one chunk at a time.
+    Rows are streamed to output_path in feed order; only the leaderboards and the top-K index
+    (written to index_path) are ranked.
+    Pass output_path=None to skip the row-level CSV, which dominates runtime at millions of rows.
+    The index is keyed by state: ZIPs take it from the housing export, else from zip_mappings_path.
+    """
+    print("🚀 Initiating Arbitrage Engine: Layer 3 (Production, full country)...\n")
+    lookup = load_housing_lookup(housing_path, zip_mappings_path, lookup_db)
+    print(f"📊 Loaded {lookup['zip_count']:,} priced ZIPs from '{housing_path}'")
+    state_codes, _ = lookup['state']
+    labelled = int((state_codes[lookup['present']] >= 0).sum())
+    if labelled == 0:
+        raise ValueError(f"No priced ZIP has a state: '{housing_path}' has no state column and no gsa_zip_mappings "
+                         f"source was found at '{zip_mappings_path}'; the per-state index can't be built")
+    if labelled < lookup['zip_count']:
+        print(f"⚠️ {lookup['zip_count'] - labelled:,} priced ZIPs have no state and are left out of the index")
+
+    # Each chunk's own top-5 distinct (city, specialty) rows are a superset of the global top-5
+    arbitrage_pool, danger_pool = [], []
+    index = ArbitrageIndex()
+    scanned = scored = 0
+    started = time.perf_counter()
+    with (open(output_path, 'w', encoding='utf-8', newline='') if output_path else contextlib.nullcontext()) as out:
+        for jobs in iter_job_chunks(job_paths, chunk_rows):
+            scanned += len(jobs)
+            df_market = score_market(join_job_chunk(jobs, lookup))
+            if df_market.empty:
+                continue
+            if out is not None:
+                df_market.to_csv(out, index=False, header=(scored == 0))
+            scored += len(df_market)
+            arbitrage_pool.append(top_unique(df_market, df_market['rent_burden_pct'] < ARBITRAGE_MAX_BURDEN))
+            danger_pool.append(top_unique(df_market, df_market['rent_burden_pct'] > DANGER_MIN_BURDEN))
+            index.update(df_market)
+            print(f"   ... scored {scored:,} / {scanned:,} jobs")
+
+    if scored == 0:
+        print("⚠️ No jobs matched a priced ZIP; nothing to rank.")
+        return 0
+
+    arbitrage = pd.concat(arbitrage_pool, ignore_index=True)
+    danger = pd.concat(danger_pool, ignore_index=True)
+    print()
+    print_insights(
+        top_unique(arbitrage, np.ones(len(arbitrage), dtype=bool)),
+        top_unique(danger, np.ones(len(danger), dtype=bool)),
+    )
+    print()
+    index_rows = index.rows()
+    if index_rows.empty:
+        print(f"⚠️ No market qualified for the index; '{index_path}' not written so the live table is kept")
+    else:
+        write_index_sql(index_rows, index_path)
+    elapsed = time.perf_counter() - started
+    print(f"\n⏱️ Scored {scored:,} jobs in {elapsed:.1f}s ({scored / elapsed:,.0f} jobs/s); {scanned - scored:,} had no priced ZIP")
+    if output_path:
+        print(f"✅ Saved {scored:,} validated market payloads to '{output_path}'")
+    return scored
+
+# =====================================================================
+# SCENARIO SWEEP: margin / penalty / hours sensitivity bands per market
+# =====================================================================
+# A market's mean implied hourly bill under scenario (m, p, h) is
+#     (G_direct / (1 - m) + G_sub / (1 - m - p)) / (jobs * h)
+# so each (zip, specialty) collapses to three sums and every scenario is one broadcast.
+
+def parse_sweep_values(spec):
+    """'0.20:0.36:0.01' (inclusive range) or '36,40,48' -> float64 array."""
+    if ':' in spec:
+        start, stop, step = (float(x) for x in spec.split(':'))
+        return np.round(np.arange(start, stop + step / 2, step), 10)
+    return np.array([float(x) for x in spec.split(',')], dtype=np.float64)
+
+def scenario_grid(margins, penalties, hours):
+    """Cartesian product of the assumptions as flat (S,) arrays."""
+    m, p, h = np.meshgrid(np.asarray(margins, dtype=np.float64), np.asarray(penalties, dtype=np.float64), np.asarray(hours, dtype=np.float64), indexing='ij')
+    grid = {'margin': m.ravel(), 'penalty': p.ravel(), 'hours': h.ravel()}
+    if np.any(grid['margin'] + grid['penalty'] >= 1) or np.any(grid['hours'] <= 0):
+        raise ValueError("Scenario grid needs margin + penalty < 1 and hours > 0")
+    return grid
+
+def market_bill_stats(df_market):
+    """Per (zip_code, specialty): job count and float64 gross sums split by sub-vendor status."""
+    gross = df_market['gross_weekly_pay'].to_numpy(dtype=np.float64)
+    sub = df_market['is_sub_vendor'].to_numpy(dtype=bool)
+    zip_codes, zip_labels = pd.factorize(df_market['zip_code'])
+    spec_codes, spec_labels = pd.factorize(df_market['specialty'])
+    keys, market = np.unique(zip_codes.astype(np.int64) * len(spec_labels) + spec_codes, return_inverse=True)
+    return pd.DataFrame(
+        {
+            'jobs': np.bincount(market),
+            'sub_vendor_jobs': np.bincount(market, weights=sub).astype(np.int64),
+            'gross_direct': np.bincount(market, weights=np.where(sub, 0.0, gross)),
+            'gross_sub': np.bincount(market, weights=np.where(sub, gross, 0.0)),
+        },
+        index=pd.MultiIndex.from_arrays(
+            [np.asarray(zip_labels.astype(str))[keys // len(spec_labels)], np.asarray(spec_labels.astype(str))[keys % len(spec_labels)]],
+            names=['zip_code', 'specialty'],
+        ),
+    )
+
+def merge_bill_stats(parts):
+    """Folds per-chunk stats together; size is bounded by the number of markets."""
+    return pd.concat(parts).groupby(level=['zip_code', 'specialty'], sort=True).sum()
+
+def _sweep_block(block):
+    """(K markets) x (S scenarios) hourly bill matrix in float32 -> (K, Q) percentiles. Module-level so it pickles."""
+    jobs, gross_direct, gross_sub, grid, percentiles = block
+    inv_direct = (1 / (1 - grid['margin'])).astype(np.float32)
+    inv_sub = (1 / (1 - grid['margin'] - grid['penalty'])).astype(np.float32)
+    weekly = gross_direct.astype(np.float32)[:, None] * inv_direct + gross_sub.astype(np.float32)[:, None] * inv_sub
+    hourly = weekly / (jobs.astype(np.float32)[:, None] * grid['hours'].astype(np.float32))
+    return np.percentile(hourly, percentiles, axis=1).T
+
+def sweep_scenarios(stats, grid, percentiles=SWEEP_PERCENTILES, workers=1, block_markets=SWEEP_BLOCK_MARKETS):
+    """
+    Percentile bands of the mean implied hourly bill rate across every scenario, per market.
+    Peak memory is block_markets x scenarios float32; workers > 1 fans blocks out to a process pool.
+    """
+    jobs = stats['jobs'].to_numpy()
+    direct = stats['gross_direct'].to_numpy()
+    sub = stats['gross_sub'].to_numpy()
+    blocks = [
+        (jobs[i:i + block_markets], direct[i:i + block_markets], sub[i:i + block_markets], grid, list(percentiles))
+        for i in range(0, len(stats), block_markets)
+    ]
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            bands = list(pool.map(_sweep_block, blocks))
+    else:
+        bands = [_sweep_block(b) for b in blocks]
+    bands = np.vstack(bands) if bands else np.empty((0, len(percentiles)), dtype=np.float32)
+
+    out = stats[['jobs', 'sub_vendor_jobs']].reset_index()
+    base = (direct / (1 - BASELINE_MARGIN) + sub / (1 - BASELINE_MARGIN - SUB_VENDOR_PENALTY)) / (jobs * CONTRACT_HOURS)
+    out['base_hourly_bill_rate'] = np.round(base, 2)
+    for i, q in enumerate(percentiles):
+        out[f'hourly_bill_p{q}'] = np.round(bands[:, i].astype(np.float64), 2)
+    return out
+
+def run_margin_sweep(housing_path, job_paths, grid, output_path=SWEEP_CSV, chunk_rows=JOB_CHUNK_ROWS, workers=1, lookup_db=LOOKUP_DB_PATH):
+    print("🚀 Initiating Arbitrage Engine: Layer 3 (Margin Scenario Sweep)...\n")
+    lookup = load_housing_lookup(housing_path, lookup_db=lookup_db)
+    started = time.perf_counter()
+    parts = [market_bill_stats(join_job_chunk(jobs, lookup)) for jobs in iter_job_chunks(job_paths, chunk_rows)]
+    stats = merge_bill_stats(parts) if parts else pd.DataFrame()
+    if stats.empty:
+        print("⚠️ No jobs matched a priced ZIP; nothing to sweep.")
+        return None
+
+    n_scenarios = len(grid['margin'])
+    print(f"📊 {len(stats):,} markets ({int(stats['jobs'].sum()):,} jobs) x {n_scenarios:,} scenarios")
+    bands = sweep_scenarios(stats, grid, workers=workers)
+    bands.to_csv(output_path, index=False)
+    elapsed = time.perf_counter() - started
+    print(f"⏱️ Swept {len(stats) * n_scenarios:,} market-scenarios in {elapsed:.1f}s")
+    print(f"✅ Saved percentile bands for {len(bands):,} markets to '{output_path}'")
+    return bands
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Layer 3 arbitrage engine (demo by default, full country with --housing/--jobs)",
+        epilog=f"A --housing CSV carrying its own stipend can be exported with:\n{HOUSING_EXPORT_SQL}",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+    )
+    parser.add_argument("--housing", help="zip_housing_costs seed from fetch_housing_data.py (.sql), or a CSV export "
+                                          "(zip, zori_rent/fmr_1br, optional gsa_monthly_stipend; see below)")
+    parser.add_argument("--jobs", nargs="+", help="One or more job feed CSVs (zip_code, profession, specialty, is_sub_vendor, gross_weekly_pay)")
+    parser.add_argument("--output", default=OUTPUT_CSV, help=f"Scored CSV path (default: {OUTPUT_CSV})")
+    parser.add_argument("--index-sql", default=INDEX_SQL_FILE, help=f"Top-K index seed path (default: {INDEX_SQL_FILE})")
+    parser.add_argument("--zip-mappings", default=DEFAULT_ZIPS_PATH,
+                        help=f"gsa_zip_mappings seed or CSV export for city/state when the housing export lacks them (default: {DEFAULT_ZIPS_PATH})")
+    parser.add_argument("--lookup-db", default=LOOKUP_DB_PATH,
+                        help=f"Local lookup DB the GSA stipend is joined from when the housing data has none (default: {LOOKUP_DB_PATH})")
+    parser.add_argument("--no-export", action="store_true", help="Rank only; skip writing the row-level CSV")
+    parser.add_argument("--sweep", action="store_true", help="Write margin/penalty/hours percentile bands per market instead of scoring")
+    parser.add_argument("--sweep-margins", default=SWEEP_MARGINS, help=f"start:stop:step or comma list (default: {SWEEP_MARGINS})")
+    parser.add_argument("--sweep-penalties", default=SWEEP_PENALTIES, help=f"start:stop:step or comma list (default: {SWEEP_PENALTIES})")
+    parser.add_argument("--sweep-hours", default=SWEEP_HOURS, help=f"start:stop:step or comma list (default: {SWEEP_HOURS})")
+    parser.add_argument("--sweep-output", default=SWEEP_CSV, help=f"Band CSV path (default: {SWEEP_CSV})")
+    parser.add_argument("--workers", type=int, default=1, help="Processes for very large sweeps (default: 1)")
+    parser.add_argument("--chunk-rows", type=int, default=JOB_CHUNK_ROWS, help=f"Job rows per pass (default: {JOB_CHUNK_ROWS:,})")
+    args = parser.parse_args(argv)
+    if bool(args.housing) != bool(args.jobs):
+        parser.error("--housing and --jobs must be given together")
+    if args.sweep and not args.housing:
+        parser.error("--sweep needs --housing and --jobs")
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.sweep:
+        grid = scenario_grid(parse_sweep_values(args.sweep_margins), parse_sweep_values(args.sweep_penalties), parse_sweep_values(args.sweep_hours))
+        run_margin_sweep(args.housing, args.jobs, grid, args.sweep_output, args.chunk_rows, args.workers, args.lookup_db)
+    elif args.housing:
+        run_production_engine(args.housing, args.jobs, None if args.no_export else args.output, args.chunk_rows, args.index_sql, args.zip_mappings, args.lookup_db)
+    else:
+        build_arbitrage_engine()
 
 if __name__ == "__main__":
-    build_arbitrage_engine()
+    main()
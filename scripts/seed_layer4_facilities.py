@@ -1,75 +1,520 @@
 import pandas as pd
 import numpy as np
-import urllib.request
+import argparse
+import hashlib
+import http.client
 import json
+import os
+import random
+import re
+import sqlite3
 import ssl
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlencode
+
 import certifi
 
-def fetch_all_hospitals():
-    base_url = "https://data.cms.gov/provider-data/api/1/datastore/query/xubh-q36u/0"
-    limit = 1000
-    offset = 0
-    all_results = []
-    
-    ctx = ssl.create_default_context(cafile=certifi.where())
-    
-    while True:
-        url = f"{base_url}?limit={limit}&offset={offset}"
-        req = urllib.request.Request(url, headers={"User-Agent": "PerDiem.fyi/1.0"})
-        response = urllib.request.urlopen(req, context=ctx)
-        
-        data = json.loads(response.read().decode("utf-8"))
-        results = data.get("results", [])
-        
-        if not results:
-            break
-            
-        all_results.extend(results)
-        print(f"Fetched {len(all_results)} records so far...")
-        
-        offset += limit
-        
-    return all_results
-
-def build_facility_matrix():
-    print("🚀 Layer 4 Seed: Processing CMS Federal Hospital Data via API...")
-    try:
-        results = fetch_all_hospitals()
-        df = pd.DataFrame(results)
-
-        # Map API keys to expected names
-        col_mapping = {
-            "facility_id": "facility_id",
-            "facility_name": "facility_name",
-            "citytown": "city",
-            "state": "state",
-            "zip_code": "zip_code",
-            "hospital_type": "facility_type",
-            "hospital_ownership": "ownership",
-        }
-        
-        needed = list(col_mapping.keys())
-        hospitals = df[needed].copy()
-        hospitals = hospitals.rename(columns=col_mapping)
-
-        # Clean ZIP codes
-        hospitals = hospitals.dropna(subset=["zip_code"])
-        hospitals["zip_code"] = (
-            hospitals["zip_code"]
-            .astype(str)
-            .str.replace(r"\.0$", "", regex=True)
-            .str.strip()
-            .apply(lambda x: x.zfill(5))
-        )
+from artifact_store import LAYER4_SCHEMA, coerce_types, read_artifact, write_artifact
+from facility_enrichment import ENRICHED_OUTPUT_PATH, enrich_facilities, intel_output, load_sources
+
+# CMS Hospital General Information datastore (override to point tests at a local stub)
+CMS_HOSPITALS_URL = os.environ.get(
+    "CMS_HOSPITALS_URL", "https://data.cms.gov/provider-data/api/1/datastore/query/xubh-q36u/0"
+)
+CMS_PAGE_LIMIT = 1000
+CMS_FETCH_WORKERS = 4
+CMS_MAX_RETRIES = 6
+CMS_TIMEOUT_SECS = 60
+CMS_NDJSON_PATH = "cms_hospitals.ndjson"
+CMS_CHECKPOINT_PATH = "cms_hospitals.checkpoint.json"
+
+LAYER4_OUTPUT_PATH = "layer4_facilities_FINAL.csv"
+# Fingerprints of the last build (CMS records, routing inputs, SYSTEM_MAP rules) for --incremental / --routing-only
+LAYER4_MANIFEST_PATH = "layer4_facilities_FINAL.manifest.sqlite"
+# Bump when routing logic outside SYSTEM_MAP changes (Mercy guard, EMR fallback, notes) to force a full re-route
+ROUTING_ENGINE_VERSION = 1
+CMS_COLUMN_MAP = {
+    "facility_id": "facility_id",
+    "facility_name": "facility_name",
+    "citytown": "city",
+    "state": "state",
+    "zip_code": "zip_code",
+    "hospital_type": "facility_type",
+    "hospital_ownership": "ownership",
+}
+BASE_COLUMNS = list(CMS_COLUMN_MAP.values()) + ["facility_name_normalized"]
+# Everything match_routing_rules / apply_routing_engine read from a row
+ROUTE_INPUT_COLUMNS = ["facility_name", "health_system", "facility_type"]
+
+# ══════════════════════════════════════════════════════════════
+# IDN ROUTING MAP — first matching key wins (dict order matters)
+# key -> (health_system, msp_gatekeeper, vms_software, msp_exclusive, ehr_system, radius_rule_miles)
+# ══════════════════════════════════════════════════════════════
+SYSTEM_MAP = {
+        # Kaiser
+        "KAISER": ("Kaiser Permanente", "AMN Healthcare", "SAP Fieldglass", True, "Epic", 50),
+        # CommonSpirit (many brand names)
+        "COMMONSPIRIT": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
+        "CATHOLIC HEALTH": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
+        "DIGNITY": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
+        "CHI ": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
+        # Tenet
+        "TENET": ("Tenet Healthcare", "Trusted Resource Associates", "Internal", True, "Cerner", None),
+        # Ascension
+        "ASCENSION": ("Ascension", "Ascension Travel Program", "Internal", True, "Epic", None),
+        # Advocate / Atrium
+        "ADVOCATE": ("Advocate Health", "AtriumWORKS", "Internal", True, "Epic", None),
+        "ATRIUM": ("Advocate Health", "AtriumWORKS", "Internal", True, "Epic", None),
+        # HCA Empire
+        "HCA": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
+        "HOSPITAL CORPORATION": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
+        "TRISTAR": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
+        "LIFEPOINT": ("LifePoint Health", "HealthTrust", "Unknown", True, "Mixed", 50),
+        "SCION": ("ScionHealth", "HealthTrust", "Unknown", True, "Mixed", 50),
+        "COMMUNITY HEALTH SYSTEM": ("CHS", "HealthTrust", "Unknown", True, "Cerner", 50),
+        # Aya Monopolies
+        "PROVIDENCE": ("Providence", "Aya Healthcare", "LotusOne", True, "Epic", 50),
+        "SUTTER": ("Sutter Health", "Aya Healthcare", "LotusOne", True, "Epic", None),
+        "LCMC": ("LCMC Health", "Aya Healthcare", "LotusOne", True, "Epic", None),
+        "ALLEGHENY": ("Allegheny Health Network", "Aya Healthcare", "LotusOne", True, "Epic", None),
+        # AMN Monopolies
+        "ADVENTHEALTH": ("AdventHealth", "AMN Healthcare", "ShiftWise", True, "Epic", None),
+        "TRINITY": ("Trinity Health", "FirstChoice (Internal) / AMN", "ShiftWise Flex", False, "Epic", None),
+        "GEISINGER": ("Geisinger", "AMN Healthcare", "ShiftWise", True, "Epic", None),
+        "ALLINA": ("Allina Health", "AMN Healthcare", "ShiftWise", True, "Epic", None),
+        "FAIRVIEW": ("M Health Fairview", "AMN Healthcare", "ShiftWise", True, "Epic", None),
+        # Neutrals / Hybrids / Mega-Regionals
+        "INTERMOUNTAIN": ("Intermountain", "Magnit", "Vendor Neutral", False, "Epic", None),
+        "BANNER": ("Banner Health", "Banner Staffing (Hybrid)", "Internal", False, "Cerner", 50),
+        "MERCY": ("Mercy", "Trusted Health / Flex Team", "App-Based", False, "Epic", None),
+        "BON SECOURS": ("Mercy", "Trusted Health / Flex Team", "App-Based", False, "Epic", None),
+        "CHRISTUS": ("Christus Health", "Unknown", "Unknown", False, "Epic", None),
+        "UPMC": ("UPMC", "UPMC Travel Staffing (Internal)", "Internal", True, "Epic", 75),
+        "OCHSNER": ("Ochsner Health", "Ochsner In-House Agency", "Internal", True, "Epic", None),
+        "MAYO": ("Mayo Clinic", "Mayo Clinic Travel Program", "Internal", True, "Epic", None),
+        "STANFORD": ("Stanford Health Care", "Unknown", "Unknown", False, "Epic", 75),
+        "BJC ": ("BJC HealthCare", "Unknown", "Unknown", False, "Epic", 100),
+}
+
+ROUTING_COLUMNS = ["health_system", "msp_gatekeeper", "vms_software", "msp_exclusive", "ehr_system", "radius_rule_miles"]
+
+
+def routing_notes(msp, vms):
+    """Builds the msp_notes string for a routed MSP/VMS pair (None if nothing to flag)."""
+    notes = []
+    if msp == "Aya Healthcare" and vms == "LotusOne":
+        notes.append("WARNING: Aya owns both the contract and the software (LotusOne). Outside agencies face a sub-vendor penalty unless the role is hard-to-fill (where penalties may be waived to speed up hiring).")
+    if msp == "AMN Healthcare" and "ShiftWise" in vms:
+        notes.append("WARNING: AMN owns both the contract and the software (ShiftWise). Outside agencies face a sub-vendor penalty unless the role is hard-to-fill (where penalties may be waived to speed up hiring).")
+    if msp == "Magnit":
+        notes.append("NEUTRAL: Vendor-neutral MSP. Safe to use boutique agencies.")
+    if "Internal" in str(msp):
+        notes.append("INTERNAL: Facility prioritizes direct W-2 travelers. Agencies are back-up only, often used for hard-to-fill roles.")
+    return " | ".join(notes) if notes else None
+
+
+def compile_routing_engine(system_map=SYSTEM_MAP):
+    """
+    Compiles the system map into a single alternation regex plus a per-rule lookup table.
+
+    The alternation is wrapped in a lookahead so every start position is tested in one
+    scan; at each position the regex prefers the earliest rule, and taking the minimum
+    rule index per row reproduces the dict-order "first key wins" semantics.
+    """
+    keys = list(system_map.keys())
+    pattern = re.compile("(?=(" + "|".join(re.escape(k) for k in keys) + "))")
+    rule_index = {k: i for i, k in enumerate(keys)}
+
+    table = pd.DataFrame([system_map[k] for k in keys], columns=ROUTING_COLUMNS)
+    table["msp_notes"] = [routing_notes(msp, vms) for msp, vms in zip(table["msp_gatekeeper"], table["vms_software"])]
+    return pattern, rule_index, table
+
+
+def routing_text(hospitals):
+    """Upper-cased facility names and the "name ||| parent system" text the rules are matched against."""
+    # CRITICAL: Scan BOTH the facility name AND the AHRQ parent system
+    fac_name = hospitals["facility_name"].fillna("").astype(str).str.upper().reset_index(drop=True)
+    sys_name = hospitals["health_system"].fillna("").astype(str).str.upper().reset_index(drop=True)
+    return fac_name, fac_name + " ||| " + sys_name
+
+
+def match_routing_rules(hospitals, engine):
+    """Returns the matched rule index per row (-1 = unmatched or guarded)."""
+    pattern, rule_index, _ = engine
+    fac_name, name_check = routing_text(hospitals)
+
+    rule_idx = np.full(len(hospitals), -1, dtype=np.int64)
+    found = name_check.str.extractall(pattern)
+    if not found.empty:
+        best = found[0].map(rule_index).groupby(level=0).min()
+        rule_idx[best.index.to_numpy()] = best.to_numpy()
+
+    # Guard: don't misroute "Mercy Children's" or "Providence Mercy"
+    guarded = (
+        fac_name.str.contains("MERCY", regex=False)
+        & (fac_name.str.contains("PROVIDENCE", regex=False) | fac_name.str.contains("CHILDREN", regex=False))
+    ).to_numpy()
+    rule_idx[guarded] = -1
+    return rule_idx, guarded
+
+
+def apply_routing_engine(hospitals, system_map=SYSTEM_MAP, engine=None):
+    """Vectorized IDN routing: one regex pass over the names, then column-wise assignment."""
+    engine = engine or compile_routing_engine(system_map)
+    table = engine[2]
+    hospitals = hospitals.copy()
+
+    rule_idx, guarded = match_routing_rules(hospitals, engine)
+    matched = rule_idx >= 0
+    picks = rule_idx[matched]
+
+    for col in ROUTING_COLUMNS:
+        values = hospitals[col].astype(object).to_numpy(copy=True)
+        values[matched] = table[col].to_numpy(dtype=object)[picks]
+        hospitals[col] = values
 
-        # Generate normalized name for fuzzy matching
-        hospitals["facility_name_normalized"] = (
-            hospitals["facility_name"]
-            .str.lower()
-            .str.strip()
-            .str.replace(r"[^a-z0-9\s]", "", regex=True)
-            .str.replace(r"\s+", " ", regex=True)
+    notes = hospitals["msp_notes"].astype(object).to_numpy(copy=True)
+    rule_notes = table["msp_notes"].to_numpy(dtype=object)[picks]
+    has_notes = pd.notna(rule_notes)
+    notes[np.flatnonzero(matched)[has_notes]] = rule_notes[has_notes]
+    hospitals["msp_notes"] = notes
+
+    # EMR Fallbacks for unmapped hospitals (guarded rows are left untouched)
+    critical_access = (
+        hospitals["ehr_system"].isna().to_numpy()
+        & (hospitals["facility_type"] == "Critical Access Hospitals").to_numpy()
+        & ~guarded
+    )
+    hospitals.loc[critical_access, "ehr_system"] = "Meditech / Cerner CommunityWorks"
+
+    hospitals["radius_rule_miles"] = pd.to_numeric(hospitals["radius_rule_miles"], errors="coerce")
+    return hospitals
+
+
+# ══════════════════════════════════════════════════════════════
+# INCREMENTAL REBUILD — fingerprints of the last build live in a SQLite sidecar
+# ══════════════════════════════════════════════════════════════
+
+def row_fingerprints(df, columns):
+    """Per-row 64-bit content hash of `columns`, as int64 so SQLite can store it."""
+    hashed = pd.util.hash_pandas_object(df[columns].astype("string"), index=False)
+    return hashed.to_numpy().view(np.int64)
+
+
+def rule_fingerprints(system_map=SYSTEM_MAP):
+    """key -> (position, hash of the rule tuple plus the msp_notes it produces)."""
+    fingerprints = {}
+    for position, (key, rule) in enumerate(system_map.items()):
+        payload = json.dumps([key, list(rule), routing_notes(rule[1], rule[2])], default=str)
+        fingerprints[key] = (position, hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest())
+    return fingerprints
+
+
+def changed_rule_keys(previous, current):
+    """
+    Keys that were added, removed or edited, plus surviving keys whose order relative to
+    each other moved. A row can only route differently if its text contains one of them.
+    """
+    changed = set(previous) ^ set(current)
+    changed |= {k for k in set(previous) & set(current) if previous[k][1] != current[k][1]}
+    prev_order = sorted((k for k in previous if k in current), key=lambda k: previous[k][0])
+    cur_order = sorted((k for k in current if k in previous), key=lambda k: current[k][0])
+    changed |= {a for a, b in zip(prev_order, cur_order) if a != b}
+    return changed
+
+
+def rows_touching_rules(hospitals, keys):
+    """Rows whose routing text contains any of `keys` (the rows an edit to those rules can move)."""
+    if not keys:
+        return np.zeros(len(hospitals), dtype=bool)
+    _, name_check = routing_text(hospitals)
+    pattern = re.compile("|".join(re.escape(k) for k in sorted(keys)))
+    return name_check.str.contains(pattern).to_numpy()
+
+
+def open_build_manifest(path):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS facility_fingerprints ("
+        "facility_id TEXT PRIMARY KEY, record_hash INTEGER NOT NULL, route_input_hash INTEGER NOT NULL)"
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS routing_rules ("
+        "rule_key TEXT PRIMARY KEY, position INTEGER NOT NULL, rule_hash TEXT NOT NULL)"
+    )
+    conn.execute("CREATE TABLE IF NOT EXISTS build_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    return conn
+
+
+def load_build_manifest(conn):
+    """Returns (meta dict, rule fingerprints, facility fingerprints indexed by facility_id)."""
+    meta = dict(conn.execute("SELECT key, value FROM build_meta"))
+    rules = {k: (pos, h) for k, pos, h in conn.execute("SELECT rule_key, position, rule_hash FROM routing_rules")}
+    facilities = pd.read_sql_query(
+        "SELECT facility_id, record_hash, route_input_hash FROM facility_fingerprints", conn
+    ).set_index("facility_id")
+    return meta, rules, facilities
+
+
+def record_build_manifest(conn, facility_ids, record_hashes, route_hashes, rules, matrix_columns):
+    """Replaces the manifest with this build's fingerprints (called only after the CSV is written)."""
+    with conn:
+        conn.execute("DELETE FROM facility_fingerprints")
+        conn.executemany(
+            "INSERT OR REPLACE INTO facility_fingerprints VALUES (?, ?, ?)",
+            zip(facility_ids, record_hashes.tolist(), route_hashes.tolist()),
         )
+        conn.execute("DELETE FROM routing_rules")
+        conn.executemany("INSERT INTO routing_rules VALUES (?, ?, ?)", ((k, p, h) for k, (p, h) in rules.items()))
+        conn.executemany(
+            "INSERT OR REPLACE INTO build_meta VALUES (?, ?)",
+            [("engine_version", str(ROUTING_ENGINE_VERSION)), ("matrix_columns", json.dumps(matrix_columns))],
+        )
+
+
+def plan_rebuild(hospitals, record_hashes, route_hashes, previous, manifest, rules, matrix_columns):
+    """
+    Rows to (re-)route: new facilities, changed CMS records, changed routing inputs
+    (e.g. an AHRQ parent change) and rows containing an edited SYSTEM_MAP key.
+    Returns (mask, index of each row in `previous`); mask is all-True when the
+    previous build can't be reused.
+    """
+    every_row = np.ones(len(hospitals), dtype=bool)
+    meta, known_rules, known = manifest
+    if previous is None:
+        print("   ↻ No previous build to merge into. Routing every facility.")
+        return every_row, None
+    if meta.get("engine_version") != str(ROUTING_ENGINE_VERSION) or meta.get("matrix_columns") != json.dumps(matrix_columns):
+        print("   ↻ Routing engine or matrix layout changed since the last build. Routing every facility.")
+        return every_row, None
+    if previous.columns.tolist() != matrix_columns:
+        print("   ↻ Previous output has a different column layout. Routing every facility.")
+        return every_row, None
+
+    ids = pd.Index(hospitals["facility_id"].astype(str))
+    previous_ids = pd.Index(previous["facility_id"])
+    prev_pos = previous_ids.get_indexer(ids) if previous_ids.is_unique else np.full(len(ids), -1)
+    known_pos = known.index.get_indexer(ids) if known.index.is_unique else np.full(len(ids), -1)
+
+    new = (prev_pos < 0) | (known_pos < 0)
+    safe_pos = np.where(new, 0, known_pos)
+    record_changed = ~new & (known["record_hash"].to_numpy()[safe_pos] != record_hashes) if len(known) else ~new
+    input_changed = ~new & (known["route_input_hash"].to_numpy()[safe_pos] != route_hashes) if len(known) else ~new
+    rule_keys = changed_rule_keys(known_rules, rules)
+    touched = rows_touching_rules(hospitals, rule_keys)
+
+    dirty = new | record_changed | input_changed | touched
+    print(f"   ↻ Incremental: {new.sum()} new, {record_changed.sum()} changed CMS records, "
+          f"{input_changed.sum()} changed routing inputs, {touched.sum()} rows under {len(rule_keys)} edited rule(s) "
+          f"-> re-routing {dirty.sum()} / {len(hospitals)}")
+    return dirty, prev_pos
+
+
+def merge_matrix(routed, dirty, previous, prev_pos, matrix_columns):
+    """
+    Re-routed rows (cast to the artifact schema, so they serialize exactly like a full build)
+    merged with untouched rows copied from the previous output, in current row order.
+    """
+    fresh = coerce_types(routed[matrix_columns].reset_index(drop=True), LAYER4_SCHEMA)
+    if prev_pos is None:
+        return fresh
+    kept = previous[matrix_columns].iloc[prev_pos[~dirty]]
+    order = np.concatenate([np.flatnonzero(dirty), np.flatnonzero(~dirty)])
+    merged = pd.concat([fresh, kept], ignore_index=True)
+    return merged.iloc[np.argsort(order, kind="stable")].reset_index(drop=True)
+
+
+_conn_local = threading.local()
+_ssl_ctx = None
+
+
+def _cms_connection(parts):
+    """One keep-alive connection per worker thread, reused across pages."""
+    global _ssl_ctx
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None and _conn_local.netloc == parts.netloc:
+        return conn
+    if parts.scheme == "https":
+        if _ssl_ctx is None:
+            _ssl_ctx = ssl.create_default_context(cafile=certifi.where())
+        conn = http.client.HTTPSConnection(parts.netloc, timeout=CMS_TIMEOUT_SECS, context=_ssl_ctx)
+    else:
+        conn = http.client.HTTPConnection(parts.netloc, timeout=CMS_TIMEOUT_SECS)
+    _conn_local.conn, _conn_local.netloc = conn, parts.netloc
+    return conn
+
+
+def _reset_cms_connection():
+    conn = getattr(_conn_local, "conn", None)
+    if conn is not None:
+        conn.close()
+    _conn_local.conn = None
+
+
+def fetch_cms_page(base_url, limit, offset):
+    """Fetches one datastore page with retry/backoff on 429, 5xx and dropped connections."""
+    parts = urlsplit(base_url)
+    path = f"{parts.path}?{urlencode({'limit': limit, 'offset': offset})}"
+    headers = {"User-Agent": "PerDiem.fyi/1.0", "Connection": "keep-alive"}
+
+    for attempt in range(1, CMS_MAX_RETRIES + 1):
+        try:
+            conn = _cms_connection(parts)
+            conn.request("GET", path, headers=headers)
+            resp = conn.getresponse()
+            body = resp.read()
+            if resp.status == 200:
+                return json.loads(body.decode("utf-8")).get("results", [])
+            if resp.status not in (429, 500, 502, 503, 504):
+                raise RuntimeError(f"CMS API returned HTTP {resp.status} at offset {offset}: {body[:300]!r}")
+            reason = f"HTTP {resp.status}"
+        except (http.client.HTTPException, OSError) as e:
+            _reset_cms_connection()
+            reason = repr(e)
+
+        if attempt == CMS_MAX_RETRIES:
+            raise RuntimeError(f"CMS page at offset {offset} failed after {attempt} attempts ({reason})")
+        backoff = min(30.0, (2 ** (attempt - 1)) + random.random())
+        print(f"⚠️ CMS offset {offset}: {reason}. Retrying in {backoff:.1f}s...")
+        time.sleep(backoff)
+
+
+def _load_checkpoint(checkpoint_path, limit):
+    if not os.path.exists(checkpoint_path):
+        return None
+    with open(checkpoint_path, "r", encoding="utf-8") as f:
+        state = json.load(f)
+    return state if state.get("limit") == limit else None
+
+
+def _save_checkpoint(checkpoint_path, next_offset, limit, nbytes):
+    tmp = f"{checkpoint_path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"next_offset": next_offset, "limit": limit, "bytes": nbytes}, f)
+    os.replace(tmp, checkpoint_path)
+
+
+def iter_ndjson(path):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def fetch_all_hospitals(
+    base_url=CMS_HOSPITALS_URL,
+    limit=CMS_PAGE_LIMIT,
+    workers=CMS_FETCH_WORKERS,
+    ndjson_path=CMS_NDJSON_PATH,
+    checkpoint_path=CMS_CHECKPOINT_PATH,
+    resume=True,
+):
+    """
+    Streams every CMS hospital record as a generator.
+
+    Up to `workers` pages are in flight at once; pages are committed to `ndjson_path`
+    strictly in offset order and the checkpoint is advanced after each one, so a
+    crashed run resumes from the last committed page instead of offset 0.
+    """
+    state = _load_checkpoint(checkpoint_path, limit) if resume else None
+    if state and os.path.exists(ndjson_path):
+        offset = state["next_offset"]
+        # Drop any partially written page past the last checkpoint
+        with open(ndjson_path, "r+b") as f:
+            f.truncate(state["bytes"])
+        print(f"♻️ Resuming CMS fetch at offset {offset} from {ndjson_path}...")
+        yield from iter_ndjson(ndjson_path)
+    else:
+        offset = 0
+        open(ndjson_path, "wb").close()
+
+    fetched = offset
+    with open(ndjson_path, "ab") as out, ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = {}
+        next_offset = offset
+        while True:
+            while len(pending) < workers:
+                pending[next_offset] = pool.submit(fetch_cms_page, base_url, limit, next_offset)
+                next_offset += limit
+
+            results = pending.pop(offset).result()
+            if not results:
+                break
+
+            out.write("".join(json.dumps(r) + "\n" for r in results).encode("utf-8"))
+            out.flush()
+            _save_checkpoint(checkpoint_path, offset + limit, limit, out.tell())
+
+            fetched += len(results)
+            print(f"Fetched {fetched} records so far...")
+            yield from results
+            offset += limit
+
+        for fut in pending.values():
+            fut.cancel()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+
+def normalize_facility_names(names):
+    """Lowercase, strip punctuation and collapse whitespace (facility_name_normalized; also used by the name resolver)."""
+    return (
+        names
+        .str.lower()
+        .str.strip()
+        .str.replace(r"[^a-z0-9\s]", "", regex=True)
+        .str.replace(r"\s+", " ", regex=True)
+    )
+
+def load_cms_hospitals():
+    """Fetches CMS and shapes the base matrix columns. Also returns each raw record's fingerprint."""
+    needed = list(CMS_COLUMN_MAP.keys())
+    hospitals = pd.DataFrame.from_records(
+        ({k: r.get(k) for k in needed} for r in fetch_all_hospitals()),
+        columns=needed,
+    )
+    hospitals = hospitals.rename(columns=CMS_COLUMN_MAP)
+
+    # Clean ZIP codes
+    hospitals = hospitals.dropna(subset=["zip_code"]).reset_index(drop=True)
+    record_hashes = row_fingerprints(hospitals, list(CMS_COLUMN_MAP.values()))
+    hospitals["zip_code"] = (
+        hospitals["zip_code"]
+        .astype(str)
+        .str.replace(r"\.0$", "", regex=True)
+        .str.strip()
+        .apply(lambda x: x.zfill(5))
+    )
+
+    # Generate normalized name for fuzzy matching
+    hospitals["facility_name_normalized"] = normalize_facility_names(hospitals["facility_name"])
+    return hospitals, record_hashes
+
+def build_facility_matrix(incremental=False, routing_only=False, output_file=LAYER4_OUTPUT_PATH, manifest_path=LAYER4_MANIFEST_PATH):
+    """
+    Full build by default. `incremental` still fetches CMS but only re-routes new/changed
+    facilities and rows under edited SYSTEM_MAP keys, merging them into the previous output.
+    `routing_only` skips CMS entirely and re-routes the previous output's facilities.
+    """
+    start = time.time()
+    try:
+        manifest_conn = open_build_manifest(manifest_path)
+        manifest = load_build_manifest(manifest_conn)
+        previous = read_artifact(output_file, schema=LAYER4_SCHEMA) if (incremental or routing_only) and os.path.exists(output_file) else None
+
+        if routing_only:
+            if previous is None:
+                raise FileNotFoundError(f"--routing-only needs a previous build at {output_file}")
+            print(f"🚀 Layer 4 Seed: Re-routing {len(previous)} facilities from {output_file} (no CMS fetch)...")
+            hospitals = previous[BASE_COLUMNS].copy()
+            known = manifest[2]["record_hash"]
+            # CMS records weren't refetched: keep the fingerprints we have (0 = unknown, re-checked next fetch)
+            record_hashes = known.reindex(hospitals["facility_id"]).fillna(0).to_numpy(dtype=np.int64) if known.index.is_unique else np.zeros(len(hospitals), dtype=np.int64)
+        else:
+            print("🚀 Layer 4 Seed: Processing CMS Federal Hospital Data via API...")
+            hospitals, record_hashes = load_cms_hospitals()
 
         # ══════════════════════════════════════════════════════════════
         # STEP 1: Initialize all intelligence columns FIRST
@@ -83,175 +528,80 @@ def build_facility_matrix():
         hospitals["msp_notes"] = None
 
         # ══════════════════════════════════════════════════════════════
-        # STEP 2: AHRQ Federal Merge — Run BEFORE the IDN routing loop
-        # This populates health_system from the federal parent mapping
-        # so that the IDN router can scan it in Step 3.
+        # STEP 2: Enrichment join (AHRQ + future sources) — Run BEFORE the IDN routing loop
+        # One indexed pass on the integer CCN populates health_system from the federal
+        # parent mapping (so the IDN router can scan it in Step 3) and carries the
+        # beds/discharges/revenue columns for the enriched intel output. It is cheap
+        # enough to re-run for every row even in incremental mode.
         # ══════════════════════════════════════════════════════════════
-        import os
-        ahrq_path = "ahrq_hospital_linkage.csv"
-        
-        if os.path.exists(ahrq_path):
-            print("\n🔗 AHRQ Linkage found. Merging Federal Parent Systems map...")
-            try:
-                ahrq_df = pd.read_csv(ahrq_path, dtype=str, encoding='utf-8')
-            except UnicodeDecodeError:
-                ahrq_df = pd.read_csv(ahrq_path, dtype=str, encoding='latin-1')
-            print(f"   AHRQ columns: {ahrq_df.columns.tolist()}")
-            
-            # The actual AHRQ Hospital Linkage file uses 'ccn' and 'health_sys_name'
-            ccn_col = "ccn" if "ccn" in ahrq_df.columns else "ID_MCR"
-            sys_col = "health_sys_name" if "health_sys_name" in ahrq_df.columns else "SYS_NAME"
-            
-            if ccn_col in ahrq_df.columns:
-                # Force consistent string formatting with leading zeros
-                hospitals["facility_id"] = hospitals["facility_id"].astype(str).str.strip()
-                ahrq_df[ccn_col] = ahrq_df[ccn_col].astype(str).str.strip()
-                
-                # Keep only non-null system names
-                ahrq_subset = ahrq_df[[ccn_col, sys_col]].dropna(subset=[sys_col])
-                
-                hospitals = pd.merge(
-                    hospitals,
-                    ahrq_subset,
-                    left_on="facility_id",
-                    right_on=ccn_col,
-                    how="left"
-                )
-                hospitals["health_system"] = hospitals[sys_col]
-                
-                # Clean up merge columns
-                drop_cols = [c for c in [ccn_col, sys_col] if c in hospitals.columns and c not in ["health_system"]]
-                hospitals = hospitals.drop(columns=drop_cols, errors='ignore')
-                
-                ahrq_mapped = hospitals["health_system"].notna().sum()
-                print(f"   ✅ AHRQ merge tagged {ahrq_mapped} / {len(hospitals)} hospitals with parent system names.")
-            else:
-                print(f"   ⚠️ AHRQ file found but missing expected columns.")
-                print(f"   Available columns: {ahrq_df.columns.tolist()}")
+        matrix_columns = hospitals.columns.tolist() + ["data_source", "confidence"]
+        sources = load_sources()
+        hospitals = enrich_facilities(hospitals, sources)
+
+        if "ahrq" in sources:
+            print("\n🔗 AHRQ Linkage found. Joined Federal Parent Systems map on integer CCN...")
+            hospitals["health_system"] = hospitals["health_sys_name"].astype(object).where(hospitals["health_sys_name"].notna(), np.nan)
+            ahrq_mapped = hospitals["health_system"].notna().sum()
+            print(f"   ✅ AHRQ merge tagged {ahrq_mapped} / {len(hospitals)} hospitals with parent system names.")
         else:
-            print(f"\n⚠️ AHRQ Linkage file not found at '{ahrq_path}'. Proceeding with name-only matching.")
+            print("\n⚠️ AHRQ Linkage unavailable. Proceeding with name-only matching.")
 
         # ══════════════════════════════════════════════════════════════
         # STEP 3: The IDN Routing Engine — Scans BOTH facility_name
         # AND the AHRQ-populated health_system column
         # ══════════════════════════════════════════════════════════════
-        system_map = {
-            # Kaiser
-            "KAISER": ("Kaiser Permanente", "AMN Healthcare", "SAP Fieldglass", True, "Epic", 50),
-            # CommonSpirit (many brand names)
-            "COMMONSPIRIT": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
-            "CATHOLIC HEALTH": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
-            "DIGNITY": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
-            "CHI ": ("CommonSpirit", "Internal Travel Program", "Internal", True, "Epic", 50),
-            # Tenet
-            "TENET": ("Tenet Healthcare", "Trusted Resource Associates", "Internal", True, "Cerner", None),
-            # Ascension
-            "ASCENSION": ("Ascension", "Ascension Travel Program", "Internal", True, "Epic", None),
-            # Advocate / Atrium
-            "ADVOCATE": ("Advocate Health", "AtriumWORKS", "Internal", True, "Epic", None),
-            "ATRIUM": ("Advocate Health", "AtriumWORKS", "Internal", True, "Epic", None),
-            # HCA Empire
-            "HCA": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
-            "HOSPITAL CORPORATION": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
-            "TRISTAR": ("HCA Healthcare", "HealthTrust", "Internal", True, "Epic", 50),
-            "LIFEPOINT": ("LifePoint Health", "HealthTrust", "Unknown", True, "Mixed", 50),
-            "SCION": ("ScionHealth", "HealthTrust", "Unknown", True, "Mixed", 50),
-            "COMMUNITY HEALTH SYSTEM": ("CHS", "HealthTrust", "Unknown", True, "Cerner", 50),
-            # Aya Monopolies
-            "PROVIDENCE": ("Providence", "Aya Healthcare", "LotusOne", True, "Epic", 50),
-            "SUTTER": ("Sutter Health", "Aya Healthcare", "LotusOne", True, "Epic", None),
-            "LCMC": ("LCMC Health", "Aya Healthcare", "LotusOne", True, "Epic", None),
-            "ALLEGHENY": ("Allegheny Health Network", "Aya Healthcare", "LotusOne", True, "Epic", None),
-            # AMN Monopolies
-            "ADVENTHEALTH": ("AdventHealth", "AMN Healthcare", "ShiftWise", True, "Epic", None),
-            "TRINITY": ("Trinity Health", "FirstChoice (Internal) / AMN", "ShiftWise Flex", False, "Epic", None),
-            "GEISINGER": ("Geisinger", "AMN Healthcare", "ShiftWise", True, "Epic", None),
-            "ALLINA": ("Allina Health", "AMN Healthcare", "ShiftWise", True, "Epic", None),
-            "FAIRVIEW": ("M Health Fairview", "AMN Healthcare", "ShiftWise", True, "Epic", None),
-            # Neutrals / Hybrids / Mega-Regionals
-            "INTERMOUNTAIN": ("Intermountain", "Magnit", "Vendor Neutral", False, "Epic", None),
-            "BANNER": ("Banner Health", "Banner Staffing (Hybrid)", "Internal", False, "Cerner", 50),
-            "MERCY": ("Mercy", "Trusted Health / Flex Team", "App-Based", False, "Epic", None),
-            "BON SECOURS": ("Mercy", "Trusted Health / Flex Team", "App-Based", False, "Epic", None),
-            "CHRISTUS": ("Christus Health", "Unknown", "Unknown", False, "Epic", None),
-            "UPMC": ("UPMC", "UPMC Travel Staffing (Internal)", "Internal", True, "Epic", 75),
-            "OCHSNER": ("Ochsner Health", "Ochsner In-House Agency", "Internal", True, "Epic", None),
-            "MAYO": ("Mayo Clinic", "Mayo Clinic Travel Program", "Internal", True, "Epic", None),
-            "STANFORD": ("Stanford Health Care", "Unknown", "Unknown", False, "Epic", 75),
-            "BJC ": ("BJC HealthCare", "Unknown", "Unknown", False, "Epic", 100),
-        }
-
         print("\n💉 Injecting Master Maps (MSP/VMS conflicts/EMR)...")
-        
-        def apply_intelligence(row):
-            # CRITICAL: Scan BOTH the facility name AND the AHRQ parent system
-            fac_name = str(row.get("facility_name", "")).upper()
-            sys_name = str(row.get("health_system", "")).upper()
-            name_check = f"{fac_name} ||| {sys_name}"
-            
-            # Guard: don't misroute "Mercy Children's" or "Providence Mercy"
-            if "MERCY" in fac_name and any(x in fac_name for x in ["PROVIDENCE", "CHILDREN"]):
-                return row 
-            
-            for key, (sys, msp, vms, excl, ehr, radius) in system_map.items():
-                if key in name_check:
-                    # Only overwrite health_system if we have a more specific name
-                    row["health_system"] = sys
-                    row["msp_gatekeeper"] = msp
-                    row["vms_software"] = vms
-                    row["msp_exclusive"] = excl
-                    row["ehr_system"] = ehr
-                    row["radius_rule_miles"] = radius
-                    
-                    notes = []
-                    if msp == "Aya Healthcare" and vms == "LotusOne":
-                        notes.append("WARNING: Aya owns both the contract and the software (LotusOne). Outside agencies face a sub-vendor penalty unless the role is hard-to-fill (where penalties may be waived to speed up hiring).")
-                    if msp == "AMN Healthcare" and "ShiftWise" in vms:
-                        notes.append("WARNING: AMN owns both the contract and the software (ShiftWise). Outside agencies face a sub-vendor penalty unless the role is hard-to-fill (where penalties may be waived to speed up hiring).")
-                    if msp == "Magnit":
-                        notes.append("NEUTRAL: Vendor-neutral MSP. Safe to use boutique agencies.")
-                    if "Internal" in str(msp):
-                        notes.append("INTERNAL: Facility prioritizes direct W-2 travelers. Agencies are back-up only, often used for hard-to-fill roles.")
-                        
-                    if notes:
-                        row["msp_notes"] = " | ".join(notes)
-                    break 
-            
-            # EMR Fallbacks for unmapped hospitals
-            if pd.isna(row.get("ehr_system")) or row.get("ehr_system") is None:
-                if row.get("facility_type") == "Critical Access Hospitals":
-                    row["ehr_system"] = "Meditech / Cerner CommunityWorks"
-                    
-            return row
-
-        hospitals = hospitals.apply(apply_intelligence, axis=1)
+        rules = rule_fingerprints(SYSTEM_MAP)
+        route_hashes = row_fingerprints(hospitals, ROUTE_INPUT_COLUMNS)
+        if incremental or routing_only:
+            dirty, prev_pos = plan_rebuild(hospitals, record_hashes, route_hashes, previous, manifest, rules, matrix_columns)
+        else:
+            dirty, prev_pos = np.ones(len(hospitals), dtype=bool), None
+        routed = apply_routing_engine(hospitals[dirty])
 
         # ══════════════════════════════════════════════════════════════
         # STEP 4: Export
         # ══════════════════════════════════════════════════════════════
-        hospitals["data_source"] = "cms_gov"
-        hospitals["confidence"] = "high"
-
-        output_file = "layer4_facilities_FINAL.csv"
-        hospitals.to_csv(output_file, index=False)
-
-        print(f"\n✅ SUCCESS: Formatted and enriched {len(hospitals)} US hospitals into {output_file}")
-        
-        mapped_count = hospitals['health_system'].notna().sum()
-        mapped_msp = hospitals['msp_gatekeeper'].notna().sum()
-        mapped_emr = hospitals['ehr_system'].notna().sum()
-        print(f"📊 Health System tagged: {mapped_count} / {len(hospitals)} ({mapped_count/len(hospitals)*100:.1f}%)")
-        print(f"📊 MSP Gatekeeper tagged: {mapped_msp} / {len(hospitals)} ({mapped_msp/len(hospitals)*100:.1f}%)")
-        print(f"📊 EMR tagged: {mapped_emr} / {len(hospitals)} ({mapped_emr/len(hospitals)*100:.1f}%)")
+        routed["data_source"] = "cms_gov"
+        routed["confidence"] = "high"
+        matrix = merge_matrix(routed, dirty, previous, prev_pos, matrix_columns)
+        write_artifact(matrix, output_file, LAYER4_SCHEMA)
+
+        print(f"\n✅ SUCCESS: Formatted and enriched {len(matrix)} US hospitals into {output_file} ({time.time() - start:.1f}s)")
+
+        for col in matrix_columns:
+            hospitals[col] = matrix[col].array
+        intel = intel_output(hospitals, matrix_columns)
+        write_artifact(intel, ENRICHED_OUTPUT_PATH)
+        print(f"✅ Enriched intel for {len(intel)} AHRQ-linked hospitals written to {ENRICHED_OUTPUT_PATH}")
+
+        record_build_manifest(manifest_conn, matrix["facility_id"].tolist(), record_hashes, route_hashes, rules, matrix_columns)
+        manifest_conn.close()
+
+        mapped_count = matrix['health_system'].notna().sum()
+        mapped_msp = matrix['msp_gatekeeper'].notna().sum()
+        mapped_emr = matrix['ehr_system'].notna().sum()
+        print(f"📊 Health System tagged: {mapped_count} / {len(matrix)} ({mapped_count/len(matrix)*100:.1f}%)")
+        print(f"📊 MSP Gatekeeper tagged: {mapped_msp} / {len(matrix)} ({mapped_msp/len(matrix)*100:.1f}%)")
+        print(f"📊 EMR tagged: {mapped_emr} / {len(matrix)} ({mapped_emr/len(matrix)*100:.1f}%)")
         print("\nBreakdown by EMR:")
-        print(hospitals['ehr_system'].value_counts().to_string())
+        print(matrix['ehr_system'].value_counts().to_string())
         print("\nBreakdown by Gatekeeper:")
-        print(hospitals['msp_gatekeeper'].value_counts().head(15).to_string())
+        print(matrix['msp_gatekeeper'].value_counts().head(15).to_string())
         print("\nBreakdown by Health System (Top 20):")
-        print(hospitals['health_system'].value_counts().head(20).to_string())
+        print(matrix['health_system'].value_counts().head(20).to_string())
 
     except Exception as e:
         print(f"❌ Error: {e}")
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Layer 4 facility matrix (CMS x AHRQ x IDN routing).")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Fetch CMS but only re-route new/changed facilities and rows under edited SYSTEM_MAP rules")
+    parser.add_argument("--routing-only", action="store_true",
+                        help="Skip the CMS fetch; re-route the previous output after SYSTEM_MAP edits")
+    return parser.parse_args(argv)
+
 if __name__ == "__main__":
-    build_facility_matrix()
+    args = parse_args()
+    build_facility_matrix(incremental=args.incremental, routing_only=args.routing_only)
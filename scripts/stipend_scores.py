@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+"""
+Stipend Scores — src/lib/financials.ts for every ZIP x specialty x hours x gross at once
+
+The lookup-stipend route prices one ZIP per request. Everything after the lookups is
+arithmetic (deriveFinancials: 20% flat tax estimate, tier floors from getTierInfo, 13-week
+contract), so this engine broadcasts it with numpy over the whole grid:
+  ZIPs (from the local lookup DB)  x  specialties  x  weekly hours  x  weekly gross
+and writes one flat row per combination to STIPEND_SCORES_PATH (plus its typed sidecar).
+
+Inputs follow the route: GSA lodging for the month (seasonal column, then max_lodging),
+meals, HUD FMR 1BR with the national 1800 fallback, ZORI when present. ZIPs the route would
+404 on (no mapping or no rates for the fiscal year) are left out.
+
+--contract-start-month prices a 13-week contract starting on the 1st of that month instead:
+lodging_daily becomes the day-weighted blend of every month the contract spans, read from the
+lookup DB's precomputed gsa_seasonal lodging_13wk totals (one matrix load for all ZIPs). The
+route has no such mode, so these rows are not covered by the golden fixture.
+
+Rounding mirrors JavaScript exactly (Math.round ties toward +inf, toFixed half-up on the
+binary value), so results are bit-identical to the TypeScript. The golden fixture written by
+src/lib/__tests__/financials.golden.test.ts proves it:
+  python stipend_scores.py --check-golden ../src/lib/__tests__/financials.golden.json
+
+Usage:
+  python stipend_scores.py
+  python stipend_scores.py --specialties RN,PTA,CST --hours 36,48 --gross 1800,2400 --month 7
+  python stipend_scores.py --contract-start-month 11
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from datetime import date
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from artifact_store import write_artifact
+from local_lookup import (CONTRACT_DAYS, LOOKUP_DB_PATH, MONTHS, PICKED_MAPPINGS_SQL, SEASONAL_COLUMNS, LocalLookup,
+                          gsa_fiscal_year, to_fixed)
+
+STIPEND_SCORES_PATH = "stipend_scores.csv"
+TAX_RATE_ESTIMATE = 0.2
+CONTRACT_WEEKS = 13
+NATIONAL_FMR_1BR = 1800  # route fallback when HUD has no 1BR figure for the ZIP
+
+DEFAULT_SPECIALTIES = ["RN", "LPN", "PT", "PTA", "OT", "RRT", "CST", "Rad Tech"]
+DEFAULT_HOURS = [36, 40, 48]
+DEFAULT_GROSS = [2000]  # the route's default gross_weekly
+
+TIER_A_ROLES = [
+    "RN", "PT", "DPT", "OT", "SLP", "MLS", "CRNA", "NP", "APRN",
+    "PHARMD", "LCSW", "RD", "DIETITIAN", "AUD", "BSN",
+]
+
+# deriveFinancials() result path -> flat output column (pass-through inputs are omitted)
+GOLDEN_FIELDS = {
+    ("gsa", "weekly_max"): "gsa_weekly_max",
+    ("gsa", "monthly_max"): "gsa_monthly_max",
+    ("breakdown", "stipend_weekly"): "stipend_weekly",
+    ("breakdown", "taxable_weekly"): "taxable_weekly",
+    ("breakdown", "taxable_hourly"): "taxable_hourly",
+    ("breakdown", "tax_estimate_weekly"): "tax_estimate_weekly",
+    ("breakdown", "net_weekly"): "net_weekly",
+    ("housing", "zori_rent"): "zori_rent",
+    ("housing", "market_ratio"): "market_ratio",
+    ("housing", "stipend_monthly_est"): "stipend_monthly_est",
+    ("housing", "stipend_surplus_monthly"): "stipend_surplus_monthly",
+    ("negotiation", "pct_70"): "pct_70",
+    ("negotiation", "pct_80"): "pct_80",
+    ("negotiation", "pct_95"): "pct_95",
+    ("negotiation", "pct_100"): "gsa_weekly_max",
+    ("negotiation", "your_stipend"): "stipend_weekly",
+    ("negotiation", "pct_of_max"): "pct_of_max",
+    ("contract_13wk", "gross"): "contract_gross",
+    ("contract_13wk", "net_estimate"): "contract_net_estimate",
+    ("contract_13wk", "tax_free_total"): "contract_tax_free_total",
+}
+
+# ━━━ FINANCIALS (vectorized financials.ts) ━━━
+
+def tier_floor(specialty: str) -> float:
+    """getTierInfo(specialty).floor: $20/hr for Tier A roles (excluding PTA / OTA), else $15/hr."""
+    s = specialty.upper()
+    tier_a = any(role in s for role in TIER_A_ROLES) and "PTA" not in s and "OTA" not in s
+    return 20.0 if tier_a else 15.0
+
+def js_round(x: np.ndarray) -> np.ndarray:
+    """Math.round: nearest integer, ties toward +infinity (np.round would round half to even)."""
+    floor = np.floor(x)
+    return floor + (x - floor >= 0.5)
+
+def market_ratio(zori_rent: np.ndarray, rent: np.ndarray) -> np.ndarray:
+    """Number((zori / rent).toFixed(2)) when rent and zori are both truthy and rent > 0, else NaN."""
+    zori, rent = np.broadcast_arrays(np.asarray(zori_rent, dtype=np.float64), np.asarray(rent, dtype=np.float64))
+    valid = (rent > 0) & ~np.isnan(zori) & (zori != 0)
+    out = np.full(zori.shape, np.nan)
+    out[valid] = [to_fixed(r) for r in (zori[valid] / rent[valid]).tolist()]
+    return out
+
+def score_financials(
+    weekly_gross: Any,
+    hours: Any,
+    floor: Any,
+    lodging_daily: Any,
+    meals_daily: Any,
+    hud_fmr_1br: Any,
+    zori_rent: Any,
+) -> Dict[str, np.ndarray]:
+    """
+    deriveFinancials() over broadcastable arrays (NaN zori_rent = null). Keep the operation
+    order of the TypeScript: floating-point results depend on it.
+    """
+    gross, hours, floor, lodging, meals, rent, zori = (
+        np.asarray(v, dtype=np.float64) for v in (weekly_gross, hours, floor, lodging_daily, meals_daily, hud_fmr_1br, zori_rent)
+    )
+    # deriveGsaTotals
+    weekly_max = (lodging + meals) * 7
+    monthly_max = (lodging + meals) * 30
+
+    # derivePayBreakdown
+    min_taxable_weekly = floor * hours
+    taxable = np.maximum(gross - weekly_max, 0)
+    taxable = np.where(taxable < min_taxable_weekly, np.minimum(min_taxable_weekly, gross), taxable)
+    stipend = np.maximum(gross - taxable, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        taxable_hourly = np.where(hours > 0, js_round((taxable / hours) * 100) / 100, 0.0)
+    tax_estimate = js_round(taxable * TAX_RATE_ESTIMATE * 100) / 100
+    net = js_round((gross - tax_estimate) * 100) / 100
+
+    # deriveHousingData(stipend_weekly, hudFmr1br, undefined, zoriRent)
+    stipend_monthly = (stipend / 7) * 30
+    effective_rent = np.where(np.isnan(zori), rent, zori)
+
+    # deriveNegotiationBands
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct_of_max = np.where(weekly_max > 0, js_round((stipend / weekly_max) * 100), 0.0)
+
+    return {
+        "gsa_weekly_max": weekly_max,
+        "gsa_monthly_max": monthly_max,
+        "stipend_weekly": stipend,
+        "taxable_weekly": taxable,
+        "taxable_hourly": taxable_hourly,
+        "tax_estimate_weekly": tax_estimate,
+        "net_weekly": net,
+        "zori_rent": zori,
+        "market_ratio": market_ratio(zori, rent),
+        "stipend_monthly_est": stipend_monthly,
+        "stipend_surplus_monthly": stipend_monthly - effective_rent,
+        "pct_70": js_round(weekly_max * 0.7),
+        "pct_80": js_round(weekly_max * 0.8),
+        "pct_95": js_round(weekly_max * 0.95),
+        "pct_of_max": pct_of_max,
+        "contract_gross": js_round(gross * CONTRACT_WEEKS),
+        "contract_net_estimate": js_round(net * CONTRACT_WEEKS),
+        "contract_tax_free_total": js_round(stipend * CONTRACT_WEEKS),
+    }
+
+# ━━━ GRID ━━━
+
+def load_zip_inputs(lookup: LocalLookup, on: Optional[date] = None, contract_start: bool = False) -> pd.DataFrame:
+    """
+    One row per ZIP the route can price on `on`, with the inputs it would feed deriveFinancials.
+    Same rules as LocalLookup.stipend() / housing(), as one set-based query. With `contract_start`,
+    lodging_daily is the 13-week blend for a contract starting on the 1st of on's month.
+    """
+    on = on or date.today()
+    fy = gsa_fiscal_year(on)
+    month_col = f"lodging_{MONTHS[on.month - 1]}"
+    zips = pd.read_sql_query(
+        f"""
+        WITH mapped AS ({PICKED_MAPPINGS_SQL})
+        SELECT m.zip, m.state, m.destination_id, r.fiscal_year,
+               COALESCE(r.{month_col}, r.max_lodging, 0) AS lodging_daily,
+               COALESCE(r.meals_daily, 0) AS meals_daily,
+               COALESCE(h.fmr_1br, :fallback) AS hud_fmr_1br,
+               h.zori_rent
+        FROM mapped m
+        JOIN gsa_rates r ON r.destination_id = m.destination_id AND r.fiscal_year = :fy
+        LEFT JOIN zip_housing_costs h ON h.zip = m.zip
+        ORDER BY m.zip
+        """,
+        lookup.conn,
+        params={"fy": fy, "fallback": NATIONAL_FMR_1BR},
+        dtype={"zip": "string", "state": "string", "destination_id": "string"},
+    )
+    if contract_start:
+        blended = lookup.seasonal_matrix("lodging_13wk", fy)[SEASONAL_COLUMNS[on.month - 1]] / CONTRACT_DAYS
+        # gsa_seasonal is built from the same gsa_rates rows; the month's rate only covers a DB built before it existed
+        zips["lodging_daily"] = zips["destination_id"].map(blended).astype("float64").fillna(zips["lodging_daily"])
+    return zips
+
+def score_grid(
+    zips: pd.DataFrame,
+    specialties: Sequence[str],
+    hours: Sequence[float],
+    gross: Sequence[float],
+) -> pd.DataFrame:
+    """Broadcasts ZIPs (axis 0) x specialties x hours x gross; rows are in that nesting order."""
+    shape = (len(zips), len(specialties), len(hours), len(gross))
+    per_zip = {c: zips[c].to_numpy(dtype=np.float64, na_value=np.nan).reshape(-1, 1, 1, 1)
+               for c in ("lodging_daily", "meals_daily", "hud_fmr_1br", "zori_rent")}
+    gross_axis = np.asarray(gross, dtype=np.float64).reshape(1, 1, 1, -1)
+    hours_axis = np.asarray(hours, dtype=np.float64).reshape(1, 1, -1, 1)
+    floors = np.array([tier_floor(s) for s in specialties]).reshape(1, -1, 1, 1)
+
+    scored = score_financials(gross_axis, hours_axis, floors, per_zip["lodging_daily"], per_zip["meals_daily"],
+                              per_zip["hud_fmr_1br"], per_zip["zori_rent"])
+
+    zip_rows = np.repeat(np.arange(len(zips)), np.prod(shape[1:]))
+    out = zips.iloc[zip_rows][["zip", "state", "destination_id", "fiscal_year"]].reset_index(drop=True)
+    out["specialty"] = pd.Categorical(np.tile(np.repeat(np.asarray(specialties, dtype=object), shape[2] * shape[3]), shape[0]))
+    out["hours"] = np.broadcast_to(np.asarray(hours).reshape(1, 1, -1, 1), shape).ravel()
+    out["weekly_gross"] = np.broadcast_to(np.asarray(gross).reshape(1, 1, 1, -1), shape).ravel()
+    for col in ("lodging_daily", "meals_daily", "hud_fmr_1br"):
+        out[col] = np.broadcast_to(per_zip[col], shape).ravel()
+    for col, values in scored.items():
+        out[col] = np.broadcast_to(values, shape).ravel()
+    return out
+
+# ━━━ GOLDEN PARITY ━━━
+
+def check_golden(path: str) -> int:
+    """Scores every fixture case and compares each deriveFinancials field exactly. Returns mismatches."""
+    with open(path, "r", encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    inputs = pd.DataFrame([c["input"] for c in cases])
+    scored = score_financials(
+        inputs["weekly_gross"], inputs["hours"], [tier_floor(s) for s in inputs["specialty"]],
+        inputs["lodging_daily"], inputs["meals_daily"], inputs["hud_fmr_1br"],
+        pd.to_numeric(inputs["zori_rent"]).astype("float64"),
+    )
+    mismatches = 0
+    for i, case in enumerate(cases):
+        for (section, field), col in GOLDEN_FIELDS.items():
+            expected = case["output"][section][field]
+            actual = scored[col][i].item()
+            actual = None if np.isnan(actual) else actual
+            if actual != expected:
+                mismatches += 1
+                if mismatches <= 10:
+                    print(f"   ❌ case {i} {section}.{field}: expected {expected}, got {actual}  input={case['input']}")
+    print(f"{'✅' if not mismatches else '❌'} Golden parity: {len(cases)} cases x {len(GOLDEN_FIELDS)} fields, {mismatches} mismatches")
+    return mismatches
+
+# ━━━ CLI ━━━
+
+def _parse_list(spec: str, cast=float) -> List[Any]:
+    return [cast(v.strip()) for v in spec.split(",") if v.strip()]
+
+def _number(text: str) -> float:
+    value = float(text)
+    return int(value) if value.is_integer() else value
+
+def month_in_fiscal_year(month: int, today: Optional[date] = None) -> date:
+    """The 1st of `month` inside the current GSA fiscal year (Oct-Dec fall in the prior calendar year)."""
+    fy = gsa_fiscal_year(today)
+    return date(fy - 1 if month >= 10 else fy, month, 1)
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Precompute deriveFinancials for every ZIP x specialty x hours x gross.")
+    parser.add_argument("--db", default=LOOKUP_DB_PATH, help=f"Local lookup DB (default: {LOOKUP_DB_PATH})")
+    parser.add_argument("--output", default=STIPEND_SCORES_PATH, help=f"Results CSV (default: {STIPEND_SCORES_PATH})")
+    parser.add_argument("--specialties", default=",".join(DEFAULT_SPECIALTIES), help="Comma-separated specialties")
+    parser.add_argument("--hours", default=",".join(str(h) for h in DEFAULT_HOURS), help="Comma-separated weekly hours")
+    parser.add_argument("--gross", default=",".join(str(g) for g in DEFAULT_GROSS), help="Comma-separated weekly gross pay")
+    when = parser.add_mutually_exclusive_group()
+    when.add_argument("--month", type=int, default=None, help="Calendar month 1-12 for seasonal lodging (default: this month)")
+    when.add_argument("--contract-start-month", type=int, default=None, choices=range(1, 13), metavar="MONTH",
+                      help="Price a 13-week contract starting on the 1st of MONTH (1-12) with day-weighted "
+                           "seasonal lodging instead of a single month's rate")
+    parser.add_argument("--check-golden", metavar="FIXTURE", default=None,
+                        help="Only verify parity against a financials.golden.json fixture; exits 1 on mismatch")
+    return parser.parse_args(argv)
+
+def main(argv: Optional[List[str]] = None) -> None:
+    args = parse_args(argv)
+    if args.check_golden:
+        sys.exit(1 if check_golden(args.check_golden) else 0)
+
+    start_month = args.contract_start_month
+    month = start_month if start_month is not None else args.month
+    on = date.today() if month is None else month_in_fiscal_year(month)
+    specialties = _parse_list(args.specialties, str)
+    hours, gross = _parse_list(args.hours, _number), _parse_list(args.gross, _number)
+
+    started = time.perf_counter()
+    lookup = LocalLookup(args.db)
+    zips = load_zip_inputs(lookup, on, contract_start=start_month is not None)
+    lookup.close()
+    lodging = f"13-week contract from {MONTHS[on.month - 1]}" if start_month is not None else f"{MONTHS[on.month - 1]} lodging"
+    print(f"🚀 Scoring {len(zips):,} ZIPs x {len(specialties)} specialties x {len(hours)} hours x {len(gross)} gross "
+          f"(FY{gsa_fiscal_year(on)}, {lodging})")
+    if zips.empty:
+        print("⚠️ No ZIP has GSA rates for this fiscal year. Rebuild the lookup DB with a current gsa_rates export.")
+        return
+
+    scores = score_grid(zips, specialties, hours, gross)
+    scored_at = time.perf_counter()
+    write_artifact(scores, args.output)
+    print(f"✅ {len(scores):,} rows scored in {scored_at - started:.2f}s, written to {args.output} in {time.perf_counter() - scored_at:.1f}s")
+
+if __name__ == "__main__":
+    main()
@@ -31,9 +31,9 @@ async function getMarketData(
     .map((w) => w.charAt(0).toUpperCase() + w.slice(1))
     .join(" ");
 
-  // Fetch snapshot
+  // Fetch the latest snapshot (market_snapshots keeps one row per snapshot_date)
   const { data: snapshot } = await supabase
-    .from("market_snapshots")
+    .from("market_snapshots_latest")
     .select("*")
     .eq("state", stateUpper)
     .or(`city.ilike.%${cityName}%,county.ilike.%${cityName}%`)
@@ -39,9 +39,9 @@ export default async function CityPage({ params }: CityPageProps) {
     .map((w) => w.charAt(0).toUpperCase() + w.slice(1))
     .join(" ");
 
-  // Fetch all specialties for this city
+  // Fetch all specialties for this city, latest snapshot of each
   const { data: snapshots } = await supabase
-    .from("market_snapshots")
+    .from("market_snapshots_latest")
     .select("*")
     .eq("state", stateUpper)
     .or(`city.ilike.%${cityName}%,county.ilike.%${cityName}%`)
@@ -0,0 +1,110 @@
+// ━━━ FINANCIALS GOLDEN FIXTURE ━━━
+// PROOF: scripts/stipend_scores.py (vectorized batch engine) matches deriveFinancials exactly.
+// Fixed cases (seeded + edge cases) and their TypeScript results live in financials.golden.json.
+// Run: npx tsx src/lib/__tests__/financials.golden.test.ts           (verify fixture == current TS)
+//      npx tsx src/lib/__tests__/financials.golden.test.ts --write   (regenerate after changing financials.ts)
+// Then: cd scripts && python stipend_scores.py --check-golden ../src/lib/__tests__/financials.golden.json
+
+import { readFileSync, writeFileSync } from "node:fs";
+import { deriveFinancials } from "../financials";
+
+const FIXTURE_PATH = "src/lib/__tests__/financials.golden.json";
+const SEEDED_CASES = 240;
+
+interface GoldenInput {
+  weekly_gross: number;
+  hours: number;
+  lodging_daily: number;
+  meals_daily: number;
+  fiscal_year: number;
+  hud_fmr_1br: number;
+  specialty: string;
+  zori_rent: number | null;
+}
+
+const SPECIALTIES = ["RN", "ICU RN", "LPN", "PT", "PTA", "Travel OT", "COTA", "CST", "Rad Tech", "crna", "SLP", "RRT"];
+const HOURS = [8, 12, 24, 36, 40, 48, 60, 84];
+const MEALS = [59, 64, 68, 74, 80, 86];
+
+// mulberry32: tiny deterministic PRNG so the fixture is reproducible
+let seed = 20260417;
+function rand(): number {
+  seed = (seed + 0x6d2b79f5) | 0;
+  let t = Math.imul(seed ^ (seed >>> 15), 1 | seed);
+  t = (t + Math.imul(t ^ (t >>> 7), 61 | t)) ^ t;
+  return ((t ^ (t >>> 14)) >>> 0) / 4294967296;
+}
+function pick<T>(values: T[]): T {
+  return values[Math.floor(rand() * values.length)];
+}
+function cents(n: number): number {
+  return Math.round(n * 100) / 100;
+}
+
+function buildCases(): GoldenInput[] {
+  const cases: GoldenInput[] = [
+    // Hand-picked edges: gross under the floor, zero gross, ratio ties for toFixed, zero rents
+    { weekly_gross: 2500, hours: 36, lodging_daily: 156, meals_daily: 86, fiscal_year: 2026, hud_fmr_1br: 2140, specialty: "RN", zori_rent: null },
+    { weekly_gross: 1500, hours: 36, lodging_daily: 156, meals_daily: 86, fiscal_year: 2026, hud_fmr_1br: 1800, specialty: "RN", zori_rent: 1950 },
+    { weekly_gross: 0, hours: 36, lodging_daily: 156, meals_daily: 86, fiscal_year: 2026, hud_fmr_1br: 1800, specialty: "PTA", zori_rent: null },
+    { weekly_gross: 800, hours: 24, lodging_daily: 333, meals_daily: 79, fiscal_year: 2026, hud_fmr_1br: 1125, specialty: "CST", zori_rent: 1265.625 },
+    { weekly_gross: 2000, hours: 40, lodging_daily: 110, meals_daily: 68, fiscal_year: 2027, hud_fmr_1br: 1000, specialty: "OT", zori_rent: 1005 },
+    { weekly_gross: 2000, hours: 40, lodging_daily: 110, meals_daily: 68, fiscal_year: 2027, hud_fmr_1br: 0, specialty: "OT", zori_rent: 1400 },
+    { weekly_gross: 2000, hours: 40, lodging_daily: 110, meals_daily: 68, fiscal_year: 2027, hud_fmr_1br: 1400, specialty: "LPN", zori_rent: 0 },
+    { weekly_gross: 3333.33, hours: 48, lodging_daily: 0, meals_daily: 0, fiscal_year: 2027, hud_fmr_1br: 1800, specialty: "Rad Tech", zori_rent: null },
+  ];
+  while (cases.length < SEEDED_CASES) {
+    const hudFmr1br = Math.round(650 + rand() * 2800);
+    cases.push({
+      weekly_gross: rand() < 0.5 ? Math.round(200 + rand() * 7800) : cents(200 + rand() * 7800),
+      hours: pick(HOURS),
+      lodging_daily: Math.round(98 + rand() * 300),
+      meals_daily: pick(MEALS),
+      fiscal_year: 2027,
+      hud_fmr_1br: hudFmr1br,
+      specialty: pick(SPECIALTIES),
+      zori_rent: rand() < 0.3 ? null : Math.round(hudFmr1br * (0.75 + rand() * 0.7)),
+    });
+  }
+  return cases;
+}
+
+function evaluate(input: GoldenInput) {
+  return deriveFinancials(
+    input.weekly_gross,
+    input.hours,
+    input.lodging_daily,
+    input.meals_daily,
+    input.fiscal_year,
+    input.hud_fmr_1br,
+    input.specialty,
+    input.zori_rent,
+  );
+}
+
+const cases = buildCases().map((input) => ({ input, output: evaluate(input) }));
+
+if (process.argv.includes("--write")) {
+  const body = cases.map((c) => `    ${JSON.stringify(c)}`).join(",\n");
+  writeFileSync(FIXTURE_PATH, `{\n  "cases": [\n${body}\n  ]\n}\n`);
+  console.log(`✓ Wrote ${cases.length} golden cases to ${FIXTURE_PATH}`);
+} else {
+  const fixture = JSON.parse(readFileSync(FIXTURE_PATH, "utf-8")) as { cases: typeof cases };
+  let failed = 0;
+  if (fixture.cases.length !== cases.length) {
+    failed++;
+    console.error(`  ✗ FAIL: fixture has ${fixture.cases.length} cases, expected ${cases.length}`);
+  }
+  fixture.cases.forEach((expected, i) => {
+    const actual = evaluate(expected.input);
+    if (JSON.stringify(actual) !== JSON.stringify(expected.output)) {
+      failed++;
+      console.error(`  ✗ FAIL: case ${i} ${JSON.stringify(expected.input)}`);
+    }
+  });
+  console.log(`\n━━━ GOLDEN: ${fixture.cases.length - failed} matched, ${failed} failed ━━━`);
+  if (failed > 0) {
+    console.error("financials.ts changed? Regenerate with --write and re-run the Python parity check.");
+    process.exit(1);
+  }
+}
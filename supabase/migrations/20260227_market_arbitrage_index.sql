@@ -0,0 +1,28 @@
+-- ============================================================
+-- PerDiem.fyi — Market Arbitrage Index (Layer 3)
+-- Source: scripts/seed_layer3_arbitrage.py (top-K per state × specialty)
+-- Pre-ranked so the market pages read rankings instead of computing them
+-- ============================================================
+
+CREATE TABLE IF NOT EXISTS market_arbitrage_index (
+    state VARCHAR(2) NOT NULL,
+    specialty TEXT NOT NULL,
+    kind VARCHAR(10) NOT NULL              -- 'arbitrage' = most pocketed cash | 'danger' = worst rent burden
+        CHECK (kind IN ('arbitrage', 'danger')),
+    rank SMALLINT NOT NULL CHECK (rank >= 1),
+    zip_code VARCHAR(5) NOT NULL,
+    city TEXT,
+    is_sub_vendor BOOLEAN,
+    gross_weekly_pay NUMERIC(8,2),
+    est_hourly_bill_rate NUMERIC(8,2),
+    weekly_pocketed_cash NUMERIC(8,2),
+    rent_burden_pct NUMERIC(5,1),
+    updated_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (state, specialty, kind, rank)
+);
+
+-- State pages list every specialty for one state
+CREATE INDEX IF NOT EXISTS idx_mai_state_kind ON market_arbitrage_index(state, kind, rank);
+
+ALTER TABLE market_arbitrage_index ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Public read" ON market_arbitrage_index FOR SELECT TO anon, authenticated USING (true);
@@ -0,0 +1,14 @@
+-- ============================================================
+-- PerDiem.fyi — Latest Market Snapshot per Market
+-- Source: scripts/market_snapshots.py appends one market_snapshots row per
+-- (state, county, specialty, snapshot_date); delta runs only re-date the markets
+-- that got new reports. Readers take the newest row per (state, county, specialty).
+-- ============================================================
+
+CREATE OR REPLACE VIEW public.market_snapshots_latest
+WITH (security_invoker = true) AS
+SELECT DISTINCT ON (state, county, specialty) *
+FROM public.market_snapshots
+ORDER BY state, county, specialty, snapshot_date DESC;
+
+GRANT SELECT ON public.market_snapshots_latest TO anon, authenticated;
@@ -0,0 +1,145 @@
+"""
+seed_layer4_facilities.fetch_all_hospitals against a local CMS datastore stub.
+
+The stub is a ThreadingHTTPServer answering ?limit=&offset= pages from a fixed record list,
+optionally failing a page with scripted statuses first. The module is imported with the
+CMS_HOSPITALS_URL override pointing at it, so the fetch runs with its own defaults, and
+backoff sleeps are recorded instead of slept.
+"""
+
+import importlib
+import json
+import os
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+RECORDS = [{"facility_id": f"{i:06d}", "facility_name": f"Hospital {i}", "zip_code": "10001"} for i in range(25)]
+PAGE = 10
+
+
+class CmsStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), CmsHandler)
+        self.lock = threading.Lock()
+        self.failures = {}  # offset -> statuses to answer with before serving the page
+        self.requests = []  # (offset, status) in arrival order
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}/provider-data/api/1/datastore/query/xubh-q36u/0"
+
+
+class CmsHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real datastore
+
+    def do_GET(self):
+        query = parse_qs(urlsplit(self.path).query)
+        limit, offset = int(query["limit"][0]), int(query["offset"][0])
+        with self.server.lock:
+            scripted = self.server.failures.get(offset)
+            status = scripted.pop(0) if scripted else 200
+            self.server.requests.append((offset, status))
+        body = json.dumps({"results": RECORDS[offset:offset + limit]} if status == 200 else {"message": "slow down"})
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode("utf-8"))
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def cms():
+    server = CmsStub()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def s4(cms, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("CMS_HOSPITALS_URL", cms.url)
+    sys.modules.pop("seed_layer4_facilities", None)
+    module = importlib.import_module("seed_layer4_facilities")
+    sleeps = []
+    monkeypatch.setattr(module.time, "sleep", sleeps.append)
+    module.sleeps = sleeps
+    yield module
+    module._reset_cms_connection()
+    sys.modules.pop("seed_layer4_facilities", None)
+
+
+def ndjson_ids(s4):
+    return [r["facility_id"] for r in s4.iter_ndjson(s4.CMS_NDJSON_PATH)]
+
+
+def test_pages_to_completion(s4, cms):
+    assert s4.CMS_HOSPITALS_URL == cms.url
+    rows = list(s4.fetch_all_hospitals(limit=PAGE))
+
+    assert rows == RECORDS
+    assert ndjson_ids(s4) == [r["facility_id"] for r in RECORDS]
+    assert {0, 10, 20, 30} <= {offset for offset, _ in cms.requests}  # the empty page at 30 ends the run
+    assert not os.path.exists(s4.CMS_CHECKPOINT_PATH)
+    assert s4.sleeps == []
+
+
+def test_retries_after_429_and_5xx(s4, cms):
+    cms.failures = {10: [429, 503], 20: [500]}
+    rows = list(s4.fetch_all_hospitals(limit=PAGE))
+
+    assert rows == RECORDS
+    assert [status for offset, status in cms.requests if offset == 10] == [429, 503, 200]
+    assert [status for offset, status in cms.requests if offset == 20] == [500, 200]
+    assert len(s4.sleeps) == 3 and all(0 < s <= 30 for s in s4.sleeps)
+
+
+def test_gives_up_after_max_retries(s4, cms, monkeypatch):
+    monkeypatch.setattr(s4, "CMS_MAX_RETRIES", 2)
+    cms.failures = {0: [502, 502]}
+    with pytest.raises(RuntimeError, match="offset 0 failed after 2 attempts"):
+        list(s4.fetch_all_hospitals(limit=PAGE))
+
+
+def test_resumes_from_checkpoint_without_duplicates(s4, cms):
+    first = s4.fetch_all_hospitals(limit=PAGE)
+    consumed = [next(first) for _ in range(PAGE + 3)]  # into the second committed page
+    first.close()  # the crash: the checkpoint survives, nothing past page 2 is committed
+    with open(s4.CMS_CHECKPOINT_PATH, encoding="utf-8") as f:
+        checkpoint = json.load(f)
+    assert checkpoint["next_offset"] == 2 * PAGE and checkpoint["limit"] == PAGE
+    with open(s4.CMS_NDJSON_PATH, "ab") as f:
+        f.write(b'{"facility_id": "000020", "facility_na')  # half a line of the page in flight
+
+    cms.requests.clear()
+    resumed = list(s4.fetch_all_hospitals(limit=PAGE))
+
+    assert consumed == RECORDS[:PAGE + 3]
+    assert resumed == RECORDS  # committed pages replayed from disk, then the rest fetched
+    assert ndjson_ids(s4) == [r["facility_id"] for r in RECORDS]
+    assert min(offset for offset, _ in cms.requests) == 2 * PAGE
+    assert not os.path.exists(s4.CMS_CHECKPOINT_PATH)
+
+
+def test_checkpoint_for_another_page_size_restarts(s4, cms):
+    gen = s4.fetch_all_hospitals(limit=PAGE)
+    next(gen)
+    gen.close()
+
+    cms.requests.clear()
+    assert list(s4.fetch_all_hospitals(limit=5)) == RECORDS
+    assert min(offset for offset, _ in cms.requests) == 0
+    assert ndjson_ids(s4) == [r["facility_id"] for r in RECORDS]
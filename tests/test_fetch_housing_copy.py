@@ -0,0 +1,248 @@
+"""
+End-to-end check of fetch_housing_data.py --format copy.
+
+The generated psql script is split into its preamble, the COPY ... FROM STDIN block and the
+set-based merge, then applied twice:
+  - to a throwaway Postgres through psycopg when TEST_DATABASE_URL points at one (skipped
+    otherwise), e.g. docker run -e POSTGRES_PASSWORD=pg -p 5432:5432 postgres:16 and
+    TEST_DATABASE_URL=postgresql://postgres:pg@localhost:5432/postgres
+  - to an embedded SQLite stand-in that decodes the COPY text format itself (always runs)
+
+Both check that the staging COPY parses, that the INSERT ... SELECT ... ON CONFLICT merge
+upserts over existing rows, and that a second apply leaves every row unchanged.
+"""
+
+import os
+import re
+import sqlite3
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import fetch_housing_data as fhd  # noqa: E402
+
+ZORI_MONTH = "2026-08-31"
+COLUMNS = [c.strip() for c in fhd.SEED_COLUMNS.split(",")]
+COPY_ESCAPES = {"b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t", "v": "\v", "\\": "\\"}
+
+
+def merged_frame():
+    """Edge cases for the COPY writer: escapes, NULL metros, the literal 'nan', missing rents."""
+    return pd.DataFrame({
+        "zip": ["00501", "07030", "10001", "60601", "90210"],
+        "metro_area": ["Holtsville, NY", "O'Brien\tback\\slash", None, "nan", "Line\nbreak\r"],
+        "fmr_studio": [1500.0, np.nan, 2100.9, 1200.0, 2500.0],
+        "fmr_1br": [1700.0, 1900.0, 2400.0, np.nan, 2900.0],
+        "fmr_2br": [2000.0, 2300.0, 2800.0, 1600.0, 3400.0],
+        "fmr_3br": [2400.0, 2800.0, 3300.0, 2000.0, 4100.0],
+        "fmr_4br": [2700.0, 3100.0, 3700.0, 2300.0, 4700.0],
+        "zori_rent": [1850.456, np.nan, 3999.995, 1420.0, np.nan],
+    })
+
+
+@pytest.fixture
+def copy_script(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    fhd.generate_copy_seed(merged_frame(), ZORI_MONTH)
+    with open(fhd.OUTPUT_SQL_FILE, encoding="utf-8") as f:
+        return f.read()
+
+
+def split_script(script):
+    """(preamble statements, COPY statement, COPY data lines, post-COPY statements)."""
+    head, rest = script.split("\nCOPY ", 1)
+    copy_stmt, rest = rest.split("\n", 1)
+    data, tail = rest.split("\\.\n", 1)
+
+    def statements(sql):
+        sql = "\n".join(line for line in sql.splitlines() if not line.startswith("--"))
+        return [s.strip() for s in sql.split(";") if s.strip()]
+
+    return statements(head), f"COPY {copy_stmt.rstrip(';')}", data.splitlines(), statements(tail)
+
+
+def decode_copy_field(field):
+    r"""One COPY text-format field: \N is NULL, backslash escapes are undone."""
+    if field == fhd.COPY_NULL:
+        return None
+    return re.sub(r"\\(.)", lambda m: COPY_ESCAPES.get(m.group(1), m.group(1)), field)
+
+
+def test_copy_rows_round_trip(copy_script):
+    _, copy_stmt, data, _ = split_script(copy_script)
+    assert copy_stmt == f"COPY zip_housing_costs_staging ({fhd.SEED_COLUMNS}) FROM STDIN"
+    rows = [dict(zip(COLUMNS, map(decode_copy_field, line.split("\t")))) for line in data]
+    assert [len(line.split("\t")) for line in data] == [len(COLUMNS)] * 5
+
+    by_zip = {r["zip"]: r for r in rows}
+    assert by_zip["07030"]["metro_area"] == "O'Brien\tback\\slash"
+    assert by_zip["90210"]["metro_area"] == "Line\nbreak\r"
+    assert by_zip["10001"]["metro_area"] is None and by_zip["60601"]["metro_area"] is None
+    assert by_zip["10001"]["fmr_studio"] == "2100"
+    assert by_zip["07030"]["fmr_studio"] is None and by_zip["07030"]["zori_rent"] is None
+    assert by_zip["07030"]["zori_as_of_month"] is None
+    assert by_zip["00501"]["zori_rent"] == "1850.46" and by_zip["00501"]["zori_as_of_month"] == ZORI_MONTH
+    assert {r["is_mock"] for r in rows} == {"f"}
+
+
+# ━━━ EMBEDDED STAND-IN ━━━
+
+class SqliteStandIn:
+    """
+    Applies the script's statements to SQLite, translating the few Postgres-only forms it
+    uses: ADD COLUMN IF NOT EXISTS, CREATE TEMP TABLE ... (LIKE ...) and COPY FROM STDIN.
+    COPY fields are type-checked against the target's declared types like Postgres would.
+    """
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", isolation_level=None)
+        self.like = {}  # staging table -> the table it was created LIKE
+
+    def _types(self, table):
+        table = self.like.get(table, table)  # CREATE TABLE ... AS SELECT drops declared types
+        return {row[1]: row[2].upper() for row in self.conn.execute(f"PRAGMA table_info({table})")}
+
+    def _cast(self, value, declared):
+        if value is None:
+            return None
+        if declared == "INTEGER":
+            return int(value)
+        if declared == "NUMERIC":
+            return float(value)
+        if declared == "BOOLEAN":
+            return {"t": 1, "true": 1, "f": 0, "false": 0}[value.lower()]
+        return value
+
+    def execute(self, statement):
+        alter = re.match(r"ALTER TABLE (\w+) ADD COLUMN IF NOT EXISTS (\w+) (.*)", statement, re.S)
+        like = re.match(r"CREATE TEMP TABLE (\w+)\s+\(LIKE (\w+) INCLUDING DEFAULTS\) ON COMMIT DROP", statement, re.S)
+        if alter:
+            table, column, spec = alter.groups()
+            if column not in self._types(table):
+                self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {spec}")
+        elif like:
+            staging, source = like.groups()
+            self.like[staging] = source
+            self.conn.execute(f"CREATE TEMP TABLE {staging} AS SELECT * FROM {source} WHERE 0")
+        elif statement.startswith("INSERT INTO") and "ON CONFLICT" in statement and "\nSELECT " in statement:
+            # SQLite needs a WHERE on an upserting INSERT ... SELECT to parse ON CONFLICT
+            self.conn.execute(statement.replace("\nON CONFLICT", " WHERE true\nON CONFLICT", 1))
+        elif statement == "COMMIT":
+            self.conn.execute("COMMIT")
+            for (name,) in self.conn.execute("SELECT name FROM sqlite_temp_master WHERE type = 'table'").fetchall():
+                self.conn.execute(f"DROP TABLE temp.{name}")  # ON COMMIT DROP
+        else:
+            self.conn.execute(statement)
+
+    def copy(self, copy_stmt, lines):
+        table, columns = re.match(r"COPY (\w+) \((.*)\) FROM STDIN$", copy_stmt).groups()
+        columns = [c.strip() for c in columns.split(",")]
+        types = self._types(table)
+        rows = []
+        for line in lines:
+            fields = line.split("\t")
+            if len(fields) != len(columns):
+                raise ValueError(f"COPY row has {len(fields)} fields, expected {len(columns)}: {line!r}")
+            rows.append([self._cast(decode_copy_field(v), types[c]) for v, c in zip(fields, columns)])
+        marks = ", ".join("?" * len(columns))
+        self.conn.executemany(f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({marks})", rows)
+
+    def rows(self):
+        return self.conn.execute(f"SELECT {fhd.SEED_COLUMNS} FROM zip_housing_costs ORDER BY zip").fetchall()
+
+
+def apply_script(db, script):
+    preamble, copy_stmt, data, merge = split_script(script)
+    for statement in preamble:
+        db.execute(statement)
+    db.copy(copy_stmt, data)
+    for statement in merge:
+        db.execute(statement)
+
+
+def test_copy_script_applies_to_stand_in(copy_script):
+    db = SqliteStandIn()
+    db.conn.execute("CREATE TABLE zip_housing_costs (zip TEXT PRIMARY KEY, metro_area TEXT, fmr_studio INTEGER, "
+                    "fmr_1br INTEGER, fmr_2br INTEGER, fmr_3br INTEGER, fmr_4br INTEGER, zori_rent NUMERIC)")
+    db.conn.execute("INSERT INTO zip_housing_costs VALUES ('90210', 'Stale', 1, 1, 1, 1, 1, 1.0)")
+
+    apply_script(db, copy_script)
+    first = db.rows()
+    assert [r[0] for r in first] == ["00501", "07030", "10001", "60601", "90210"]
+    updated = dict(zip(COLUMNS, first[-1]))
+    assert updated["metro_area"] == "Line\nbreak\r" and updated["fmr_studio"] == 2500 and updated["zori_rent"] is None
+    assert updated["hud_version"] == fhd.HUD_VERSION and updated["is_mock"] == 0
+
+    apply_script(db, copy_script)
+    assert db.rows() == first
+
+
+def history_script(months, rents):
+    zips = np.array(["00501", "90210"], dtype="U5")
+    path = fhd.generate_history_sql(zips, np.asarray(months, dtype="U10"), np.asarray(rents, dtype=np.float32), "copy")
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+def test_copy_history_applies_twice_and_overlaps(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    march = history_script(["2026-02-28", "2026-03-31"], [[1000, 1010], [np.nan, 3010]])
+    april = history_script(["2026-03-31", "2026-04-30"], [[1015, 1020], [3015, 3020]])
+    db = SqliteStandIn()
+
+    def rows():
+        return db.conn.execute("SELECT zip, month, zori_rent FROM zip_rent_history ORDER BY zip, month").fetchall()
+
+    apply_script(db, march)
+    first = rows()
+    assert first == [("00501", "2026-02-28", 1000.0), ("00501", "2026-03-31", 1010.0), ("90210", "2026-03-31", 3010.0)]
+    apply_script(db, march)
+    assert rows() == first
+
+    apply_script(db, april)  # overlapping March is upserted, not a primary-key violation
+    assert rows() == [
+        ("00501", "2026-02-28", 1000.0), ("00501", "2026-03-31", 1015.0), ("00501", "2026-04-30", 1020.0),
+        ("90210", "2026-03-31", 3015.0), ("90210", "2026-04-30", 3020.0),
+    ]
+
+
+# ━━━ THROWAWAY POSTGRES ━━━
+
+def test_copy_script_applies_to_postgres(copy_script):
+    psycopg = pytest.importorskip("psycopg")
+    url = os.environ.get("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL not set")
+    try:
+        conn = psycopg.connect(url, autocommit=True, connect_timeout=3)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"no Postgres reachable: {e}")
+
+    preamble, copy_stmt, data, merge = split_script(copy_script)
+    with conn:
+        schema = f"fhd_copy_test_{os.getpid()}"
+        conn.execute(f"CREATE SCHEMA {schema}")
+        conn.execute(f"SET search_path TO {schema}")
+        try:
+            conn.execute("CREATE TABLE zip_housing_costs (zip TEXT PRIMARY KEY, metro_area TEXT)")
+            conn.execute("INSERT INTO zip_housing_costs VALUES ('90210', 'Stale')")
+
+            def apply():
+                for statement in preamble:
+                    conn.execute(statement)
+                with conn.cursor().copy(copy_stmt) as copy:
+                    copy.write("".join(f"{line}\n" for line in data))
+                for statement in merge:
+                    conn.execute(statement)
+                return conn.execute(f"SELECT {fhd.SEED_COLUMNS} FROM zip_housing_costs ORDER BY zip").fetchall()
+
+            first = apply()
+            assert [r[0] for r in first] == ["00501", "07030", "10001", "60601", "90210"]
+            assert first[-1][1] == "Line\nbreak\r" and first[-1][2] == 2500 and first[-1][7] is None
+            assert apply() == first
+        finally:
+            conn.execute(f"DROP SCHEMA {schema} CASCADE")
@@ -0,0 +1,287 @@
+"""
+push_facility_intel.py's pipelined upsert and delta sync against a local PostgREST stub.
+
+The stub (a ThreadingHTTPServer, like bench_etl's _StubPostgrest) answers scripted statuses
+before accepting, rejects batches over a row limit with 413 or holding a rejected ID with 400,
+and can drop the connection (the client's HTTP 0). It counts every row it accepts, so the
+tests can check that each one was acknowledged exactly once and follow the batch sizes the
+AdaptiveBatcher sent, and it records in.() deletes. Backoff sleeps are recorded instead of slept.
+"""
+
+import json
+import os
+import sys
+import threading
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import push_facility_intel as push  # noqa: E402
+
+DROP = 0  # scripted "status": close the connection without answering
+
+
+class PostgrestStub(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), PostgrestHandler)
+        self.lock = threading.Lock()
+        self.statuses = deque()  # answered, in order, before any batch is accepted
+        self.max_rows = None  # larger batches get 413
+        self.reject_ids = set()  # batches holding one of these get 400
+        self.requests = []  # (rows in the batch, status answered)
+        self.accepted = Counter()  # facility_id -> times acknowledged
+        self.deleted = []  # facility_ids from DELETE ?facility_id=in.(...)
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def sizes(self, status=None):
+        return [n for n, s in self.requests if status is None or s == status]
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_POST(self):
+        rows = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        server = self.server
+        with server.lock:
+            if server.statuses:
+                status = server.statuses.popleft()
+            elif server.max_rows is not None and len(rows) > server.max_rows:
+                status = 413
+            elif server.reject_ids.intersection(r["facility_id"] for r in rows):
+                status = 400
+            else:
+                status = 201
+                server.accepted.update(r["facility_id"] for r in rows)
+            server.requests.append((len(rows), status))
+        if status == DROP:
+            self.close_connection = True
+            return
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_DELETE(self):
+        in_list = parse_qs(urlsplit(self.path).query)["facility_id"][0]
+        assert in_list.startswith("in.(") and in_list.endswith(")")
+        with self.server.lock:
+            self.server.deleted.extend(v.strip('"') for v in in_list[4:-1].split(","))
+        self.send_response(204)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def postgrest():
+    server = PostgrestStub()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waits = []
+    monkeypatch.setattr(push.time, "sleep", waits.append)
+    yield waits
+    push._reset_connection()
+
+
+def facility_rows(n):
+    return [{"facility_id": f"{i:06d}", "facility_name": f"Hospital {i}"} for i in range(n)]
+
+
+def upsert(postgrest, rows, **kwargs):
+    return push.pipelined_upsert(postgrest.url, "test-key", "facility_intel", rows, **kwargs)
+
+
+def assert_acknowledged_once(postgrest, stats, rows):
+    ids = [r["facility_id"] for r in rows]
+    assert postgrest.accepted == Counter(ids)
+    assert sorted(stats.synced_ids) == ids and stats.updated == len(rows)
+    assert stats.failed_batches == 0 and stats.failed_rows == 0
+
+
+# ━━━ ADAPTIVE BATCHER ━━━
+
+def test_batcher_grows_on_fast_batches_and_shrinks_on_slow_ones():
+    batcher = push.AdaptiveBatcher(facility_rows(10), batch_size=400, min_size=100, max_size=600, target_latency=2.0)
+    batcher.record_success(0.5)  # under half the target: +25%
+    assert batcher.batch_size == 500
+    batcher.record_success(0.5)
+    assert batcher.batch_size == 600  # capped at max_size
+    batcher.record_success(1.5)  # within the target band: unchanged
+    assert batcher.batch_size == 600
+    batcher.record_success(3.0)  # over the target: -25%
+    assert batcher.batch_size == 450
+    for _ in range(10):
+        batcher.record_success(3.0)
+    assert batcher.batch_size == 100  # floored at min_size
+
+
+def test_batcher_halves_on_throttle_down_to_min_size():
+    batcher = push.AdaptiveBatcher(facility_rows(10), batch_size=400, min_size=150)
+    batcher.record_throttle()
+    assert batcher.batch_size == 200
+    batcher.record_throttle()
+    assert batcher.batch_size == 150
+
+
+def test_batcher_split_requeues_both_halves_first():
+    rows = facility_rows(12)
+    batcher = push.AdaptiveBatcher(rows, batch_size=8, min_size=5)
+    first = batcher.next_batch()
+    batcher.split(first)
+    assert batcher.batch_size == 4 and batcher.min_size == 4
+    assert batcher.next_batch() == rows[:4]
+    assert batcher.next_batch() == rows[4:8]
+    assert batcher.next_batch() == rows[8:12]  # the cursor resumes at the new size
+    assert batcher.next_batch() is None
+
+
+# ━━━ PIPELINED UPSERT ━━━
+
+def test_413_splits_until_batches_fit(postgrest, sleeps):
+    rows = facility_rows(500)
+    postgrest.max_rows = 120
+    stats = upsert(postgrest, rows, concurrency=1, batch_size=500)
+
+    assert postgrest.sizes()[:5] == [500, 250, 125, 62, 63]  # halves are sent before the cursor moves on
+    assert all(n > 120 for n in postgrest.sizes(413))
+    assert all(n <= 120 for n in postgrest.sizes(201))
+    assert sleeps == []  # splitting is not a retry
+    assert_acknowledged_once(postgrest, stats, rows)
+
+
+def test_429_halves_the_batch_size_and_retries_the_batch(postgrest, sleeps):
+    rows = facility_rows(1000)
+    postgrest.statuses.extend([429])
+    stats = upsert(postgrest, rows, concurrency=1, batch_size=400)
+
+    # 400 throttled -> size 200; the same 400 rows retried; fast successes then grow 200 -> 250 -> 312
+    assert postgrest.requests == [(400, 429), (400, 201), (250, 201), (312, 201), (38, 201)]
+    assert len(sleeps) == 1
+    assert_acknowledged_once(postgrest, stats, rows)
+
+
+def test_5xx_and_dropped_connections_retry_with_jitter(postgrest, sleeps, monkeypatch):
+    bounds = []
+    monkeypatch.setattr(push.random, "uniform", lambda a, b: bounds.append((a, b)) or b / 2)
+    rows = facility_rows(300)
+    postgrest.statuses.extend([503, DROP, 500])
+    stats = upsert(postgrest, rows, concurrency=1, batch_size=300)
+
+    assert postgrest.requests == [(300, 503), (300, DROP), (300, 500), (300, 201)]
+    assert bounds == [(0, 2), (0, 4), (0, 8)]  # full jitter over an exponentially growing cap
+    assert sleeps == [1, 2, 4]
+    assert_acknowledged_once(postgrest, stats, rows)
+
+
+def test_batch_fails_after_max_retries(postgrest, sleeps, monkeypatch):
+    monkeypatch.setattr(push, "MAX_RETRIES", 2)
+    rows = facility_rows(150)
+    postgrest.statuses.extend([503, 503, 503])
+    stats = upsert(postgrest, rows, concurrency=1, batch_size=100)
+
+    assert postgrest.requests == [(100, 503), (100, 503), (100, 503), (50, 201)]
+    assert stats.failed_batches == 1 and stats.failed_rows == 100
+    assert sorted(stats.synced_ids) == [r["facility_id"] for r in rows[100:]]
+    assert postgrest.accepted == Counter(r["facility_id"] for r in rows[100:])
+
+
+def test_concurrent_workers_acknowledge_every_row_once(postgrest, sleeps):
+    rows = facility_rows(5000)
+    postgrest.max_rows = 300
+    postgrest.statuses.extend([429, 503, DROP, 502, 429, 504])
+    stats = upsert(postgrest, rows, concurrency=4, batch_size=500)
+
+    assert len(sleeps) == 6
+    assert postgrest.sizes(413)  # the first 500-row batches were split
+    assert_acknowledged_once(postgrest, stats, rows)
+
+
+# ━━━ DELTA SYNC ━━━
+
+CSV_HEADER = "facility_id,facility_name,city,state\n"
+
+
+@pytest.fixture
+def sync(postgrest, sleeps, tmp_path, monkeypatch):
+    """Runs main() on a CSV of (id, name) rows with a temp manifest; returns (exit code, manifest ids)."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv("SUPABASE_URL", postgrest.url)
+    monkeypatch.setenv("SUPABASE_SERVICE_ROLE_KEY", "test-key")
+    csv_path, manifest_path = tmp_path / "facilities.csv", tmp_path / "delta.manifest.sqlite"
+
+    def run(rows, *flags):
+        csv_path.write_text(CSV_HEADER + "".join(f"{fid},{name},Austin,TX\n" for fid, name in rows), encoding="utf-8")
+        postgrest.accepted.clear()
+        postgrest.deleted.clear()
+        code = push.main([str(csv_path), "--manifest", str(manifest_path), "--batch-size", "2", "--concurrency", "1", *flags])
+        conn = push.open_manifest(manifest_path)
+        ids = [fid for (fid,) in conn.execute("SELECT facility_id FROM facility_manifest ORDER BY facility_id")]
+        conn.close()
+        return code, ids
+
+    return run
+
+
+BASELINE = [("000001", "Alpha"), ("000002", "Bravo"), ("000003", "Charlie"), ("000004", "Delta")]
+
+
+def test_delta_sends_only_new_and_modified_rows(sync, postgrest):
+    assert sync(BASELINE) == (0, ["000001", "000002", "000003", "000004"])
+    assert set(postgrest.accepted) == {"000001", "000002", "000003", "000004"}
+
+    assert sync(BASELINE) == (0, ["000001", "000002", "000003", "000004"])
+    assert not postgrest.accepted  # nothing changed, nothing sent
+
+    edited = [("000001", "Alpha"), ("000002", "Bravo North"), ("000003", "Charlie"), ("000004", "Delta"), ("000005", "Echo")]
+    assert sync(edited) == (0, ["000001", "000002", "000003", "000004", "000005"])
+    assert postgrest.accepted == Counter({"000002": 1, "000005": 1})
+
+    assert sync(edited, "--full")[0] == 0
+    assert set(postgrest.accepted) == {"000001", "000002", "000003", "000004", "000005"}
+
+
+def test_vanished_ids_are_deleted_only_with_delete_missing(sync, postgrest):
+    sync(BASELINE)
+    shrunk = [row for row in BASELINE if row[0] not in ("000002", "000004")]
+
+    conn = push.open_manifest(push.Path("delta.manifest.sqlite"))
+    built = [push.build_payload({"facility_id": fid, "facility_name": name, "city": "Austin", "state": "TX"})
+             for fid, name in shrunk]
+    assert push.diff_against_manifest(conn, built)[4] == ["000002", "000004"]
+    conn.close()
+
+    code, ids = sync(shrunk)
+    assert code == 0 and postgrest.deleted == [] and not postgrest.accepted
+    assert ids == ["000001", "000002", "000003", "000004"]  # kept until they are actually deleted
+
+    code, ids = sync(shrunk, "--delete-missing")
+    assert code == 0 and sorted(postgrest.deleted) == ["000002", "000004"]
+    assert ids == ["000001", "000003"]
+
+
+def test_failed_batches_stay_out_of_the_manifest(sync, postgrest):
+    postgrest.reject_ids = {"000003"}
+    code, ids = sync(BASELINE)
+    assert code == 1
+    assert ids == ["000001", "000002"]  # the 000003/000004 batch failed as a whole
+
+    postgrest.reject_ids = set()
+    assert sync(BASELINE) == (0, ["000001", "000002", "000003", "000004"])
+    assert postgrest.accepted == Counter({"000003": 1, "000004": 1})  # retried next run, nothing else resent
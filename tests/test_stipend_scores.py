@@ -0,0 +1,108 @@
+"""
+stipend_scores.py: golden parity with src/lib/financials.ts, and scoring against a small
+lookup DB built in a temp directory.
+
+The golden fixture is written by src/lib/__tests__/financials.golden.test.ts; every case must
+match deriveFinancials() field for field. --contract-start-month must price lodging as the
+day-weighted blend of the months a 13-week contract spans (local_lookup's gsa_seasonal),
+while the default stays on one month's rate.
+"""
+
+import json
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "scripts"))
+
+import local_lookup  # noqa: E402
+import stipend_scores  # noqa: E402
+
+FY = local_lookup.gsa_fiscal_year()
+GOLDEN_PATH = os.path.join(os.path.dirname(__file__), "..", "src", "lib", "__tests__", "financials.golden.json")
+
+
+# ━━━ GOLDEN PARITY ━━━
+
+def test_check_golden_matches_typescript(capsys):
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        cases = json.load(f)["cases"]
+    assert len(cases) == 240
+
+    with pytest.raises(SystemExit) as exit_info:
+        stipend_scores.main(["--check-golden", GOLDEN_PATH])
+    assert exit_info.value.code == 0
+    assert f"{len(cases)} cases x {len(stipend_scores.GOLDEN_FIELDS)} fields, 0 mismatches" in capsys.readouterr().out
+
+
+def test_check_golden_reports_a_drifted_field(tmp_path, capsys):
+    with open(GOLDEN_PATH, encoding="utf-8") as f:
+        fixture = json.load(f)
+    fixture["cases"][0]["output"]["breakdown"]["net_weekly"] += 0.01
+    drifted = tmp_path / "drifted.golden.json"
+    drifted.write_text(json.dumps(fixture), encoding="utf-8")
+
+    assert stipend_scores.check_golden(str(drifted)) == 1
+    with pytest.raises(SystemExit) as exit_info:
+        stipend_scores.main(["--check-golden", str(drifted)])
+    assert exit_info.value.code == 1
+
+
+# ━━━ LOOKUP DB ━━━
+
+@pytest.fixture
+def lookup_db(tmp_path):
+    pd.DataFrame({
+        "zip": ["10001", "85202"], "fiscal_year": [FY, FY], "destination_id": ["NYC", "MESA"],
+        "state": ["NY", "AZ"], "city": ["New York", "Mesa"], "county": ["New York", "Maricopa"],
+    }).to_csv(tmp_path / "zips.csv", index=False)
+    # NYC: Nov 100, Dec 200, Jan 300, every other month 50; Mesa: flat 120 (Jan left blank -> max_lodging)
+    nyc = {f"lodging_{m}": 50 for m in local_lookup.MONTHS} | {"lodging_nov": 100, "lodging_dec": 200, "lodging_jan": 300}
+    mesa = {f"lodging_{m}": 120 for m in local_lookup.MONTHS} | {"lodging_jan": None}
+    pd.DataFrame([
+        {"destination_id": "NYC", "fiscal_year": FY, "state": "NY", "meals_daily": 79, **nyc},
+        {"destination_id": "MESA", "fiscal_year": FY, "state": "AZ", "meals_daily": 64, "max_lodging": 120, **mesa},
+    ]).to_csv(tmp_path / "rates.csv", index=False)
+    path = str(tmp_path / "lookup.sqlite")
+    missing = str(tmp_path / "missing.csv")
+    local_lookup.build_lookup_db(path, str(tmp_path / "zips.csv"), str(tmp_path / "rates.csv"), missing, missing, missing)
+    return path
+
+
+def zip_inputs(lookup_db, month, contract_start):
+    lookup = local_lookup.LocalLookup(lookup_db)
+    try:
+        zips = stipend_scores.load_zip_inputs(lookup, stipend_scores.month_in_fiscal_year(month), contract_start)
+    finally:
+        lookup.close()
+    return zips.set_index("zip")
+
+
+def test_contract_start_month_blends_seasonal_lodging(lookup_db):
+    single = zip_inputs(lookup_db, 11, contract_start=False)
+    blended = zip_inputs(lookup_db, 11, contract_start=True)
+
+    assert single.loc["10001", "lodging_daily"] == 100
+    # Nov 1 + 91 days: 30 Nov nights at 100, 31 Dec at 200, 30 Jan at 300
+    assert blended.loc["10001", "lodging_daily"] == pytest.approx((30 * 100 + 31 * 200 + 30 * 300) / 91)
+    assert blended.loc["85202", "lodging_daily"] == pytest.approx(120)
+    assert (blended["meals_daily"] == single["meals_daily"]).all()
+
+
+def test_main_writes_contract_scores(lookup_db, tmp_path, capsys):
+    output = tmp_path / "scores.csv"
+    stipend_scores.main(["--db", lookup_db, "--output", str(output), "--specialties", "RN", "--hours", "36",
+                         "--gross", "3000", "--contract-start-month", "11"])
+    assert "13-week contract from nov" in capsys.readouterr().out
+
+    scores = pd.read_csv(output, dtype={"zip": str}).set_index("zip")
+    lodging = (30 * 100 + 31 * 200 + 30 * 300) / 91
+    assert scores.loc["10001", "gsa_weekly_max"] == pytest.approx((lodging + 79) * 7)
+    assert scores.loc["10001", "contract_tax_free_total"] == stipend_scores.js_round(scores.loc["10001", "stipend_weekly"] * 13)
+
+
+def test_month_and_contract_start_month_are_exclusive():
+    with pytest.raises(SystemExit):
+        stipend_scores.parse_args(["--month", "3", "--contract-start-month", "4"])